@@ -0,0 +1,189 @@
+import struct
+import sys
+import threading
+from array import array
+
+# Azure output format: Riff24Khz16BitMonoPcm
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+HEADER_SIZE = 44
+STREAM_SIZE = 0xFFFFFFFF  # RIFF size placeholder while the length is unknown
+CHUNK_SIZE = SAMPLE_RATE * SAMPLE_WIDTH // 10  # 100 ms
+
+
+def wav_header(data_size: int, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Build a canonical 44-byte PCM WAV header."""
+    byte_rate = sample_rate * CHANNELS * SAMPLE_WIDTH
+    riff_size = STREAM_SIZE if data_size >= STREAM_SIZE - 36 else data_size + 36
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        riff_size,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,
+        CHANNELS,
+        sample_rate,
+        byte_rate,
+        CHANNELS * SAMPLE_WIDTH,
+        SAMPLE_WIDTH * 8,
+        b"data",
+        data_size,
+    )
+
+
+def split_wav(data: bytes | memoryview) -> tuple[memoryview, int]:
+    """Return the PCM payload and sample rate of a WAV file without copying."""
+    view = memoryview(data)
+    if bytes(view[:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        return view, SAMPLE_RATE
+    sample_rate = SAMPLE_RATE
+    pos = 12
+    while pos + 8 <= len(view):
+        chunk_id = bytes(view[pos : pos + 4])
+        (chunk_size,) = struct.unpack_from("<I", view, pos + 4)
+        if chunk_id == b"fmt ":
+            (sample_rate,) = struct.unpack_from("<I", view, pos + 12)
+        elif chunk_id == b"data":
+            end = len(view) if chunk_size >= STREAM_SIZE - 36 else pos + 8 + chunk_size
+            return view[pos + 8 : end], sample_rate
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return view[len(view) :], sample_rate
+
+
+def resample(pcm: bytes | memoryview, from_rate: int, to_rate: int = SAMPLE_RATE) -> bytes:
+    """Resample 16-bit mono PCM by linear interpolation."""
+    if from_rate == to_rate:
+        return bytes(pcm)
+    samples = array("h", bytes(pcm[: len(pcm) & ~1]))
+    if not samples:
+        return b""
+    if sys.byteorder == "big":
+        samples.byteswap()
+    step = from_rate / to_rate
+    last = len(samples) - 1
+    out = array("h", bytes(len(samples) * to_rate // from_rate * SAMPLE_WIDTH))
+    for i in range(len(out)):
+        position = i * step
+        j = int(position)
+        a = samples[j]
+        b = samples[j + 1] if j < last else a
+        out[i] = int(a + (b - a) * (position - j))
+    if sys.byteorder == "big":
+        out.byteswap()
+    return out.tobytes()
+
+
+class AudioBuffer:
+    """PCM audio exposed as a WAV stream that can be read while it is still being written.
+
+    Synthesis threads append() chunks and finish(); players read() from any thread,
+    blocking until the requested bytes arrive or the buffer is finished.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate: int = sample_rate
+        self._data = bytearray(wav_header(STREAM_SIZE, sample_rate))
+        self._cond = threading.Condition()
+        self._first_chunk: bool = True
+        self.finished: bool = False
+        self.failed: bool = False
+
+    @classmethod
+    def from_wav(cls, data: bytes | memoryview) -> "AudioBuffer":
+        """Wrap complete WAV (or raw PCM) data in a finished buffer."""
+        pcm, sample_rate = split_wav(data)
+        buffer = cls(sample_rate)
+        buffer._data = bytearray(wav_header(len(pcm), sample_rate))
+        buffer._data += pcm
+        buffer._first_chunk = False
+        buffer.finished = True
+        return buffer
+
+    def append(self, chunk: bytes | memoryview) -> None:
+        """Add audio. A RIFF header at the start of the stream is dropped."""
+        if self._first_chunk:
+            self._first_chunk = False
+            if bytes(chunk[:4]) == b"RIFF":
+                chunk, self.sample_rate = split_wav(chunk)
+                self._data[:HEADER_SIZE] = wav_header(STREAM_SIZE, self.sample_rate)
+        with self._cond:
+            self._data += chunk
+            self._cond.notify_all()
+
+    def finish(self, failed: bool = False) -> None:
+        """Mark the end of the stream and fix up the header sizes."""
+        with self._cond:
+            self.failed = failed
+            self.finished = True
+            self._data[:HEADER_SIZE] = wav_header(len(self._data) - HEADER_SIZE, self.sample_rate)
+            self._cond.notify_all()
+
+    def read(self, offset: int, size: int) -> bytes:
+        """Read WAV bytes from offset, blocking until they are available or the stream ends."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._data) > offset or self.finished)
+            return bytes(self._data[offset : offset + size])
+
+    def wait_finished(self, timeout: float | None = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self.finished, timeout)
+
+    @property
+    def size(self) -> int:
+        """Current size of the WAV stream in bytes."""
+        return len(self._data)
+
+    @property
+    def duration(self) -> float:
+        """Seconds of audio received so far."""
+        return (self.size - HEADER_SIZE) / (self.sample_rate * CHANNELS * SAMPLE_WIDTH)
+
+    def wav(self) -> bytes:
+        """Snapshot of the stream as WAV bytes."""
+        with self._cond:
+            return bytes(self._data)
+
+    def pcm(self) -> bytes:
+        """Snapshot of the PCM payload."""
+        with self._cond:
+            return bytes(self._data[HEADER_SIZE:])
+
+
+class MappedAudio(AudioBuffer):
+    """A finished AudioBuffer over PCM kept elsewhere, e.g. in a memory-mapped macro
+    pack. Nothing is copied until a player reads it."""
+
+    def __init__(self, pcm: memoryview, sample_rate: int = SAMPLE_RATE):
+        super().__init__(sample_rate)
+        self._header: bytes = wav_header(len(pcm), sample_rate)
+        self._pcm: memoryview = pcm
+        self._first_chunk = False
+        self.finished = True
+
+    def append(self, chunk: bytes | memoryview) -> None:
+        raise ValueError("MappedAudio is read-only")
+
+    def finish(self, failed: bool = False) -> None:
+        pass
+
+    def read(self, offset: int, size: int) -> bytes:
+        end = offset + size
+        head = self._header[offset:end] if offset < HEADER_SIZE else b""
+        return head + bytes(self._pcm[max(offset - HEADER_SIZE, 0) : max(end - HEADER_SIZE, 0)])
+
+    @property
+    def size(self) -> int:
+        return HEADER_SIZE + len(self._pcm)
+
+    def wav(self) -> bytes:
+        return self._header + bytes(self._pcm)
+
+    def pcm(self) -> bytes:
+        return bytes(self._pcm)
+
+    def view(self) -> memoryview:
+        """The PCM payload without copying it."""
+        return self._pcm
@@ -0,0 +1,84 @@
+"""Batched synthesis of short utterances, with the offline FakeSynthesizer.
+
+Requests short phrases through a SynthesisBatcher on a pool of fake Azure
+connections, once with batching off and once on: a burst of phrases at once
+(as in a macro rebuild) and phrases arriving at random (as in busy chat).
+Reports requests made and saved, the time per utterance and how long
+utterances waited for a batch to fill. Run from the repository root:
+
+    python -m bench.batch
+"""
+
+import asyncio
+import random
+import time
+
+from const import Batch, Const, SynthPool
+from synthesis import FakeSynthesizer, SynthesisBatcher, SynthesizerPool, build_ssml
+
+PHRASES = ("Yes", "No", "Okay", "Skull", "Interrupting", "Moon", "Pull in 5", "Dispelling")
+LATENCY = 0.15  # fixed per-request overhead of the fake backend
+COUNT = 48
+ARRIVALS_PER_S = 20
+VOICE = "en-US-JaneNeural"
+
+
+def ssml(text: str) -> str:
+    return build_ssml(text, VOICE, "Friendly", Const.TTS_RATE, Const.TTS_PITCH)
+
+
+async def run(enabled: bool, burst: bool) -> tuple[list[float], dict, int]:
+    backends = []
+
+    def factory() -> FakeSynthesizer:
+        backends.append(FakeSynthesizer(LATENCY, seconds_per_char=0.005, seed=len(backends)))
+        return backends[-1]
+
+    pool = SynthesizerPool(factory, SynthPool.SIZE)
+    await pool.start()
+    batcher = SynthesisBatcher(
+        pool, Batch.MAX_ITEMS, Batch.WINDOW_MS / 1000, Batch.MAX_CHARS, Batch.BREAK_MS / 1000
+    )
+    batcher.enabled = enabled
+    rng = random.Random(1)
+    latencies = []
+
+    async def utterance(text: str) -> None:
+        start = time.perf_counter()
+        await batcher.synthesize(ssml(text), VOICE)
+        latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    for i in range(COUNT):
+        tasks.append(asyncio.create_task(utterance(PHRASES[i % len(PHRASES)])))
+        if not burst:
+            await asyncio.sleep(rng.expovariate(ARRIVALS_PER_S))
+    await asyncio.gather(*tasks)
+    await pool.stop()
+    return sorted(latencies), batcher.stats(), sum(backend.requests for backend in backends)
+
+
+async def main() -> None:
+    print(
+        f"{COUNT} utterances, {LATENCY * 1000:.0f} ms per request, batches of up to "
+        f"{Batch.MAX_ITEMS} within {Batch.WINDOW_MS} ms"
+    )
+    print(
+        f"{'scenario':<16} {'requests':>8} {'saved':>6} {'p50 ms':>7} {'p95 ms':>7} "
+        f"{'wait ms':>8}"
+    )
+    for burst in (True, False):
+        for enabled in (False, True):
+            latencies, stats, requests = await run(enabled, burst)
+            arrivals = "burst" if burst else f"{ARRIVALS_PER_S}/s"
+            name = f"{arrivals} {'batched' if enabled else 'single'}"
+            print(
+                f"{name:<16} {requests:>8} {stats['requests_saved']:>6} "
+                f"{latencies[len(latencies) // 2] * 1000:>7.0f} "
+                f"{latencies[int(len(latencies) * 0.95)] * 1000:>7.0f} "
+                f"{stats['wait_mean_ms']:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+"""Chat ingestion under a raid, fully offline.
+
+Floods a local fake chat server with raid-style chat (hype spam, near-duplicates,
+links, bot commands, long messages, a few moderators) and reads it out through
+the real engine with FakeSynthesizer and NullPlayers. Reports per backlog
+overflow policy what was admitted, dropped and why, and how far speech lagged
+behind chat. Run from the repository root:
+
+    python -m bench.chat [--rate 40] [--duration 10] [--users 300]
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import shutil
+import tempfile
+import time
+
+from chat import ChatGate, ChatReader
+from const import ChatOverflow, Const
+from engine import SpeechEngine
+from player import NullPlayer, PlayerPool
+from synthesis import FakeSynthesizer
+
+from bench.fake_chat import FakeChat
+
+HYPE = ("LETS GOOOO", "raid hype!!", "PogChamp", "gg", "W streamer", "HYPE HYPE HYPE")
+LINES = (
+    "where are you from?",
+    "what spec is that",
+    "first time here, love the goblin",
+    "how many pulls on this boss so far",
+    "check out https://example.com/clip",
+    "!discord",
+)
+
+
+def chat_line(rng: random.Random, run: int) -> str:
+    roll = rng.random()
+    if roll < 0.5:
+        hype = rng.choice(HYPE)
+        return hype.lower() if rng.random() < 0.5 else hype + "!" * rng.randint(0, 3)
+    if roll < 0.9:
+        return f"{rng.choice(LINES)} {run}"
+    return "this raid is amazing " * 20
+
+
+async def raid(args: argparse.Namespace, overflow: ChatOverflow) -> dict:
+    server = FakeChat()
+    await server.start()
+    cache_dir = tempfile.mkdtemp(prefix="tts-bench-")
+    engine = SpeechEngine(
+        player=PlayerPool(NullPlayer, (Const.MAIN_CHANNEL, Const.ALT_CHANNEL)),
+        synthesizer_factory=lambda: FakeSynthesizer(args.latency, seconds_per_char=0.04),
+        obs_url="",
+        obs_password="",
+        bubble_port=0,
+        cache_dir=cache_dir,
+    )
+    engine.set_save_audio_files(False)
+    await engine.start(connect_obs=False)
+    reader = ChatReader(
+        engine,
+        {
+            "host": server.host,
+            "port": server.port,
+            "room": server.room,
+            "nick": "bench",
+            "token": "",
+        },
+        Const.ALT_CHANNEL,
+        ChatGate(overflow=overflow),
+    )
+    reader.start()
+    await server.wait_joined()
+
+    rng = random.Random(1)
+    users = [f"viewer_{i}" for i in range(args.users)]
+    start = time.monotonic()
+    try:
+        for sent in range(int(args.rate * args.duration)):
+            badges = "moderator/1" if rng.random() < 0.03 else ""
+            server.send(rng.choice(users), chat_line(rng, sent), badges)
+            if sent % 50 == 0:
+                server.ping()
+            await asyncio.sleep(max(0.0, start + (sent + 1) / args.rate - time.monotonic()))
+        scheduler = engine.schedulers[Const.ALT_CHANNEL]
+        await asyncio.sleep(0.1)
+        while reader.gate.depth or scheduler.depth or scheduler.current:
+            await asyncio.sleep(0.05)
+        wall = time.monotonic() - start
+        stats = reader.stats()
+    finally:
+        await reader.stop()
+        await engine.shutdown()
+        await server.stop()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return {**stats, "sent": server.sent, "pongs": server.pongs, "wall_s": wall}
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(
+        f"{args.rate} msg/s for {args.duration}s from {args.users} users, "
+        f"backlog {ChatGate().backlog}, max lag {ChatGate().max_lag}s"
+    )
+    for overflow in ChatOverflow:
+        result = await raid(args, overflow)
+        dropped = {
+            reason: result[reason]
+            for reason in ("filtered", "rate_limited", "duplicate", "overflow", "stale")
+        }
+        print(
+            f"drop {overflow.value:<6}: {result['ingested']}/{result['sent']} ingested, "
+            f"{result['admitted']} admitted, {result['spoken']} spoken in {result['wall_s']:.1f}s, "
+            f"lag p50 {result['lag_p50_s']:.1f}s p95 {result['lag_p95_s']:.1f}s "
+            f"max {result['lag_max_s']:.1f}s, backlog max {result['max_backlog_seen']}"
+        )
+        print(f"             dropped {dropped}, {result['pongs']} pings answered")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--rate", type=float, default=40, help="chat messages per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of raid")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.15, help="fake synthesis latency (s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
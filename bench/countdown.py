@@ -0,0 +1,92 @@
+"""Number composition and countdown timing.
+
+Composes numbers and templates from synthetic clips (a tone per clip, padded
+with silence like the real macros), then runs a countdown with the Countdown
+clock and with one asyncio.sleep(interval) per tick, on an event loop kept busy
+by other work, and reports how late each tick fired. Run from the repository root:
+
+    python -m bench.countdown [--ticks 20] [--interval 0.25]
+"""
+
+import argparse
+import asyncio
+import time
+import timeit
+
+import numpy as np
+
+from audio import SAMPLE_RATE
+from compose import Composer, Countdown
+from const import Compose
+from macro_pack import macro_texts
+
+TEMPLATES = ("5, 4, 3, 2, 1", "skull in 30", "pull in 10", "1234")
+BUSY_MS = 2  # the loop runs other work this long...
+BUSY_EVERY_MS = 5  # ...this often
+
+
+def synthetic_clips() -> dict[str, tuple[bytes, int, str]]:
+    clips = {}
+    for i, (name, text) in enumerate(macro_texts().items()):
+        t = np.arange(int(SAMPLE_RATE * 0.3)) / SAMPLE_RATE
+        tone = 4000 * np.sin(2 * np.pi * (200 + 5 * i) * t)
+        pcm = np.concatenate((np.zeros(480), tone, np.zeros(3600))).astype("<i2").tobytes()
+        clips[name] = (pcm, SAMPLE_RATE, text)
+    return clips
+
+
+async def busy_loop() -> None:
+    while True:
+        end = time.perf_counter() + BUSY_MS / 1000
+        while time.perf_counter() < end:
+            pass
+        await asyncio.sleep(BUSY_EVERY_MS / 1000)
+
+
+async def stacked_sleeps(ticks: int, interval: float) -> list[float]:
+    start = time.monotonic()
+    late = []
+    for k in range(ticks):
+        if k:
+            await asyncio.sleep(interval)
+        late.append(time.monotonic() - (start + k * interval))
+    return late
+
+
+async def clock(ticks: int, interval: float) -> list[float]:
+    countdown = Countdown()
+    await countdown.run([lambda: None] * ticks, interval)
+    return list(countdown.jitter)
+
+
+def summary(late: list[float]) -> str:
+    ms = sorted(x * 1000 for x in late)
+    p50, p95 = ms[len(ms) // 2], ms[int(len(ms) * 0.95)]
+    return f"{p50:>7.2f} {p95:>7.2f} {ms[-1]:>7.2f} {ms[-1] - ms[0]:>9.2f}"
+
+
+async def main(args: argparse.Namespace) -> None:
+    clips = synthetic_clips()
+    composer = Composer(clips.get)
+    print(f"{'template':<16} {'clips':>5} {'audio s':>8} {'compose ms':>11}")
+    for text in TEMPLATES:
+        audio = composer.compose(text)
+        ms = min(timeit.repeat(lambda: composer.compose(text), number=20, repeat=5)) / 20 * 1000
+        print(f"{text:<16} {len(composer.plan(text)):>5} {audio.duration:>8.2f} {ms:>11.3f}")
+
+    busy = asyncio.create_task(busy_loop())
+    print(
+        f"\n{args.ticks} ticks every {args.interval}s, loop busy {BUSY_MS} ms in every "
+        f"{BUSY_EVERY_MS} ms (late ms; target < {Compose.LATE_MS} ms)"
+    )
+    print(f"{'':<16} {'p50':>7} {'p95':>7} {'max':>7} {'drift':>9}")
+    print(f"{'asyncio.sleep':<16} {summary(await stacked_sleeps(args.ticks, args.interval))}")
+    print(f"{'Countdown':<16} {summary(await clock(args.ticks, args.interval))}")
+    busy.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.25)
+    asyncio.run(main(parser.parse_args()))
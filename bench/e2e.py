@@ -0,0 +1,288 @@
+"""End-to-end latency benchmark of the speech engine, fully offline.
+
+Runs the real SpeechEngine with FakeSynthesizer in place of Azure, NullPlayers in
+place of VLC and a local fake OBS server, then measures:
+
+- keypress to first audio per synthesis mode (in-memory, streaming, pipelined,
+  cache hit), and the OBS round-trips and requests each utterance causes
+- macro click to first audio
+- throughput and queueing latency under bursts of typed lines
+
+Results are printed and written as JSON. Run from the repository root:
+
+    python -m bench.e2e [--runs 3] [--latency 0.15] [--out cache/bench-e2e.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from const import Const, OBS, PhraseMacro, RaidIcon
+from engine import SpeechEngine
+from metrics import metrics
+from player import NullPlayer, PlayerPool
+from synthesis import FakeSynthesizer
+
+from bench.fake_obs import FakeObs
+
+ITEMS = {(OBS.AVA_SCENE, OBS.AVA_SOURCE): 11, (OBS.BUB_SCENE, OBS.BUB_SOURCE): 12}
+LINES = (
+    "Stack on skull for the next beam",
+    "Healers, big damage incoming in five",
+    "Tanks swap after the third debuff",
+    "Interrupt the caster on the left",
+    "Move out of the fire and spread",
+    "Bloodlust on pull, save defensives",
+)
+LONG_LINE = (
+    "Pull in ten seconds. Tanks take the adds on the left side. "
+    "Healers stay in range of the star marker. Everyone else focus the boss."
+)
+MODES = ("in-memory", "streaming", "pipelined", "cache-hit")
+
+
+def summarize(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    if not samples:
+        return {"samples": 0}
+    return {
+        "samples": len(samples),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+        "p95_ms": round(samples[int(len(samples) * 0.95)] * 1000, 1),
+        "max_ms": round(samples[-1] * 1000, 1),
+    }
+
+
+async def idle(engine: SpeechEngine) -> None:
+    """Wait for the queue to drain, playback to end and the avatar to finish."""
+    schedulers = engine.schedulers.values()
+    while any(s.current or s.depth for s in schedulers) or engine.player.is_playing():
+        await asyncio.sleep(0.005)
+    if engine.speaking_task:
+        await asyncio.gather(engine.speaking_task, return_exceptions=True)
+
+
+def play_log(engine: SpeechEngine) -> list[tuple[float, str | None, str]]:
+    """Every play on any channel; the bench's NullPlayers share one log."""
+    return next(iter(engine.player.players.values())).plays
+
+
+async def next_play(log: list, count: int, timeout: float = 10.0) -> float:
+    """Monotonic start time of play number count (0-based)."""
+    deadline = time.monotonic() + timeout
+    while len(log) <= count:
+        if time.monotonic() > deadline:
+            raise TimeoutError("Nothing was played")
+        await asyncio.sleep(0.001)
+    return log[count][0]
+
+
+async def bubble_listener(engine: SpeechEngine) -> asyncio.StreamWriter:
+    """Connect like the live bubble page, so updates are pushed instead of written to disk."""
+    reader, writer = await asyncio.open_connection(
+        engine.bubble_server.host, engine.bubble_server.port
+    )
+    writer.write(b"GET /events HTTP/1.1\r\nHost: bench\r\n\r\n")
+    await writer.drain()
+
+    async def drain() -> None:
+        while await reader.read(4096):
+            pass
+
+    asyncio.create_task(drain())
+    while not engine.bubble_server.clients:
+        await asyncio.sleep(0.005)
+    return writer
+
+
+async def bench_speak(engine: SpeechEngine, obs: FakeObs, runs: int) -> dict:
+    log = play_log(engine)
+    results = {}
+    for mode in MODES:
+        engine.set_streaming_mode(mode == "streaming")
+        engine.set_pipeline_mode(mode == "pipelined")
+        first_audio, round_trips, requests, merged = [], [], [], []
+        if mode == "cache-hit":
+            engine.speak(LINES[0], Const.MAIN_CHANNEL)
+            await next_play(log, len(log))
+            await idle(engine)
+        for run in range(runs):
+            if mode == "pipelined":
+                # Only the first sentence needs to be new for a cold start.
+                text = LONG_LINE.replace("seconds", f"seconds, wave {run}", 1)
+            elif mode == "cache-hit":
+                text = LINES[0]
+            else:
+                text = f"{LINES[run % len(LINES)]} {mode} {run}"
+            obs.reset_counts()
+            plays = len(log)
+            start = time.monotonic()
+            engine.speak(text, Const.MAIN_CHANNEL)
+            first_audio.append(await next_play(log, plays) - start)
+            await idle(engine)
+            round_trips.append(obs.round_trips)
+            requests.append(sum(obs.requests.values()))
+            merged.append(obs.merged)
+        results[mode] = {
+            "first_audio": summarize(first_audio),
+            "obs_round_trips_per_utterance": sum(round_trips) / runs,
+            "obs_requests_per_utterance": sum(requests) / runs,
+            "obs_merged_batches_per_utterance": sum(merged) / runs,
+        }
+    engine.set_streaming_mode(False)
+    engine.set_pipeline_mode(False)
+    return results
+
+
+async def bench_macros(engine: SpeechEngine, runs: int) -> dict:
+    log = play_log(engine)
+    macros = [icon.value for icon in RaidIcon]
+    macros += [phrase.name.lower() for phrase in PhraseMacro if Const.PHRASE in phrase.value]
+    latencies = []
+    for macro in macros[: max(runs * 3, 8)]:
+        plays = len(log)
+        start = time.monotonic()
+        if not engine.play_macro(macro):
+            continue
+        latencies.append(await next_play(log, plays) - start)
+        await asyncio.sleep(0.1)
+    engine.stop()
+    await idle(engine)
+    return {"click_to_audio": summarize(latencies), "macros": len(latencies)}
+
+
+async def bench_burst(engine: SpeechEngine, bursts: int, size: int, gap: float) -> dict:
+    log = play_log(engine)
+    scheduler = engine.speech_scheduler
+    before = dict(scheduler.counters)
+    plays = len(log)
+    submitted: list[float] = []
+    start = time.monotonic()
+    for burst in range(bursts):
+        for i in range(size):
+            now = time.monotonic()
+            text = f"{LINES[i % len(LINES)]} burst {burst} line {i}"
+            if engine.speak(text, Const.MAIN_CHANNEL):
+                submitted.append(now)
+        await asyncio.sleep(gap)
+    for i in range(len(submitted)):
+        await next_play(log, plays + i, timeout=60)
+    await idle(engine)
+    wall = time.monotonic() - start
+    counters = {name: scheduler.counters[name] - before[name] for name in before}
+    played_at = [started for started, _, _ in log[plays:]]
+    return {
+        "bursts": bursts,
+        "burst_size": size,
+        "accepted": len(submitted),
+        "played": len(played_at),
+        "rejected": counters["rejected"] + counters["shed"],
+        "wall_s": round(wall, 2),
+        "utterances_per_s": round(len(played_at) / wall, 2),
+        "submit_to_audio": summarize([p - s for p, s in zip(played_at, submitted)]),
+        "scheduler": counters,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    obs = FakeObs(ITEMS)
+    await obs.start()
+    cache_dir = tempfile.mkdtemp(prefix="tts-bench-")
+    plays = []
+    engine = SpeechEngine(
+        player=PlayerPool(
+            lambda device: NullPlayer(device, plays), (Const.MAIN_CHANNEL, Const.ALT_CHANNEL)
+        ),
+        synthesizer_factory=lambda: FakeSynthesizer(args.latency, seconds_per_char=0.015, seed=1),
+        obs_url=obs.url,
+        obs_password="",
+        bubble_port=0,
+        cache_dir=cache_dir,
+    )
+    engine.set_save_audio_files(False)
+    metrics.enable(True)
+    await engine.start()
+    while not engine.obs_ready():
+        await asyncio.sleep(0.01)
+    listener = await bubble_listener(engine)
+    connect_requests = dict(obs.requests)
+
+    try:
+        speak = await bench_speak(engine, obs, args.runs)
+        macros = await bench_macros(engine, args.runs)
+        burst = await bench_burst(engine, args.bursts, args.burst_size, args.gap)
+    finally:
+        listener.close()
+        snapshot = metrics.snapshot()
+        await engine.shutdown()
+        await obs.stop()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return {
+        "benchmark": "e2e",
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "speak": speak,
+        "macros": macros,
+        "burst": burst,
+        "obs_connect_requests": connect_requests,
+        "metrics": snapshot,
+    }
+
+
+def report(results: dict) -> None:
+    print(
+        f"{'mode':<10} {'first audio p50':>16} {'p95':>8} {'OBS calls/utt':>14} {'reqs/utt':>9} "
+        f"{'merged/utt':>11}"
+    )
+    for mode, result in results["speak"].items():
+        first = result["first_audio"]
+        print(
+            f"{mode:<10} {first['p50_ms']:>13.0f} ms {first['p95_ms']:>5.0f} ms "
+            f"{result['obs_round_trips_per_utterance']:>14.1f} "
+            f"{result['obs_requests_per_utterance']:>9.1f} "
+            f"{result['obs_merged_batches_per_utterance']:>11.1f}"
+        )
+    click = results["macros"]["click_to_audio"]
+    print(f"macro click to audio: p50 {click['p50_ms']:.1f} ms, p95 {click['p95_ms']:.1f} ms")
+    burst = results["burst"]
+    latency = burst["submit_to_audio"]
+    print(
+        f"bursts: {burst['played']}/{burst['accepted']} played, {burst['rejected']} refused, "
+        f"{burst['utterances_per_s']:.2f}/s, submit to audio p50 {latency['p50_ms']:.0f} ms, "
+        f"max {latency['max_ms']:.0f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--runs", type=int, default=3, help="utterances per synthesis mode")
+    parser.add_argument("--latency", type=float, default=0.15, help="fake synthesis latency (s)")
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--burst-size", type=int, default=6)
+    parser.add_argument("--gap", type=float, default=0.5, help="seconds between bursts")
+    parser.add_argument("--out", default=os.path.join(Const.CACHE_DIR, "bench-e2e.json"))
+    args = parser.parse_args()
+    # Refused lines during the bursts are expected, so only show errors.
+    logging.basicConfig(level=logging.ERROR)
+    logging.getLogger("websockets").setLevel(logging.ERROR)
+
+    results = asyncio.run(run(args))
+    report(results)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
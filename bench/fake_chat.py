@@ -0,0 +1,69 @@
+"""Minimal IRC-style chat server for offline benchmarks.
+
+Accepts any login, and broadcasts PRIVMSG lines with Twitch-style tags to every
+connected client. Counts the messages sent and the PONGs received.
+"""
+
+import asyncio
+
+
+class FakeChat:
+    def __init__(self, room: str = "#bench", host: str = "127.0.0.1", port: int = 0):
+        self.room: str = room
+        self.host: str = host
+        self.port: int = port
+        self.sent: int = 0
+        self.pongs: int = 0
+        self._clients: set[asyncio.StreamWriter] = set()
+        self._handlers: set[asyncio.Task] = set()
+        self._joined = asyncio.Event()
+        self._server: asyncio.Server | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server:
+            for writer in self._clients:
+                writer.close()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def wait_joined(self) -> None:
+        await self._joined.wait()
+
+    def send(self, user: str, text: str, badges: str = "") -> None:
+        line = (
+            f"@badges={badges};display-name={user} "
+            f":{user.lower()}!{user.lower()}@bench PRIVMSG {self.room} :{text}\r\n"
+        )
+        self._broadcast(line)
+        self.sent += 1
+
+    def ping(self) -> None:
+        self._broadcast("PING :bench\r\n")
+
+    def _broadcast(self, line: str) -> None:
+        data = line.encode("utf-8")
+        for writer in self._clients:
+            writer.write(data)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients.add(writer)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while raw := await reader.readline():
+                line = raw.decode("utf-8").rstrip("\r\n")
+                if line.startswith("JOIN"):
+                    self._joined.set()
+                elif line.startswith("PONG"):
+                    self.pongs += 1
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
@@ -0,0 +1,89 @@
+"""Minimal OBS WebSocket v5 server for offline benchmarks.
+
+Speaks the msgpack subprotocol simpleobsws uses, accepts any password, knows a
+fixed set of scene items and answers GetSceneItemId, GetSceneItemEnabled and
+SetSceneItemEnabled, singly or batched. Every round-trip and request is counted, and
+batches that carried more than one request.
+"""
+
+from collections import Counter
+
+import msgpack
+import websockets
+
+OK = {"result": True, "code": 100}
+NOT_FOUND = {"result": False, "code": 600, "comment": "No scene items were found."}
+
+
+class FakeObs:
+    def __init__(self, items: dict[tuple[str, str], int], host: str = "127.0.0.1", port: int = 0):
+        self.items: dict[tuple[str, str], int] = items
+        self.enabled: dict[int, bool] = dict.fromkeys(items.values(), False)
+        self.host: str = host
+        self.port: int = port
+        self.round_trips: int = 0
+        self.merged: int = 0
+        self.requests: Counter[str] = Counter()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        self._server = await websockets.serve(
+            self._handle, self.host, self.port, subprotocols=["obswebsocket.msgpack"]
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def reset_counts(self) -> None:
+        self.round_trips = 0
+        self.merged = 0
+        self.requests.clear()
+
+    async def _handle(self, websocket) -> None:
+        await websocket.send(
+            msgpack.packb({"op": 0, "d": {"obsWebSocketVersion": "5.0.0", "rpcVersion": 1}})
+        )
+        async for raw in websocket:
+            message = msgpack.unpackb(raw)
+            op, data = message["op"], message["d"]
+            if op == 1:
+                reply = {"op": 2, "d": {"negotiatedRpcVersion": 1}}
+            elif op == 6:
+                self.round_trips += 1
+                reply = {"op": 7, "d": {"requestId": data["requestId"], **self._request(data)}}
+            elif op == 8:
+                self.round_trips += 1
+                self.merged += len(data["requests"]) > 1
+                results = [self._request(request) for request in data["requests"]]
+                reply = {"op": 9, "d": {"requestId": data["requestId"], "results": results}}
+            else:
+                continue
+            await websocket.send(msgpack.packb(reply))
+
+    def _request(self, request: dict) -> dict:
+        kind = request["requestType"]
+        data = request.get("requestData") or {}
+        self.requests[kind] += 1
+        response = {"requestType": kind, "requestStatus": OK}
+        if kind == "GetSceneItemId":
+            item_id = self.items.get((data["sceneName"], data["sourceName"]))
+            if item_id is None:
+                return {**response, "requestStatus": NOT_FOUND}
+            response["responseData"] = {"sceneItemId": item_id}
+        elif kind in ("GetSceneItemEnabled", "SetSceneItemEnabled"):
+            item_id = data["sceneItemId"]
+            if item_id not in self.enabled:
+                return {**response, "requestStatus": NOT_FOUND}
+            if kind == "SetSceneItemEnabled":
+                self.enabled[item_id] = data["sceneItemEnabled"]
+            else:
+                response["responseData"] = {"sceneItemEnabled": self.enabled[item_id]}
+        return response
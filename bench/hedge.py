@@ -0,0 +1,84 @@
+"""Hedged synthesis against a slow-tailed primary, with the offline FakeSynthesizer.
+
+The primary is a pool of fake Azure connections where a share of requests
+stalls; the fallback is a fast fake local backend, and espeak-ng when it is
+installed. Reports time to audio without and with hedging, the hedge rate and
+who won. Run from the repository root:
+
+    python -m bench.hedge
+"""
+
+import asyncio
+import time
+
+from const import Hedge, SynthPool
+from synthesis import (
+    EspeakSynthesizer,
+    FakeSynthesizer,
+    HedgedSynthesis,
+    SynthesisError,
+    SynthesizerPool,
+)
+
+REQUESTS = 40
+LATENCY = 0.15
+SLOW_RATE = 0.1
+SLOW_LATENCY = 2.5
+VOICE = "en-US-JaneNeural"
+
+
+def ssml(text: str) -> str:
+    return f'<speak><voice name="{VOICE}">{text}</voice></speak>'
+
+
+async def run(fallback_factory) -> tuple[list[float], dict]:
+    pool = SynthesizerPool(
+        lambda: FakeSynthesizer(
+            LATENCY, seconds_per_char=0.01, slow_rate=SLOW_RATE, slow_latency=SLOW_LATENCY, seed=1
+        ),
+        SynthPool.SIZE,
+    )
+    hedge = HedgedSynthesis(fallback_factory, Hedge.DEADLINE_MS / 1000)
+    await asyncio.gather(pool.start(), hedge.start())
+    latencies = []
+    for i in range(REQUESTS):
+        start = time.perf_counter()
+        primary = asyncio.create_task(pool.synthesize(ssml(f"Stack on skull {i}"), VOICE))
+        try:
+            await hedge.race(primary, ssml(f"Stack on skull {i}"))
+        except SynthesisError:
+            pass
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+    await pool.stop()
+    return sorted(latencies), hedge.stats()
+
+
+async def main() -> None:
+    print(
+        f"{REQUESTS} requests, {SLOW_RATE:.0%} stall for {SLOW_LATENCY}s, "
+        f"deadline {Hedge.DEADLINE_MS} ms"
+    )
+    print(
+        f"{'fallback':<10} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>7} "
+        f"{'hedged':>7} {'fallback won':>13}"
+    )
+    fallbacks = {
+        "none": None,
+        "fake": lambda: FakeSynthesizer(0.04, seconds_per_char=0.01),
+        "espeak-ng": EspeakSynthesizer,
+    }
+    for name, factory in fallbacks.items():
+        latencies, stats = await run(factory)
+        if factory and not stats["fallback"]:
+            print(f"{name:<10} not available")
+            continue
+        print(
+            f"{name:<10} {latencies[len(latencies) // 2] * 1000:>7.0f} "
+            f"{latencies[int(len(latencies) * 0.95)] * 1000:>7.0f} {latencies[-1] * 1000:>7.0f} "
+            f"{stats['hedge_rate']:>7.0%} {stats['fallback_win_rate']:>13.0%}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
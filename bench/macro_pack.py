@@ -0,0 +1,55 @@
+"""Loading the macro library from loose WAV files versus a memory-mapped macro pack.
+
+Packs the macro folder into a temporary pack, then times MacroBank loading both
+ways (file reads, post-processing and lip sync per file, against mapping the pack
+with everything precomputed) and reports the memory each copies. Run from the
+repository root:
+
+    python -m bench.macro_pack
+"""
+
+import os
+import tempfile
+import timeit
+
+from const import Const
+from macro_bank import MacroBank
+from macro_pack import MacroPack, pack_directory
+
+REPEAT = 5
+
+
+def load_files() -> MacroBank:
+    bank = MacroBank(lambda audio: None)
+    bank.load(Const.MACRO_FILE.replace(Const.REPLACE, "*"))
+    return bank
+
+
+def load_pack(path: str) -> MacroBank:
+    bank = MacroBank(lambda audio: None)
+    bank.load_pack(path, Const.MACRO_DIR)
+    return bank
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory(prefix="tts-bench-") as directory:
+        path = os.path.join(directory, "macros.pack")
+        entries = pack_directory(Const.MACRO_DIR, path)
+        size = os.path.getsize(path)
+        print(f"{entries} macros, pack of {size / 1e6:.2f} MB")
+
+        open_ms = min(timeit.repeat(lambda: MacroPack(path).close(), number=1, repeat=REPEAT))
+        files_ms = min(timeit.repeat(load_files, number=1, repeat=REPEAT))
+        pack_ms = min(timeit.repeat(lambda: load_pack(path), number=1, repeat=REPEAT))
+        files, pack = load_files().stats(), load_pack(path).stats()
+        print(f"{'source':<12} {'load ms':>8} {'copied MB':>10} {'mapped MB':>10}")
+        print(f"{'open pack':<12} {open_ms * 1000:>8.2f} {0:>10.2f} {size / 1e6:>10.2f}")
+        for name, ms, stats in (("loose files", files_ms, files), ("pack", pack_ms, pack)):
+            print(
+                f"{name:<12} {ms * 1000:>8.2f} {stats['bytes'] / 1e6:>10.2f} "
+                f"{stats['mapped_bytes'] / 1e6:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Micro-benchmark for text normalization as the rule count grows.
+
+Compares the compiled single-pass Rules matcher against the old loop of one
+re.sub per rule. Run from the repository root:
+
+    python -m bench.normalize
+"""
+
+import random
+import re
+import string
+import timeit
+
+from text import Rules
+
+SENTENCE = (
+    "Pull in 10, tanks stack on skull and healers watch the retard who stands in fire, "
+    "dispel the debuff and don;t forget to interrupt the boss"
+)
+RULE_COUNTS = (10, 100, 1000, 10000)
+
+
+def make_rules(count: int) -> dict[str, str]:
+    random.seed(count)
+    rules = {"retard": "re'tard", "don;t": "don't"}
+    while len(rules) < count:
+        word = "".join(random.choices(string.ascii_lowercase, k=random.randint(4, 12)))
+        rules[word] = word.upper()
+    return rules
+
+
+def per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main() -> None:
+    print(f"{'rules':>7} {'compile ms':>11} {'compiled us':>12} {'re.sub loop us':>15}")
+    for count in RULE_COUNTS:
+        rules = make_rules(count)
+        compile_ms = timeit.timeit(lambda: Rules(rules, whole_words=True), number=1) * 1000
+        compiled = Rules(rules, whole_words=True)
+        compiled_us = per_call_us(lambda: compiled.apply(SENTENCE, escape=True), 2000)
+
+        def loop():
+            text = SENTENCE
+            for mispronounced, repronounced in rules.items():
+                text = re.sub(mispronounced, repronounced, text, flags=re.IGNORECASE)
+            return text
+
+        loop_us = per_call_us(loop, max(1, 20000 // count))
+        print(f"{count:>7} {compile_ms:>11.1f} {compiled_us:>12.1f} {loop_us:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
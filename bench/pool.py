@@ -0,0 +1,69 @@
+"""Synthesizer pool under mixed load, against the offline FakeSynthesizer.
+
+A slow custom-macro render and a burst of pipelined sentences run while short
+live callouts arrive; reports callout latency, pool wait and utilization per
+pool size. Run from the repository root:
+
+    python -m bench.pool
+"""
+
+import asyncio
+import time
+
+from synthesis import FakeSynthesizer, SynthesisError, SynthesizerPool
+
+POOL_SIZES = (1, 2, 3, 4)
+LATENCY = 0.15
+CALLOUTS = 20
+VOICES = ("en-US-JaneNeural", "en-GB-SoniaNeural")
+
+
+def ssml(text: str) -> str:
+    return f"<speak>{text}</speak>"
+
+
+async def run(size: int) -> tuple[list[float], dict]:
+    pool = SynthesizerPool(
+        lambda: FakeSynthesizer(LATENCY, seconds_per_char=0.01, failure_rate=0.05), size
+    )
+    await pool.start()
+
+    async def request(text: str, voice: str) -> float:
+        start = time.perf_counter()
+        try:
+            await pool.synthesize(ssml(text), voice)
+        except SynthesisError:
+            pass
+        return time.perf_counter() - start
+
+    custom = asyncio.create_task(request("A long custom macro " * 20, VOICES[1]))
+    sentences = [
+        asyncio.create_task(request(f"Pipelined sentence number {i}.", VOICES[0]))
+        for i in range(6)
+    ]
+    callouts = []
+    for i in range(CALLOUTS):
+        callouts.append(await request(f"Stack on skull {i}", VOICES[i % 2]))
+        await asyncio.sleep(0.05)
+    await asyncio.gather(custom, *sentences)
+    stats = pool.stats()
+    await pool.stop()
+    return sorted(callouts), stats
+
+
+async def main() -> None:
+    print(
+        f"{'size':>4} {'callout p50 ms':>15} {'callout max ms':>15} "
+        f"{'wait p95 ms':>12} {'util':>6} {'affinity':>9} {'reopened':>9}"
+    )
+    for size in POOL_SIZES:
+        callouts, stats = await run(size)
+        print(
+            f"{size:>4} {callouts[len(callouts) // 2] * 1000:>15.0f} {callouts[-1] * 1000:>15.0f} "
+            f"{stats['wait_p95_ms']:>12.0f} {stats['utilization']:>6.0%} "
+            f"{stats['affinity_hits']:>9} {stats['reopened']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""Micro-benchmark for audio post-processing (silence trimming and loudness).
+
+Times PostProcessor on speech-like audio, in one piece as for complete
+synthesis and macros, and in 100 ms chunks as for streaming, and reports the
+cost per second of audio along with what was trimmed. Uses the macro files too
+when they are there. Run from the repository root:
+
+    python -m bench.postprocess
+"""
+
+import glob
+import timeit
+
+import numpy as np
+
+from audio import CHUNK_SIZE, SAMPLE_RATE, split_wav
+from const import Const
+from postprocess import PostProcessor
+
+SECONDS = (1, 5, 20)
+
+
+def speech_like(seconds: float, level: float = 3000.0) -> bytes:
+    """A tone with a syllable-rate envelope and pauses, padded with silence."""
+    rng = np.random.default_rng(1)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    voice = level * np.sin(2 * np.pi * 220 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t))
+    voice[(t % 2.0) > 1.7] = 0  # a pause every two seconds
+    noise = rng.normal(0, 2, len(t))  # a little dither in the silence
+    pad = np.zeros(SAMPLE_RATE // 4)
+    return np.concatenate((pad, voice + noise, pad * 2)).astype("<i2").tobytes()
+
+
+def whole(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> PostProcessor:
+    processor = PostProcessor(sample_rate)
+    processor.feed(pcm)
+    processor.finish()
+    return processor
+
+
+def chunked(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> PostProcessor:
+    processor = PostProcessor(sample_rate)
+    for offset in range(0, len(pcm), CHUNK_SIZE):
+        processor.feed(pcm[offset : offset + CHUNK_SIZE])
+    processor.finish()
+    return processor
+
+
+def per_audio_second(run, pcm: bytes, sample_rate: int = SAMPLE_RATE) -> float:
+    """Microseconds of processing per second of audio, best of 5."""
+    number = 20
+    best = min(timeit.repeat(lambda: run(pcm, sample_rate), number=number, repeat=5)) / number
+    return best / (len(pcm) / 2 / sample_rate) * 1e6
+
+
+def main() -> None:
+    print(f"{'audio':>8} {'whole us/s':>11} {'chunked us/s':>13} {'trimmed ms':>11}")
+    for seconds in SECONDS:
+        pcm = speech_like(seconds)
+        trimmed = whole(pcm).trimmed / SAMPLE_RATE * 1000
+        print(
+            f"{seconds:>6} s {per_audio_second(whole, pcm):>11.0f} "
+            f"{per_audio_second(chunked, pcm):>13.0f} {trimmed:>11.0f}"
+        )
+
+    files = sorted(glob.glob(Const.MACRO_FILE.replace(Const.REPLACE, "*")))
+    if files:
+        total, cost, trimmed = 0.0, 0.0, 0.0
+        for file in files:
+            with open(file, "rb") as f:
+                pcm, sample_rate = split_wav(f.read())
+            pcm = bytes(pcm)
+            seconds = len(pcm) / 2 / sample_rate
+            total += seconds
+            cost += per_audio_second(whole, pcm, sample_rate) * seconds
+            trimmed += whole(pcm, sample_rate).trimmed / sample_rate
+        print(
+            f"{len(files)} macros, {total:.1f} s of audio: {cost / total:.0f} us/s, "
+            f"{trimmed / len(files) * 1000:.0f} ms of silence trimmed per macro"
+        )
+
+
+if __name__ == "__main__":
+    main()
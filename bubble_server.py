@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Callable
+
+from local_http import EventStream, read_request, respond, respond_json
+from metrics import metrics
+
+_LOGGER = logging.getLogger("TTS.bubble")
+
+CONTENT_TYPES = {".html": "text/html; charset=utf-8", ".png": "image/png", ".svg": "image/svg+xml"}
+
+
+class BubbleServer:
+    """Localhost HTTP server that pushes speech-bubble updates to the OBS browser source.
+
+    The bubble page (GET /) opens a Server-Sent Events stream on /events once and
+    receives each update as a small JSON message; the latest one is replayed to
+    new connections. After rendering, the page posts the message's seq to /ack,
+    which gives the update-to-render latency. Other local JSON endpoints, such as
+    metrics, can be added with add_route().
+    """
+
+    def __init__(self, host: str, port: int, page: str, static_dirs: tuple[str, ...] = ("icons",)):
+        self.host: str = host
+        self.port: int = port
+        self.page: str = page
+        self.static_dirs: tuple[str, ...] = static_dirs
+        self._server: asyncio.Server | None = None
+        self._routes: dict[str, Callable[[], dict]] = {}
+        self._events = EventStream(replay_last=True)
+        self._seq: int = 0
+        self._sent: dict[int, float] = {}
+        self.latencies: deque[float] = deque(maxlen=200)
+        self.counters: dict[str, int] = dict.fromkeys(("pushes", "acks"), 0)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/"
+
+    @property
+    def clients(self) -> int:
+        """Number of bubble pages currently listening."""
+        return self._events.listeners
+
+    def add_route(self, path: str, handler: Callable[[], dict]) -> None:
+        """Serve the result of handler() as JSON on GET path."""
+        self._routes[path] = handler
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # if bound to port 0
+        _LOGGER.info("Speech bubble server listening on %s", self.url)
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            self._events.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def push(self, text: str, alt_channel: bool = False, icon: str | None = None) -> int:
+        """Send a bubble update to every connected page. Returns its sequence number."""
+        self._seq += 1
+        self._sent[self._seq] = time.perf_counter()
+        if len(self._sent) > 100:
+            del self._sent[min(self._sent)]
+        self._events.publish({"seq": self._seq, "text": text, "alt": alt_channel, "icon": icon})
+        self.counters["pushes"] += 1
+        return self._seq
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            method, path, _, body = await read_request(reader)
+            if method == "GET" and path == "/events":
+                await self._events.serve(writer)
+            elif method == "POST" and path == "/ack":
+                self._ack(body)
+                await respond(writer, 204)
+            elif method == "GET" and path in self._routes:
+                await respond_json(writer, self._routes[path]())
+            elif method == "GET":
+                await self._serve_file(writer, path)
+            else:
+                await respond(writer, 405)
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError) as e:
+            _LOGGER.debug("Bubble request failed: %s", e)
+        finally:
+            writer.close()
+
+    def _ack(self, body: bytes) -> None:
+        sent = self._sent.pop(int(body or 0), None)
+        if sent is not None:
+            self.latencies.append(time.perf_counter() - sent)
+            metrics.record("bubble.render", self.latencies[-1])
+            self.counters["acks"] += 1
+
+    async def _serve_file(self, writer: asyncio.StreamWriter, path: str) -> None:
+        path = path.split("?", 1)[0].lstrip("/")
+        if not path:
+            file = self.page
+        elif os.path.dirname(path) in self.static_dirs and ".." not in path:
+            file = path
+        else:
+            await respond(writer, 404)
+            return
+        try:
+            with open(file, "rb") as f:
+                data = f.read()
+        except OSError:
+            await respond(writer, 404)
+            return
+        content_type = CONTENT_TYPES.get(os.path.splitext(file)[1], "application/octet-stream")
+        await respond(writer, 200, data, content_type)
+
+    def stats(self) -> dict:
+        """Connected pages, push/ack counters and update-to-render latency."""
+        latencies = sorted(self.latencies)
+        return {
+            "clients": self._events.listeners,
+            "connections": self._events.connections,
+            "render_mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            "render_p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+            "render_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+            **self.counters,
+        }
@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from postprocess import PROCESSING
+
+_LOGGER = logging.getLogger("TTS.cache")
+
+
+class SynthesisCache:
+    """Content-addressed cache of synthesized audio, keyed on the final SSML and how
+    the audio was post-processed.
+
+    Entries live in an in-memory LRU tier backed by an on-disk tier capped by size.
+    Keys are prefixed with voice and emotion so entries can be invalidated per voice.
+    """
+
+    SUFFIX = ".wav"
+
+    def __init__(self, directory: str, max_entries: int, max_disk_bytes: int):
+        self.directory: str = directory
+        self.max_entries: int = max_entries
+        self.max_disk_bytes: int = max_disk_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._disk: OrderedDict[str, int] = OrderedDict()  # key -> size, oldest first
+        self._disk_bytes: int = 0
+        self._lock = threading.Lock()
+
+        self.memory_hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        self._scan()
+
+    @staticmethod
+    def key(ssml: str, voice: str, emotion: str) -> str:
+        """Build the cache key for an SSML document."""
+        digest = hashlib.sha256(f"{PROCESSING}:{ssml}".encode("utf-8")).hexdigest()
+        return f"{voice}.{emotion.lower()}.{digest}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _scan(self) -> None:
+        """Index the files already on disk, least recently used first."""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name.removesuffix(self.SUFFIX), stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        _LOGGER.info(
+            "Synthesis cache: %d entries on disk (%.1f MB)", len(self._disk), self._disk_bytes / 1e6
+        )
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def get(self, key: str) -> bytes | None:
+        """Return cached audio for key, promoting disk hits into memory."""
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return audio
+            on_disk = key in self._disk
+
+        if on_disk:
+            try:
+                with open(self._path(key), "rb") as f:
+                    audio = f.read()
+                os.utime(self._path(key))
+            except OSError as e:
+                _LOGGER.warning("Synthesis cache: could not read %s: %s", key, e)
+                with self._lock:
+                    self._disk_bytes -= self._disk.pop(key, 0)
+            else:
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self._remember(key, audio)
+                    self.disk_hits += 1
+                return audio
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, audio: bytes) -> None:
+        """Store audio in both tiers, evicting least recently used entries as needed."""
+        with self._lock:
+            self._remember(key, audio)
+            if key in self._disk or len(audio) > self.max_disk_bytes:
+                return
+
+        tmp = self._path(key) + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(audio)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            _LOGGER.warning("Synthesis cache: could not write %s: %s", key, e)
+            return
+
+        with self._lock:
+            self._disk[key] = len(audio)
+            self._disk_bytes += len(audio)
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self.evictions += 1
+                self._unlink(old_key)
+
+    def _remember(self, key: str, audio: bytes) -> None:
+        """Insert into the memory tier. Caller holds the lock."""
+        self._memory[key] = audio
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _unlink(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def invalidate(self, voice: str | None = None, emotion: str | None = None) -> int:
+        """Drop entries for a voice and/or emotion, or everything if neither is given."""
+
+        def matches(key: str) -> bool:
+            key_voice, key_emotion, _ = key.split(".", 2)
+            return (not voice or key_voice == voice) and (
+                not emotion or key_emotion == emotion.lower()
+            )
+
+        with self._lock:
+            memory_keys = [k for k in self._memory if matches(k)]
+            for key in memory_keys:
+                del self._memory[key]
+            disk_keys = [k for k in self._disk if matches(k)]
+            for key in disk_keys:
+                self._disk_bytes -= self._disk.pop(key)
+
+        for key in disk_keys:
+            self._unlink(key)
+        removed = len(set(memory_keys) | set(disk_keys))
+        _LOGGER.info("Synthesis cache: invalidated %d entries", removed)
+        return removed
+
+    def stats(self) -> dict:
+        """Hit/miss counters and tier sizes."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            }
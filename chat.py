@@ -0,0 +1,354 @@
+import asyncio
+import logging
+import random
+import re
+import ssl
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+from const import Chat, ChatOverflow, SpeechSource
+from metrics import metrics
+
+_LOGGER = logging.getLogger("TTS.chat")
+
+URL = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+NOT_WORD = re.compile(r"[^\w\s]+")
+STRETCHED = re.compile(r"(\w)\1+")
+BADGE_PRIORITY = {"broadcaster": 3, "moderator": 2, "vip": 1, "subscriber": 1}
+
+
+@dataclass
+class ChatMessage:
+    user: str
+    text: str
+    priority: int = 0
+    received: float = field(default_factory=time.monotonic)
+
+
+def parse_line(line: str) -> ChatMessage | None:
+    """A chat message from a PRIVMSG line, or None for any other line.
+
+    IRCv3 tags are optional; display-name and badges are used when present."""
+    tags = {}
+    if line.startswith("@"):
+        raw_tags, _, line = line[1:].partition(" ")
+        tags = dict(tag.partition("=")[::2] for tag in raw_tags.split(";"))
+    if not line.startswith(":"):
+        return None
+    prefix, _, rest = line[1:].partition(" ")
+    command, _, rest = rest.partition(" ")
+    if command != "PRIVMSG":
+        return None
+    text = rest.partition(" :")[2]
+    if text.startswith("\x01ACTION "):
+        text = text[8:].rstrip("\x01")
+    user = tags.get("display-name") or prefix.split("!", 1)[0]
+    badges = {badge.split("/", 1)[0] for badge in tags.get("badges", "").split(",") if badge}
+    priority = max((BADGE_PRIORITY.get(badge, 0) for badge in badges), default=0)
+    return ChatMessage(user, text, priority)
+
+
+class ChatGate:
+    """Admission control between chat and the speech path.
+
+    Messages are cleaned up and capped at max_chars, then refused when their
+    user is over the rate limit (a token bucket per user) or when the same
+    message, give or take case, punctuation and stretched letters, was let in
+    within duplicate_window. Admitted messages wait in a bounded backlog; when
+    it is full the oldest, or the lowest-priority message makes room. Messages
+    that waited longer than max_lag are dropped, so speech never falls far
+    behind chat.
+    """
+
+    def __init__(
+        self,
+        max_chars: int = Chat.MAX_CHARS,
+        backlog: int = Chat.BACKLOG,
+        overflow: ChatOverflow = ChatOverflow.DROP_OLDEST,
+        max_lag: float = Chat.MAX_LAG_S,
+        user_burst: int = Chat.USER_BURST,
+        user_every: float = Chat.USER_EVERY_S,
+        duplicate_window: float = Chat.DUPLICATE_WINDOW_S,
+    ):
+        self.max_chars: int = max_chars
+        self.backlog: int = backlog
+        self.overflow: ChatOverflow = overflow
+        self.max_lag: float = max_lag
+        self.user_burst: int = user_burst
+        self.user_every: float = user_every
+        self.duplicate_window: float = duplicate_window
+        self._queue: deque[ChatMessage] = deque()
+        self._available = asyncio.Event()
+        self._buckets: dict[str, tuple[float, float]] = {}  # user: (tokens, updated)
+        self._recent: dict[str, float] = {}  # duplicate key: admitted at, oldest first
+
+        self.lags: deque[float] = deque(maxlen=200)
+        self.counters: dict[str, int] = dict.fromkeys(
+            (
+                "ingested",
+                "admitted",
+                "spoken",
+                "filtered",
+                "rate_limited",
+                "duplicate",
+                "overflow",
+                "stale",
+            ),
+            0,
+        )
+        self.max_backlog_seen: int = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def clean(self, text: str) -> str:
+        """Text worth reading out: links shortened, length capped at a word boundary.
+        Bot commands and empty messages become ''."""
+        text = " ".join(URL.sub("link", text).split())
+        if text.startswith("!"):
+            return ""
+        if len(text) > self.max_chars:
+            text = text[: self.max_chars].rsplit(" ", 1)[0]
+        return text
+
+    @staticmethod
+    def duplicate_key(text: str) -> str:
+        """Text reduced so that near-duplicates (GG, gg!!, ggggg gg) compare equal."""
+        words = STRETCHED.sub(r"\1", NOT_WORD.sub("", text.lower())).split()
+        return " ".join(word for i, word in enumerate(words) if i == 0 or word != words[i - 1])
+
+    def offer(self, message: ChatMessage) -> bool:
+        """Admit a message to the backlog. Returns False if it was refused."""
+        self.counters["ingested"] += 1
+        now = message.received
+        message.text = self.clean(message.text)
+        if not message.text:
+            self.counters["filtered"] += 1
+            return False
+        if not self._take_token(message.user.lower(), now):
+            self.counters["rate_limited"] += 1
+            return False
+        while self._recent:
+            key, admitted = next(iter(self._recent.items()))
+            if now - admitted < self.duplicate_window:
+                break
+            del self._recent[key]
+        key = self.duplicate_key(message.text)
+        if key in self._recent:
+            self.counters["duplicate"] += 1
+            return False
+
+        if len(self._queue) >= self.backlog:
+            if self.overflow == ChatOverflow.DROP_LOWEST:
+                victim = min(self._queue, key=lambda queued: queued.priority)
+                if victim.priority > message.priority:
+                    victim = message
+            else:
+                victim = self._queue[0]
+            self.counters["overflow"] += 1
+            if victim is message:
+                return False
+            self._queue.remove(victim)
+        self._queue.append(message)
+        # Only once admitted, so a message refused for overflow doesn't block its repeats.
+        self._recent[key] = now
+        self.counters["admitted"] += 1
+        self.max_backlog_seen = max(self.max_backlog_seen, len(self._queue))
+        self._available.set()
+        return True
+
+    def _take_token(self, user: str, now: float) -> bool:
+        if len(self._buckets) > 10000:
+            # Forget users whose bucket has refilled anyway.
+            full = self.user_every * self.user_burst
+            self._buckets = {
+                name: bucket for name, bucket in self._buckets.items() if now - bucket[1] < full
+            }
+        tokens, updated = self._buckets.get(user, (self.user_burst, now))
+        tokens = min(self.user_burst, tokens + (now - updated) / self.user_every)
+        if tokens < 1:
+            self._buckets[user] = (tokens, now)
+            return False
+        self._buckets[user] = (tokens - 1, now)
+        return True
+
+    async def get(self) -> ChatMessage:
+        """The next message to speak, skipping those that waited too long."""
+        while True:
+            if not self._queue:
+                self._available.clear()
+                await self._available.wait()
+                continue
+            message = self._queue.popleft()
+            lag = time.monotonic() - message.received
+            if lag > self.max_lag:
+                self.counters["stale"] += 1
+                continue
+            return message
+
+    def spoken(self, message: ChatMessage) -> None:
+        """Record that a message started to be read out."""
+        lag = time.monotonic() - message.received
+        self.counters["spoken"] += 1
+        self.lags.append(lag)
+        metrics.record("chat.lag", lag)
+
+    def stats(self) -> dict:
+        """Counters, backlog and how far behind chat speech is."""
+        lags = sorted(self.lags)
+        return {
+            **self.counters,
+            "backlog": len(self._queue),
+            "max_backlog_seen": self.max_backlog_seen,
+            "oldest_s": time.monotonic() - self._queue[0].received if self._queue else 0.0,
+            "lag_p50_s": lags[len(lags) // 2] if lags else 0.0,
+            "lag_p95_s": lags[int(len(lags) * 0.95)] if lags else 0.0,
+            "lag_max_s": lags[-1] if lags else 0.0,
+        }
+
+
+class ChatConnection:
+    """Reads a chat room over an IRC-style line protocol (Twitch chat, or any IRC
+    server) and passes each message on. Reconnects with jittered exponential
+    backoff until stopped."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        room: str,
+        nick: str,
+        token: str,
+        on_message: Callable[[ChatMessage], object],
+        use_tls: bool | None = None,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ):
+        self.host: str = host
+        self.port: int = port
+        self.room: str = room if room.startswith("#") else f"#{room}"
+        self.nick: str = nick
+        self.token: str = token
+        self.on_message = on_message
+        self.use_tls: bool = port == 6697 if use_tls is None else use_tls
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.connected: bool = False
+        self.counters: dict[str, int] = dict.fromkeys(
+            ("connects", "disconnects", "failed_attempts", "lines"), 0
+        )
+
+    async def run(self) -> None:
+        """Read chat until cancelled."""
+        attempt = 0
+        while True:
+            context = ssl.create_default_context() if self.use_tls else None
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port, ssl=context)
+            except OSError as e:
+                self.counters["failed_attempts"] += 1
+                if attempt == 0:
+                    _LOGGER.warning("Chat connection failed: %s", e)
+                delay = min(self.max_delay, self.base_delay * 2**attempt)
+                attempt += 1
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                continue
+
+            attempt = 0
+            self.counters["connects"] += 1
+            try:
+                await self._read(reader, writer)
+            except (OSError, asyncio.IncompleteReadError) as e:
+                _LOGGER.debug("Chat connection error: %s", e)
+            finally:
+                self.connected = False
+                writer.close()
+            self.counters["disconnects"] += 1
+            _LOGGER.warning("Chat disconnected, reconnecting...")
+
+    async def _read(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        login = []
+        if self.token:
+            token = self.token if self.token.startswith("oauth:") else f"oauth:{self.token}"
+            login.append(f"PASS {token}")
+        login += [
+            f"NICK {self.nick}",
+            "CAP REQ :twitch.tv/tags",
+            f"JOIN {self.room}",
+        ]
+        writer.write("".join(f"{line}\r\n" for line in login).encode("utf-8"))
+        await writer.drain()
+        self.connected = True
+        _LOGGER.info("Reading chat in %s on %s", self.room, self.host)
+
+        while raw := await reader.readline():
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            self.counters["lines"] += 1
+            if line.startswith("PING"):
+                writer.write(f"PONG{line[4:]}\r\n".encode("utf-8"))
+                await writer.drain()
+            elif message := parse_line(line):
+                self.on_message(message)
+
+
+class ChatReader:
+    """Reads chat out loud on an audio channel.
+
+    Messages go from the connection through a ChatGate to the engine's speech
+    scheduler, which gets only a line or two at a time: the backlog is kept
+    here, where the gate decides what to drop, and typed lines and macros
+    always go first.
+    """
+
+    def __init__(self, engine, connection_args: dict, channel: str, gate: ChatGate | None = None):
+        self.engine = engine
+        self.channel: str = channel
+        self.gate: ChatGate = gate or ChatGate()
+        self.connection = ChatConnection(**connection_args, on_message=self.gate.offer)
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self.connection.run()),
+            asyncio.create_task(self._feed()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _feed(self) -> None:
+        scheduler = self.engine.schedulers[self.channel]
+        while True:
+            await scheduler.wait_below(Chat.QUEUED)
+            message = await self.gate.get()
+            queued = self.engine.submit_speech(
+                SpeechSource.CHAT,
+                f"{message.user}:{message.text}",
+                lambda message=message: self._speak(message),
+                channel=self.channel,
+            )
+            if queued and self.engine.batcher.enabled:
+                # Synthesized while the line ahead plays, in a batch with any lines queued
+                # along with it.
+                self.engine.prefetch(self._line(message))
+
+    @staticmethod
+    def _line(message: ChatMessage) -> str:
+        return f"{message.user.replace('_', ' ').strip()} says: {message.text}"
+
+    async def _speak(self, message: ChatMessage) -> None:
+        self.gate.spoken(message)
+        await self.engine.speak_text(self._line(message), (self.channel,))
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connection.connected,
+            **self.connection.counters,
+            **self.gate.stats(),
+        }
@@ -0,0 +1,107 @@
+import asyncio
+import json
+from typing import AsyncIterator
+
+from const import EngineApi
+
+
+class EngineUnavailable(Exception):
+    """The engine service could not be reached or rejected the request."""
+
+
+class EngineClient:
+    """Asyncio client for the engine service's local HTTP API (see service.py)."""
+
+    def __init__(self, host: str = EngineApi.HOST, port: int = int(EngineApi.PORT)):
+        self.host: str = host
+        self.port: int = port
+
+    async def request(self, method: str, path: str, data: dict | None = None) -> dict:
+        """Send one request and return the JSON response."""
+        body = json.dumps(data).encode("utf-8") if data is not None else b""
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except OSError as e:
+            raise EngineUnavailable(f"TTS engine not reachable: {e}") from e
+        try:
+            head = (
+                f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+            )
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+            status, response = await self._read_response(reader)
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            raise EngineUnavailable(f"TTS engine request failed: {e}") from e
+        finally:
+            writer.close()
+        if status != 200:
+            raise EngineUnavailable(response.get("error", f"HTTP {status}"))
+        return response
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader) -> tuple[int, dict]:
+        status = int((await reader.readline()).split(b" ", 2)[1])
+        length = 0
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        body = await reader.readexactly(length)
+        return status, json.loads(body) if body else {}
+
+    async def events(self) -> AsyncIterator[dict]:
+        """Yield events from /events until the service goes away."""
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except OSError as e:
+            raise EngineUnavailable(f"TTS engine not reachable: {e}") from e
+        try:
+            writer.write(f"GET /events HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            while line := await reader.readline():
+                if line.startswith(b"data: "):
+                    yield json.loads(line[6:])
+        finally:
+            writer.close()
+
+    async def state(self) -> dict:
+        return await self.request("GET", "/state")
+
+    async def speak(self, text: str, channel: str = "main") -> bool:
+        return (await self.request("POST", "/speak", {"text": text, "channel": channel}))["queued"]
+
+    async def speculate(self, text: str) -> None:
+        await self.request("POST", "/speculate", {"text": text})
+
+    async def macro(self, name: str) -> bool:
+        return (await self.request("POST", "/macro", {"name": name}))["queued"]
+
+    async def countdown(
+        self, start: int, interval: float = 1.0, intro: str = "", final: str = ""
+    ) -> bool:
+        data = {"from": start, "interval": interval, "intro": intro, "final": final}
+        return (await self.request("POST", "/countdown", data))["queued"]
+
+    async def repeat(self) -> bool:
+        return (await self.request("POST", "/repeat"))["queued"]
+
+    async def stop(self, channel: str | None = None) -> None:
+        await self.request("POST", "/stop", {"channel": channel} if channel else None)
+
+    async def set_custom_macro(self, text: str) -> bool:
+        return (await self.request("POST", "/custom", {"text": text}))["queued"]
+
+    async def settings(self, **settings) -> dict:
+        return await self.request("POST", "/settings", settings)
+
+    async def obs(self, connect: bool) -> dict:
+        return await self.request("POST", "/obs", {"connect": connect})
+
+    async def rebuild_macro_pack(self) -> dict:
+        return await self.request("POST", "/macros/rebuild")
+
+    async def clear_voice_cache(self) -> int:
+        return (await self.request("POST", "/cache/clear"))["removed"]
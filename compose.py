@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from typing import Callable
+
+import numpy as np
+
+from audio import AudioBuffer, resample, wav_header
+from const import Compose, Const, PostProcess
+from metrics import metrics
+from postprocess import db_to_level
+
+_LOGGER = logging.getLogger("TTS.compose")
+
+TOKEN = re.compile(r"\d+|[a-z']+|[,.;:!?]")
+PAUSE = ","
+
+
+def number_clips(number: int) -> list[str]:
+    """Clip names that say a whole number, e.g. 125 -> _1 _100 _20 _5."""
+    if number < 20:
+        return [f"{Const._}{number}"]
+    if number < 100:
+        tens, ones = divmod(number, 10)
+        return [f"{Const._}{tens * 10}"] + (number_clips(ones) if ones else [])
+    if number < 1000:
+        hundreds, rest = divmod(number, 100)
+        return number_clips(hundreds) + [f"{Const._}100"] + (number_clips(rest) if rest else [])
+    if number < 1_000_000:
+        thousands, rest = divmod(number, 1000)
+        return number_clips(thousands) + [f"{Const._}1000"] + (number_clips(rest) if rest else [])
+    raise ValueError(f"{number} is too large to compose")
+
+
+class Composer:
+    """Splices pre-rendered macro clips into numbers and short templates, such as
+    "5, 4, 3, 2, 1" or "skull in 30", without a synthesis request.
+
+    clip(name) returns the PCM, sample rate and spoken text of a clip, or None if
+    there isn't one. A word is only used when it is exactly what its clip says, so
+    "dispel" isn't answered with "Dispelling". Numbers are spelled out from the
+    number clips, and punctuation becomes a pause. Each clip's trailing silence
+    is cut down to a short gap, and clips at another rate are resampled."""
+
+    def __init__(
+        self,
+        clip: Callable[[str], tuple[bytes | memoryview, int, str] | None],
+        gap: float = Compose.GAP_MS / 1000,
+        pause: float = Compose.PAUSE_MS / 1000,
+    ):
+        self.clip = clip
+        self.gap: float = gap
+        self.pause: float = pause
+        self.silence: float = db_to_level(PostProcess.SILENCE_DB) * 32768
+        self.counters: dict[str, int] = dict.fromkeys(("composed", "missing"), 0)
+
+    def plan(self, text: str) -> list[str] | None:
+        """Clip names (and pauses) for text, or None if it has anything other than
+        words, numbers and punctuation, or a number too large to say."""
+        if TOKEN.sub("", text.lower()).strip():
+            return None
+        names = []
+        for token in TOKEN.findall(text.lower()):
+            if token.isdigit():
+                try:
+                    names += number_clips(int(token))
+                except ValueError:
+                    return None
+            elif not token[0].isalpha():
+                if names and names[-1] != PAUSE:
+                    names.append(PAUSE)
+            else:
+                names.append(token)
+        while names and names[-1] == PAUSE:
+            names.pop()
+        return names or None
+
+    def can_compose(self, text: str) -> bool:
+        """Whether compose() would succeed for text, without building any audio or
+        counting it, e.g. to decide whether to synthesize it ahead of time."""
+        names = self.plan(text)
+        return names is not None and all(
+            name == PAUSE or self._lookup(name) is not None for name in names
+        )
+
+    def compose(self, text: str) -> AudioBuffer | None:
+        """The spliced audio for text, or None if it can't be composed from the clips."""
+        names = self.plan(text)
+        if names is None:
+            return None
+        start = metrics.clock()
+        pieces = []
+        sample_rate = 0
+        for name in names:
+            if name == PAUSE:
+                pieces.append(np.zeros(int(sample_rate * (self.pause - self.gap)), "<i2"))
+                continue
+            clip = self._lookup(name)
+            if clip is None:
+                self.counters["missing"] += 1
+                _LOGGER.debug("No clip for %r in %r", name, text)
+                return None
+            pcm, rate, _ = clip
+            if not sample_rate:
+                sample_rate = rate
+            elif rate != sample_rate:
+                pcm = resample(pcm, rate, sample_rate)
+            pieces.append(self._cut_tail(np.frombuffer(pcm, "<i2"), sample_rate))
+        pcm = np.concatenate(pieces).tobytes()
+        self.counters["composed"] += 1
+        metrics.since("compose", start, clips=len(names))
+        return AudioBuffer.from_wav(wav_header(len(pcm), sample_rate) + pcm)
+
+    def _lookup(self, name: str) -> tuple[bytes | memoryview, int, str] | None:
+        """A clip, if there is one; a word's clip only if it says exactly that word."""
+        clip = self.clip(name)
+        if clip is None or (not name.startswith(Const._) and clip[2].lower() != name):
+            return None
+        return clip
+
+    def _cut_tail(self, samples: np.ndarray, sample_rate: int) -> np.ndarray:
+        loud = np.flatnonzero(np.abs(samples) > self.silence)
+        end = int(loud[-1]) + 1 if len(loud) else 0
+        return samples[: end + int(sample_rate * self.gap)]
+
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+
+class Countdown:
+    """Fires ticks on a drift-free monotonic clock.
+
+    Tick k is due at start + k * interval however late the ones before it ran, so
+    errors don't add up the way they do with one asyncio.sleep() per tick. Event
+    loop timers are coarse (about 15 ms on Windows), so it sleeps until spin
+    before each tick and yields to the loop for the rest, then records how late
+    the tick fired."""
+
+    def __init__(
+        self, spin: float = Compose.SPIN_MS / 1000, late: float = Compose.LATE_MS / 1000
+    ):
+        self.spin: float = spin
+        self.late: float = late
+        self.jitter: deque[float] = deque(maxlen=500)
+        self.counters: dict[str, int] = dict.fromkeys(("countdowns", "ticks", "late"), 0)
+
+    async def run(self, ticks: list[Callable[[], None]], interval: float) -> None:
+        """Call each tick in turn, one interval apart, starting now."""
+        self.counters["countdowns"] += 1
+        start = time.monotonic()
+        for k, tick in enumerate(ticks):
+            due = start + k * interval
+            await self.wait_until(due)
+            lateness = time.monotonic() - due
+            tick()
+            self.jitter.append(lateness)
+            metrics.record("countdown.tick", lateness)
+            self.counters["ticks"] += 1
+            if lateness > self.late:
+                self.counters["late"] += 1
+                _LOGGER.warning("Countdown tick %d fired %.1f ms late", k, lateness * 1000)
+
+    async def wait_until(self, due: float) -> None:
+        while (remaining := due - time.monotonic()) > self.spin:
+            await asyncio.sleep(remaining - self.spin)
+        while time.monotonic() < due:
+            await asyncio.sleep(0)
+
+    def stats(self) -> dict:
+        """How late ticks fired."""
+        jitter = sorted(self.jitter)
+        return {
+            "jitter_p50_ms": jitter[len(jitter) // 2] * 1000 if jitter else 0.0,
+            "jitter_p95_ms": jitter[int(len(jitter) * 0.95)] * 1000 if jitter else 0.0,
+            "jitter_max_ms": jitter[-1] * 1000 if jitter else 0.0,
+            **self.counters,
+        }
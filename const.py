@@ -1,5 +1,4 @@
-from enum import Enum, StrEnum, IntEnum
-from PySide6.QtGui import QIcon
+from enum import Enum, StrEnum, IntEnum, Flag, auto
 from dotenv import load_dotenv
 import os
 
@@ -15,9 +14,18 @@ class Const(StrEnum):
     MAIN_CHANNEL = str(os.getenv("MAIN_CHANNEL"))
     ALT_CHANNEL = str(os.getenv("ALT_CHANNEL"))
     TTS_FILE = "output.wav"
+    MACRO_DIR = "macro"
     MACRO_FILE = "macro/$.wav"
+    MACRO_PACK = "macro/macros.pack"
+    PACK_DIR = "macro/packs"
     ICON_FILE = "icons/$.png"
     CUSTOM_FILE = "macro/cust_macro.wav"
+    CACHE_DIR = "cache"
+    OBS_ITEMS_FILE = "cache/obs_items.json"
+    TRACE_FILE = "cache/trace.jsonl"
+    RULES_FILE = "rules.json"
+    TTS_RATE = "5"
+    TTS_PITCH = "4"
     LABEL = "label"
     WIDTH = "width"
     PHRASE = "phrase"
@@ -33,6 +41,96 @@ class Layout(IntEnum):
     DEFAULT_ROWS = 3
 
 
+class Cache(IntEnum):
+    MEMORY_ENTRIES = 256
+    DISK_BYTES = 200 * 1024 * 1024
+
+
+class Pipeline(IntEnum):
+    MIN_CHARS = 12
+    MAX_CHARS = 160
+
+
+class SynthPool(IntEnum):
+    SIZE = 3  # warm Azure connections, also the limit on concurrent requests
+    IDLE_REOPEN_S = 120  # reopen connections idle for longer than this
+    CHECK_S = 30
+
+
+class Hedge(IntEnum):
+    DEADLINE_MS = 700  # no Azure audio by then: race the local backend
+
+
+class LocalTts(StrEnum):
+    COMMAND = str(os.getenv("LOCAL_TTS") or "espeak-ng")
+
+
+class Speculation(IntEnum):
+    DEBOUNCE_MS = 400  # typing pause before the text is synthesized ahead of Return
+    MIN_CHARS = 4
+
+
+class PostProcess(IntEnum):
+    SILENCE_DB = -50  # quieter than this at the start and end of audio is trimmed
+    LEAD_PAD_MS = 20  # silence kept before the first sound...
+    TAIL_PAD_MS = 150  # ...and after the last, so sentences don't run together
+    TARGET_DB = -20  # loudness target: RMS in dBFS of the frames above the gate
+    GATE_DB = -45
+    PEAK_DB = -1
+    MAX_GAIN_DB = 18
+
+
+class Batch(IntEnum):
+    MAX_ITEMS = 8  # utterances per request
+    WINDOW_MS = 40  # how long the first utterance waits for others to join it
+    MAX_CHARS = 60  # longer text isn't worth batching
+    BREAK_MS = 250  # pause synthesized between utterances, trimmed off again
+
+
+class Compose(IntEnum):
+    GAP_MS = 40  # silence left between spliced clips
+    PAUSE_MS = 250  # ...and at a comma or full stop
+    SPIN_MS = 20  # countdown ticks wait this last stretch without relying on timers
+    LATE_MS = 10  # a tick fired later than this counts as late
+    MAX_COUNTDOWN = 60
+
+
+class Speech(IntEnum):
+    MAX_QUEUE = 8
+    STALE_MS = 15000
+
+
+class SpeechSource(StrEnum):
+    MACRO = "macro"
+    CUSTOM = "custom"
+    TEXT = "text"
+    CHAT = "chat"
+    COUNTDOWN = "countdown"
+
+
+class Policy(Flag):
+    ENQUEUE = auto()
+    PREEMPT = auto()
+    DROP_IF_STALE = auto()
+    COALESCE = auto()
+
+
+# (priority, policy) per entry point. Lower priority plays first.
+SPEECH_RULES = {
+    SpeechSource.MACRO: (0, Policy.PREEMPT),
+    SpeechSource.CUSTOM: (1, Policy.ENQUEUE),
+    SpeechSource.TEXT: (2, Policy.ENQUEUE | Policy.DROP_IF_STALE | Policy.COALESCE),
+    SpeechSource.CHAT: (3, Policy.ENQUEUE | Policy.DROP_IF_STALE),
+    SpeechSource.COUNTDOWN: (0, Policy.PREEMPT),
+}
+
+
+class MacroBuild(IntEnum):
+    CONCURRENCY = 4
+    RETRIES = 2
+    RETRY_DELAY_MS = 500
+
+
 class OBS(StrEnum):
     HOST = str(os.getenv("OBS_HOST"))
     PORT = str(os.getenv("OBS_PORT"))
@@ -43,6 +141,57 @@ class OBS(StrEnum):
     BUB_SOURCE = "Speech Bubble"
 
 
+class Reconnect(IntEnum):
+    BASE_MS = 100  # first retry delay, doubled per attempt with jitter
+    MAX_MS = 1000
+
+
+class ObsStatus(StrEnum):
+    CONNECTING = "connecting"
+    CONNECTED = "connected"
+    RECONNECTING = "reconnecting"
+    DISCONNECTED = "disconnected"
+
+
+class Startup(IntEnum):
+    TARGET_MS = 1500  # cold start to ready, including the Azure connections
+
+
+class Bubble(StrEnum):
+    HOST = "127.0.0.1"
+    PORT = str(os.getenv("BUBBLE_PORT") or 4460)
+    PAGE = "speech-bubble-live.html"
+
+
+class EngineApi(StrEnum):
+    HOST = "127.0.0.1"
+    PORT = str(os.getenv("ENGINE_PORT") or 4461)
+
+
+class ChatServer(StrEnum):
+    HOST = str(os.getenv("CHAT_HOST") or "")  # chat is off unless set
+    PORT = str(os.getenv("CHAT_PORT") or 6667)
+    ROOM = str(os.getenv("CHAT_ROOM") or "")
+    NICK = str(os.getenv("CHAT_NICK") or "justinfan4461")  # anonymous read-only login
+    TOKEN = str(os.getenv("CHAT_TOKEN") or "")
+    CHANNEL = str(os.getenv("CHAT_CHANNEL") or "alt")  # "main" or "alt" audio channel
+
+
+class ChatOverflow(StrEnum):
+    DROP_OLDEST = "oldest"
+    DROP_LOWEST = "lowest"  # lowest priority, oldest first among equals
+
+
+class Chat(IntEnum):
+    MAX_CHARS = 120
+    BACKLOG = 10
+    MAX_LAG_S = 20  # chat older than this is never read out
+    USER_BURST = 2  # messages a user can send back to back...
+    USER_EVERY_S = 15  # ...then one per this many seconds
+    DUPLICATE_WINDOW_S = 60
+    QUEUED = 1  # chat lines waiting in the speech scheduler at a time
+
+
 class Emotion(StrEnum):
     FRIENDLY = "Friendly"
     GENERAL = "General"
@@ -85,10 +234,10 @@ class RaidIcon(StrEnum):
     UNMARKED = "unmarked"
 
 
-class WebSocketIcon:
-    ON = QIcon("icons/wifi.svg")
-    OFF = QIcon("icons/no_wifi.svg")
-    OFF_RED = QIcon("icons/no_wifi_red.svg")
+class WebSocketIcon(StrEnum):
+    ON = "icons/wifi.svg"
+    OFF = "icons/no_wifi.svg"
+    OFF_RED = "icons/no_wifi_red.svg"
 
 
 class PhraseMacro(Enum):
@@ -132,6 +281,16 @@ class PhraseMacro(Enum):
     }
 
 
+# Clips rendered with the macros so numbers and short templates can be spliced
+# together (compose.py): name -> spoken text. _0.._15 are PhraseMacro entries.
+COMPOSE_CLIPS = {
+    **{f"{Const._}{i}": str(i) for i in range(16, 20)},
+    **{f"{Const._}{tens}": str(tens) for tens in range(20, 100, 10)},
+    f"{Const._}100": "hundred",
+    f"{Const._}1000": "thousand",
+    **{word: word for word in ("in", "pull", "go", "now", "seconds")},
+}
+
 FIXES = {
     "n;t": "n't",
 }
@@ -0,0 +1,948 @@
+import asyncio
+import logging
+import os
+import time
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable
+
+import aiofiles
+
+from audio import AudioBuffer, split_wav
+from bubble_server import BubbleServer
+from cache import SynthesisCache
+from compose import Composer, Countdown
+from const import (
+    Const,
+    Batch,
+    Cache,
+    Compose,
+    Hedge,
+    Speculation,
+    MacroBuild,
+    Pipeline,
+    SynthPool,
+    Speech,
+    SpeechSource,
+    SPEECH_RULES,
+    OBS,
+    ObsStatus,
+    Reconnect,
+    Startup,
+    Bubble,
+    Emotion,
+    Voice,
+    RaidIcon,
+    PhraseMacro,
+    FIXES,
+    PRONUNCIATIONS,
+)
+from lipsync import MouthTrack
+from macro_bank import Macro, MacroBank
+from macro_builder import BuildReport, build_macro_pack, pack_file
+from metrics import metrics, startup
+from scheduler import SpeechScheduler
+from postprocess import ProcessedStream, process_wav
+from speculation import Speculator
+from synthesis import (
+    HedgedSynthesis,
+    SynthesisBatcher,
+    SynthesisError,
+    Synthesizer,
+    SynthesizerPool,
+    build_ssml,
+)
+from text import TextNormalizer, split_sentences
+
+if TYPE_CHECKING:
+    from obs import ObsCommands, ObsConnection
+    from player import PlayerPool
+
+_LOGGER = logging.getLogger("TTS.engine")
+
+
+class SpeechEngine:
+    """The speak pipeline without any UI.
+
+    Normalizes and synthesizes text, plays speech and macros through a PlayerPool
+    (of VlcPlayers, or NullPlayers when headless), and drives the OBS avatar and
+    speech bubble. Each channel has its own speech scheduler, so the channels
+    play independently and any number of front ends can call speak(),
+    play_macro(), stop() and repeat() concurrently.
+    User-facing status text is reported through on_message(text, show_for).
+    Slow speech requests are hedged with the local fallback_factory backend.
+    Synthesized speech and OBS item IDs are cached under cache_dir.
+    """
+
+    def __init__(
+        self,
+        player: "PlayerPool",
+        synthesizer_factory: Callable[[], Synthesizer],
+        obs_url: str,
+        obs_password: str,
+        bubble_port: int = int(Bubble.PORT),
+        cache_dir: str = Const.CACHE_DIR,
+        on_message: Callable[[str, float], Any] | None = None,
+        on_obs_status: Callable[[ObsStatus, str], Any] | None = None,
+        fallback_factory: Callable[[], Synthesizer] | None = None,
+    ):
+        self.on_message = on_message
+        self.status_callback = on_obs_status
+
+        # Playback
+        self.player = player
+        self.mouth_tracks: dict[str, MouthTrack | None] = {}
+        self.custom_macro_text: str = ""
+        self.macro_bank = MacroBank(self.player.prepare)
+        self.macro_pack: str = ""  # the voice pack in use, if any
+        self.composer = Composer(self._clip)
+        self.countdown_clock = Countdown()
+        self.last_tts_audio: bytes | AudioBuffer | None = None
+        self.last_tts_text: str = ""
+        self.save_audio_files: bool = True
+        self.schedulers: dict[str, SpeechScheduler] = {
+            channel: SpeechScheduler(Speech.MAX_QUEUE, Speech.STALE_MS / 1000)
+            for channel in dict.fromkeys((Const.MAIN_CHANNEL, Const.ALT_CHANNEL))
+        }
+        self.speech_scheduler = self.schedulers[Const.MAIN_CHANNEL]
+        self._scheduler_tasks: list[asyncio.Task] = []
+
+        # Synthesis
+        self.tts_emotion: str = Emotion.FRIENDLY
+        self.tts_voice: str = Voice.EN_JANE
+        self.streaming_mode: bool = False
+        self.pipeline_mode: bool = False
+        self.normalizer = TextNormalizer(Const.RULES_FILE, FIXES, PRONUNCIATIONS)
+        self.cache_dir: str = cache_dir
+        self.synth_cache = SynthesisCache(cache_dir, Cache.MEMORY_ENTRIES, Cache.DISK_BYTES)
+        self.synth_pool = SynthesizerPool(
+            synthesizer_factory, SynthPool.SIZE, SynthPool.IDLE_REOPEN_S, SynthPool.CHECK_S
+        )
+        self.hedge = HedgedSynthesis(fallback_factory, Hedge.DEADLINE_MS / 1000)
+        self.batcher = SynthesisBatcher(
+            self.synth_pool,
+            Batch.MAX_ITEMS,
+            Batch.WINDOW_MS / 1000,
+            Batch.MAX_CHARS,
+            Batch.BREAK_MS / 1000,
+        )
+        self._prefetching: dict[str, asyncio.Task] = {}
+        self.speculator = Speculator(
+            self._speculation_target,
+            lambda ssml, key: self.synthesize_audio(ssml, key, hedge=False),
+            Speculation.DEBOUNCE_MS / 1000,
+            Speculation.MIN_CHARS,
+        )
+
+        # OBS
+        self.obs_url: str = obs_url
+        self.obs_password: str = obs_password
+        self.obs_connection: "ObsConnection | None" = None
+        self.obs_task: asyncio.Task | None = None
+        self.obs: "ObsCommands | None" = None
+        self.obs_status: ObsStatus | None = None
+        self.speaking_task: asyncio.Task | None = None
+        self.speaking_channel: str | None = None
+        self.html_template: str = ""
+        self.bubble_server = BubbleServer(Bubble.HOST, bubble_port, Bubble.PAGE)
+
+        # Metrics, served as JSON next to the live speech bubble
+        self.trace_file: bool = False
+        metrics.register("scheduler", self.speech_scheduler.stats)
+        if len(self.schedulers) > 1:
+            metrics.register("scheduler.alt", self.schedulers[Const.ALT_CHANNEL].stats)
+        metrics.register("players", self.player.stats)
+        metrics.register("cache", self.synth_cache.stats)
+        metrics.register("pool", self.synth_pool.stats)
+        metrics.register("hedge", self.hedge.stats)
+        metrics.register("batch", self.batcher.stats)
+        metrics.register("speculation", self.speculator.stats)
+        metrics.register("macros", self.macro_bank.stats)
+        metrics.register("compose", self.composer.stats)
+        metrics.register("countdown", self.countdown_clock.stats)
+        metrics.register("bubble", self.bubble_server.stats)
+        metrics.register("obs", lambda: self.obs.stats() if self.obs else {})
+        metrics.register("startup", startup.report)
+        self.bubble_server.add_route("/metrics", metrics.snapshot)
+        self.ready: bool = False
+
+    async def start(self, connect_obs: bool = True) -> None:
+        """Start taking requests right away, then open the synthesizers and load the
+        macros concurrently, reporting progress. Speech requested in the meantime
+        waits for a synthesizer; macros play from their files until loaded."""
+        self._scheduler_tasks = [
+            asyncio.create_task(scheduler.run()) for scheduler in self.schedulers.values()
+        ]
+        try:
+            await self.bubble_server.start()
+        except OSError as e:
+            _LOGGER.warning("Speech bubble server unavailable, using file updates: %s", e)
+        if connect_obs:
+            self.connect_obs()
+        await asyncio.gather(self._open_synthesizers(), self._load_macros())
+        self.ready = True
+        ready = startup.ready(Startup.TARGET_MS / 1000)
+        self.notify(f"Ready in {ready:.1f}s", 2)
+
+    async def _open_synthesizers(self) -> None:
+        _LOGGER.info("Connecting to Azure TTS")
+        self.notify("Connecting to Azure TTS...")
+        with startup.phase("azure"):
+            await asyncio.gather(self.synth_pool.start(), self.hedge.start())
+
+    async def _load_macros(self) -> None:
+        with startup.phase("macros"):
+            await asyncio.to_thread(self._load_default_macros)
+            if os.path.isfile(Const.CUSTOM_FILE):
+                await asyncio.to_thread(self.macro_bank.reload, Const.CUSTOM_FILE)
+            await self.activate_macro_pack()
+
+    def _load_default_macros(self) -> None:
+        """The default macro pack, or the loose files in the macro folder without one."""
+        if os.path.isfile(Const.MACRO_PACK):
+            self.macro_bank.load_pack(Const.MACRO_PACK, Const.MACRO_DIR, (Const.CUSTOM_FILE,))
+        else:
+            self.macro_bank.load(
+                Const.MACRO_FILE.replace(Const.REPLACE, "*"), skip=(Const.CUSTOM_FILE,)
+            )
+
+    async def shutdown(self) -> None:
+        """Stop playback, disconnect from OBS and release the synthesizers."""
+        if self.obs:
+            _LOGGER.info("OBS requests: %s", self.obs.stats())
+        _LOGGER.info("Speech bubble: %s", self.bubble_server.stats())
+        _LOGGER.info("Synthesizer pool: %s", self.synth_pool.stats())
+        metrics.open_trace(None)
+        self.stop()
+        for task in self._scheduler_tasks:
+            task.cancel()
+        await self.synth_pool.stop()
+        await self.bubble_server.stop()
+        try:
+            await self.disconnect_obs()
+            _LOGGER.info("OBS WebSocket disconnected.")
+        except Exception as e:
+            _LOGGER.warning(f"Error while disconnecting OBS WebSocket: {e}")
+
+    def notify(self, text: str, show_for: float = 0) -> None:
+        """Pass a status message to the front end, if it shows them."""
+        if self.on_message and text:
+            self.on_message(text, show_for)
+
+    # ------------------------------
+    # Requests
+    # ------------------------------
+
+    def speak(self, text: str, channel: str | tuple[str, ...]) -> bool:
+        """Queue text to be spoken on a channel, or mirrored on several.
+        Returns False if it was not queued."""
+        channels = (channel,) if isinstance(channel, str) else tuple(dict.fromkeys(channel))
+        self.speculator.pin(text)
+        return self.submit_speech(
+            SpeechSource.TEXT,
+            f"{'+'.join(channels)}:{text}",
+            partial(self.speak_text, text, channels),
+            channel=channels[0],
+        )
+
+    def prefetch(self, text: str) -> None:
+        """Synthesize queued text into the cache before its turn, e.g. chat lines
+        waiting behind the one playing, so that lines queued together share a batch."""
+        target = self._speculation_target(text)
+        if target is None or target[1] in self._prefetching:
+            return
+        ssml, key = target
+        task = asyncio.create_task(self.synthesize_audio(ssml, key, hedge=False))
+        self._prefetching[key] = task
+        task.add_done_callback(lambda _: self._prefetching.pop(key, None))
+
+    def speculate(self, text: str) -> None:
+        """The text being typed changed; synthesize it ahead of time if speculating."""
+        self.speculator.update(text)
+
+    def repeat(self) -> bool:
+        """Queue the last speech again."""
+        return self.play_macro(Const.REPEAT)
+
+    def stop(self, channel: str | None = None) -> None:
+        """Stop playback and drop queued speech on one channel, or on all of them."""
+        _LOGGER.info("Stopping the player")
+        for name, scheduler in self.schedulers.items():
+            if channel is None or name == channel:
+                scheduler.clear()
+        self.player.stop(channel)
+
+    def play(
+        self,
+        source: str | bytes | memoryview | AudioBuffer | Macro,
+        channel: str | tuple[str, ...],
+    ) -> None:
+        """Play an audio file, WAV/PCM data from memory, a buffer that is still streaming in,
+        or a preloaded macro, on a channel or mirrored on several."""
+        channels = (channel,) if isinstance(channel, str) else channel
+        names = "+".join(Const(name).name for name in channels)
+        if isinstance(source, str):
+            track = None
+            self.player.play(source, channels)
+            _LOGGER.info("Playing audio file (%s) on %s", source, names)
+        elif isinstance(source, Macro):
+            track = source.mouth
+            self.player.play(source.audio, channels, source.media)
+            _LOGGER.info("Playing preloaded macro on %s", names)
+        else:
+            if not isinstance(source, AudioBuffer):
+                source = AudioBuffer.from_wav(source)
+            track = MouthTrack(source)
+            self.player.play(source, channels)
+            _LOGGER.info("Playing audio from memory on %s", names)
+        for name in channels:
+            self.mouth_tracks[name] = track
+
+    def submit_speech(
+        self,
+        source: SpeechSource,
+        key: str,
+        job,
+        on_drop=None,
+        channel: str = Const.MAIN_CHANNEL,
+    ) -> bool:
+        """Hand an utterance to the channel's speech scheduler using the rules for its
+        entry point."""
+        scheduler = self.schedulers[channel]
+        priority, policy = SPEECH_RULES[source]
+        accepted = scheduler.submit(f"{source}:{key}", job, priority, policy, on_drop)
+        if not accepted and scheduler.depth >= scheduler.max_depth:
+            self.notify("Speech queue is full", 2)
+        return accepted
+
+    async def speak_text(self, text: str, channels: tuple[str, ...]) -> None:
+        """Scheduler job: synthesize text and wait for it to finish playing."""
+        if await self.text_to_speech(text, channels):
+            await asyncio.gather(*(self.player.wait_finished(channel) for channel in channels))
+
+    def play_macro(self, macro: str) -> bool:
+        """Queue a macro: a raid icon, phrase or number, the custom macro, or a repeat of
+        the last speech. Returns False if it could not be queued."""
+        if macro == Const.REPEAT:
+            file = self.last_tts_audio or Const.TTS_FILE
+            text = ""
+        elif macro == Const.CUSTOM:
+            if not self.custom_macro_text:
+                _LOGGER.warning("A custom macro has not been set")
+                self.notify("A custom macro has not been set", 4)
+                return False
+            file = self.macro_bank.get(Const.CUSTOM_FILE) or Const.CUSTOM_FILE
+            text = self.custom_macro_text
+        else:
+            file = Const.MACRO_FILE.replace(Const.REPLACE, macro, 1)
+            file = self.macro_bank.get(file) or file
+            try:
+                text = RaidIcon(macro).value.capitalize() + (
+                    Const.REPLACE if macro != RaidIcon.UNMARKED else ""
+                )
+                _LOGGER.info("Macro is a raid icon")
+            except ValueError:
+                try:
+                    text = PhraseMacro[macro.upper()].value[Const.PHRASE]
+                except KeyError:
+                    _LOGGER.warning("Unknown macro: %s", macro)
+                    return False
+                _LOGGER.info("Macro is a phrase")
+
+        async def job() -> None:
+            _LOGGER.info(f"Playing macro: {macro}")
+            self.play(file, Const.MAIN_CHANNEL)
+            self.start_avatar(Const.MAIN_CHANNEL, override=text)
+            await self.player.wait_finished(Const.MAIN_CHANNEL)
+
+        return self.submit_speech(SpeechSource.MACRO, macro, job)
+
+    def countdown(
+        self,
+        start: int,
+        interval: float = 1.0,
+        intro: str = "",
+        final: str = "",
+        channel: str = Const.MAIN_CHANNEL,
+    ) -> bool:
+        """Queue a countdown from start to 1 spliced from macro clips, one number per
+        interval on a drift-free clock. The first tick says the intro with the number
+        (e.g. "pull in 10"), and the final word, if any, follows 1 after an interval.
+        Returns False if it could not be composed or queued."""
+        if not 1 <= start <= Compose.MAX_COUNTDOWN or interval <= 0:
+            return False
+        texts = [f"{intro} {start}".strip(), *map(str, range(start - 1, 0, -1))]
+        texts += [final] if final else []
+        clips = [self.composer.compose(text) for text in texts]
+        if None in clips:
+            _LOGGER.warning("Countdown needs clips that aren't loaded: %s", texts)
+            self.notify("Countdown needs the number clips, rebuild the macro pack", 4)
+            return False
+
+        def tick(audio: AudioBuffer, text: str) -> None:
+            self.play(audio, channel)
+            self.start_avatar(channel, override=text)
+
+        async def job() -> None:
+            _LOGGER.info("Counting down from %d", start)
+            await self.countdown_clock.run(
+                [partial(tick, audio, text) for audio, text in zip(clips, texts)], interval
+            )
+            await self.player.wait_finished(channel)
+
+        return self.submit_speech(SpeechSource.COUNTDOWN, str(start), job, channel=channel)
+
+    def _clip(self, name: str) -> tuple[memoryview, int, str] | None:
+        """PCM, sample rate and spoken text of a macro, for composing. Only macros from
+        a pack built for the current voice and emotion are used, so typed text isn't
+        answered in another voice."""
+        file = Const.MACRO_FILE.replace(Const.REPLACE, name, 1)
+        macro, pack = self.macro_bank.get(file), self.macro_bank.pack_of(file)
+        if macro is None or pack is None or name not in pack:
+            return None
+        if (pack.voice, pack.emotion) != (self.tts_voice, self.tts_emotion):
+            return None
+        return macro.audio.view(), macro.audio.sample_rate, pack.entries[name].text
+
+    def set_custom_macro(self, custom_text: str) -> bool:
+        """Queue rendering the custom macro, which can then be played without synthesis."""
+
+        async def job() -> None:
+            await self.text_to_speech(custom_text, "", create_custom_macro=True)
+            self.custom_macro_text = custom_text
+            _LOGGER.info("Custom macro set: %s", custom_text)
+            self.notify(f"Custom macro set to: {custom_text}", 4)
+
+        return self.submit_speech(SpeechSource.CUSTOM, custom_text, job)
+
+    # ------------------------------
+    # Settings
+    # ------------------------------
+
+    async def set_emotion(self, emotion: str) -> None:
+        """Set the emotion for the TTS."""
+        _LOGGER.info("Setting emotion to: %s", emotion)
+        self.tts_emotion = emotion
+        await self.activate_macro_pack()
+
+    async def set_voice(self, voice: str) -> None:
+        """Set the voice for the TTS."""
+        _LOGGER.info("Setting voice to: %s", voice)
+        self.tts_voice = voice
+        await self.activate_macro_pack()
+
+    def set_streaming_mode(self, enable: bool) -> None:
+        """Start playback while speech is still being synthesized."""
+        _LOGGER.info("Streaming playback: %s", "on" if enable else "off")
+        self.streaming_mode = enable
+
+    def set_speculative_mode(self, enable: bool) -> None:
+        """Synthesize text while it is being typed, so it is ready when submitted."""
+        _LOGGER.info("Speculative synthesis: %s", "on" if enable else "off")
+        self.speculator.enable(enable)
+
+    def set_batching_mode(self, enable: bool) -> None:
+        """Synthesize short utterances that are requested together in one request."""
+        _LOGGER.info("Batched synthesis: %s", "on" if enable else "off")
+        self.batcher.enabled = enable
+
+    def set_pipeline_mode(self, enable: bool) -> None:
+        """Synthesize long text sentence by sentence and start playing the first one early."""
+        _LOGGER.info("Pipelined synthesis: %s", "on" if enable else "off")
+        self.pipeline_mode = enable
+
+    def set_save_audio_files(self, enable: bool) -> None:
+        """Keep copies of speech and the custom macro on disk."""
+        _LOGGER.info("Saving audio files: %s", "on" if enable else "off")
+        self.save_audio_files = enable
+
+    def set_metrics(self, enable: bool) -> None:
+        """Collect per-stage latency histograms, readable at /metrics on the bubble server."""
+        _LOGGER.info(
+            "Latency metrics: %s (%smetrics)", "on" if enable else "off", self.bubble_server.url
+        )
+        metrics.enable(enable)
+
+    def set_trace_file(self, enable: bool) -> None:
+        """Also append every timed span to a JSONL trace file."""
+        self.trace_file = enable
+        metrics.open_trace(Const.TRACE_FILE if enable else None)
+
+    async def activate_macro_pack(self) -> None:
+        """Play macros from the pack for the current voice and emotion, if one was built."""
+        pack = pack_file(self.tts_voice, self.tts_emotion)
+        if not os.path.isfile(pack):
+            if self.macro_pack:
+                _LOGGER.info("Back to the default macros")
+                await asyncio.to_thread(self._load_default_macros)
+                self.macro_bank.release(self.macro_pack)
+                self.macro_pack = ""
+            return
+        await asyncio.to_thread(
+            self.macro_bank.load_pack, pack, Const.MACRO_DIR, (Const.CUSTOM_FILE,)
+        )
+        if self.macro_pack and self.macro_pack != pack:
+            self.macro_bank.release(self.macro_pack)
+        self.macro_pack = pack
+
+    async def rebuild_macro_pack(self) -> BuildReport:
+        """Regenerate every macro with the current voice and emotion."""
+        voice, emotion = self.tts_voice, self.tts_emotion
+        self.notify("Rebuilding macro pack...")
+        # Requests go through the pool rather than new connections, leaving an
+        # instance free for live speech.
+        concurrency = max(1, min(MacroBuild.CONCURRENCY, self.synth_pool.size - 1))
+        report = await build_macro_pack(
+            [self.synth_pool] * concurrency,
+            voice,
+            emotion,
+            release=self.macro_bank.release,
+            batch=Batch.MAX_ITEMS if self.batcher.enabled else 1,
+        )
+        if not report.failed:
+            await self.activate_macro_pack()
+        self.notify(
+            f"Macros: {report.built} built, {report.failed} failed in {report.wall_time:.1f}s", 4
+        )
+        return report
+
+    async def clear_voice_cache(self) -> int:
+        """Invalidate cached speech for the current voice and emotion."""
+        removed = await asyncio.to_thread(
+            self.synth_cache.invalidate, self.tts_voice, self.tts_emotion
+        )
+        self.notify(f"Cleared {removed} cached phrases", 2)
+        return removed
+
+    # ------------------------------
+    # Synthesis
+    # ------------------------------
+
+    def build_ssml(self, tts_input: str) -> str:
+        """Wrap the text in SSML for the current voice and emotion."""
+        return build_ssml(
+            tts_input, self.tts_voice, self.tts_emotion, Const.TTS_RATE, Const.TTS_PITCH
+        )
+
+    def _speculation_target(self, text: str) -> tuple[str, str] | None:
+        """The SSML and cache key the speak path will synthesize first for text,
+        or None if that is already cached or it is composed from macro clips."""
+        text = self.normalizer.fix(text)
+        if self.composer.can_compose(text):
+            return None
+        if self.pipeline_mode:
+            pieces = split_sentences(text, Pipeline.MIN_CHARS, Pipeline.MAX_CHARS)
+            if len(pieces) > 1:
+                text = pieces[0]
+        tts_ssml = self.build_ssml(self.normalizer.pronounce(text))
+        cache_key = self.synth_cache.key(tts_ssml, self.tts_voice, self.tts_emotion)
+        return None if cache_key in self.synth_cache else (tts_ssml, cache_key)
+
+    async def synthesize_audio(
+        self, tts_ssml: str, cache_key: str | None = None, hedge: bool = True
+    ) -> bytes | None:
+        """Synthesize SSML to trimmed, loudness-normalized WAV bytes on a free pooled
+        connection, or None if it failed.
+
+        With hedge, a slow request is raced against the local backend. Only pooled
+        (Azure) audio is cached under cache_key, also when it arrives after losing."""
+        primary = asyncio.create_task(self._synthesize_pooled(tts_ssml))
+        if cache_key:
+            primary.add_done_callback(partial(self._cache_synthesized, cache_key))
+        try:
+            with metrics.span("synth.complete", mode="full"):
+                if not hedge:
+                    return await primary
+                audio, from_fallback = await self.hedge.race(primary, tts_ssml)
+                if from_fallback:
+                    with metrics.span("postprocess"):
+                        audio = process_wav(audio)
+                return audio
+        except SynthesisError as e:
+            _LOGGER.warning("Speech synthesis canceled: %s", e)
+            return None
+
+    async def _synthesize_pooled(self, tts_ssml: str) -> bytes:
+        audio = await self.batcher.synthesize(tts_ssml, self.tts_voice)
+        with metrics.span("postprocess"):
+            return process_wav(audio)
+
+    def _cache_synthesized(self, cache_key: str, task: asyncio.Task) -> None:
+        if not task.cancelled() and not task.exception() and task.result():
+            asyncio.create_task(asyncio.to_thread(self.synth_cache.put, cache_key, task.result()))
+
+    async def pipeline_synthesis(
+        self, pieces: list[str]
+    ) -> tuple[AudioBuffer, list[tuple[float, str]]] | None:
+        """Synthesize sentences concurrently and chain them into one gapless audio stream.
+
+        Returns as soon as the first sentence is ready, along with a caption list of
+        (start time, text) that fills in as later sentences are appended."""
+        async def render(piece: str) -> bytes | None:
+            tts_ssml = self.build_ssml(self.normalizer.pronounce(piece))
+            cache_key = self.synth_cache.key(tts_ssml, self.tts_voice, self.tts_emotion)
+            if speculated := self.speculator.claim(cache_key) or self._prefetching.get(cache_key):
+                if audio := await speculated:
+                    return audio
+            audio = await asyncio.to_thread(self.synth_cache.get, cache_key)
+            if audio:
+                return audio
+            # Pieces queue for a free pooled synthesizer in order, which bounds the parallelism.
+            return await self.synthesize_audio(tts_ssml, cache_key)
+
+        tasks = [asyncio.create_task(render(piece)) for piece in pieces]
+        if not await tasks[0]:
+            for task in tasks:
+                task.cancel()
+            return None
+
+        buffer = AudioBuffer()
+        captions: list[tuple[float, str]] = []
+
+        async def chain() -> None:
+            try:
+                for piece, task in zip(pieces, tasks):
+                    audio = await task
+                    if not audio:
+                        _LOGGER.warning("Skipping sentence that failed to synthesize: %s", piece)
+                        continue
+                    captions.append((buffer.duration, piece))
+                    buffer.append(split_wav(audio)[0])
+            finally:
+                for task in tasks:
+                    task.cancel()
+                buffer.finish()
+            self.save_audio(Const.TTS_FILE, buffer.wav())
+
+        asyncio.create_task(chain())
+        _LOGGER.info("Pipelining %d sentences", len(pieces))
+        return buffer, captions
+
+    async def stream_synthesis(self, tts_ssml: str, cache_key: str) -> AudioBuffer | None:
+        """Start synthesis and return its audio buffer as soon as the first chunk arrives.
+
+        The rest of the audio keeps streaming into the buffer. Once complete, it is
+        cached and saved to the speech file in the background."""
+        loop = asyncio.get_running_loop()
+        buffer = AudioBuffer()
+        first_audio = loop.create_future()
+        start = metrics.clock()
+
+        def resolve(ok: bool) -> None:
+            if not first_audio.done():
+                first_audio.set_result(ok)
+
+        def on_first_audio() -> None:
+            metrics.since("synth.first_byte", start, mode="stream")
+            loop.call_soon_threadsafe(resolve, True)
+
+        async def complete() -> None:
+            try:
+                async with self.synth_pool.acquire(self.tts_voice) as backend:
+                    stream = ProcessedStream(buffer, on_first_audio)
+                    await backend.stream(tts_ssml, stream, lambda: None)
+                metrics.since("synth.complete", start, mode="stream")
+            except SynthesisError as e:
+                _LOGGER.warning("Speech synthesis canceled: %s", e)
+                buffer.finish(True)
+                return
+            finally:
+                resolve(not buffer.failed)
+            audio = buffer.wav()
+            await asyncio.to_thread(self.synth_cache.put, cache_key, audio)
+            self.save_audio(Const.TTS_FILE, audio)
+
+        asyncio.create_task(complete())
+        try:
+            result, from_fallback = await self.hedge.race(first_audio, tts_ssml)
+        except SynthesisError as e:
+            _LOGGER.warning("Speech synthesis canceled: %s", e)
+            return None
+        if from_fallback:
+            # Azure keeps streaming into its buffer, to be cached when complete.
+            return AudioBuffer.from_wav(process_wav(result))
+        return buffer if result else None
+
+    def save_audio(self, file: str, audio: bytes) -> None:
+        """Write audio to disk in the background, off the playback path."""
+        if not self.save_audio_files:
+            return
+
+        async def write() -> None:
+            with metrics.span("save", file=file):
+                async with aiofiles.open(file, "wb") as f:
+                    await f.write(audio)
+            _LOGGER.info("Saved audio file: %s", file)
+
+        asyncio.create_task(write())
+
+    async def text_to_speech(
+        self,
+        input_text: str,
+        channel: str | tuple[str, ...],
+        *,
+        create_custom_macro: bool = False,
+    ) -> bool:
+        """Synthesize speech and play it on selected channel(s). Returns True if playback started.
+
+        Optionally create the custom macro without playing it.
+        """
+        start = time.perf_counter()
+
+        _LOGGER.info("Fixing typing mistakes")
+        with metrics.span("normalize.fix"):
+            input_text = self.normalizer.fix(input_text)
+
+        # Differentiate Azure TTS input from the written text.
+        tts_input = input_text
+
+        pieces = []
+        if self.pipeline_mode and not create_custom_macro:
+            pieces = split_sentences(input_text, Pipeline.MIN_CHARS, Pipeline.MAX_CHARS)
+
+        audio = None
+        captions = None
+        composed = None if create_custom_macro else self.composer.compose(input_text)
+        if composed:
+            _LOGGER.info("Composed from macro clips, skipping Azure")
+            source = composed
+        elif len(pieces) > 1:
+            pipelined = await self.pipeline_synthesis(pieces)
+            if pipelined is None:
+                return False
+            source, captions = pipelined
+        else:
+            _LOGGER.info("Fixing pronunciations")
+            with metrics.span("normalize.pronounce"):
+                tts_input = self.normalizer.pronounce(tts_input)
+
+            with metrics.span("ssml"):
+                tts_ssml = self.build_ssml(tts_input)
+                cache_key = self.synth_cache.key(tts_ssml, self.tts_voice, self.tts_emotion)
+            if speculated := self.speculator.claim(cache_key) or self._prefetching.get(cache_key):
+                with metrics.span("speculation.wait"):
+                    audio = await speculated
+            if not audio:
+                with metrics.span("cache.lookup"):
+                    audio = await asyncio.to_thread(self.synth_cache.get, cache_key)
+            if audio:
+                _LOGGER.info("Synthesis cache hit, skipping Azure")
+            elif self.streaming_mode and not create_custom_macro:
+                source = await self.stream_synthesis(tts_ssml, cache_key)
+                if source is None:
+                    return False
+            else:
+                # The custom macro is kept, so it isn't worth settling for the local voice.
+                audio = await self.synthesize_audio(
+                    tts_ssml, cache_key, hedge=not create_custom_macro
+                )
+                if not audio:
+                    return False
+
+        if audio:
+            # Keep the custom macro if applicable.
+            if create_custom_macro:
+                self.macro_bank.store(Const.CUSTOM_FILE, audio)
+                self.save_audio(Const.CUSTOM_FILE, audio)
+                return False
+            self.save_audio(Const.TTS_FILE, audio)
+            source = audio
+
+        self.last_tts_text = input_text
+        self.last_tts_audio = source
+        self.play(source, channel)
+        first_audio = time.perf_counter() - start
+        if composed:
+            mode = "composed"
+        elif captions:
+            mode = "pipelined"
+        else:
+            mode = "streaming" if isinstance(source, AudioBuffer) else "in-memory"
+        metrics.record("speak.first_audio", first_audio, mode=mode)
+        _LOGGER.info("Time to first audio: %.0f ms (%s)", first_audio * 1000, mode)
+        channels = (channel,) if isinstance(channel, str) else channel
+        self.start_avatar(
+            Const.MAIN_CHANNEL if Const.MAIN_CHANNEL in channels else channels[0],
+            captions=captions,
+        )
+        return True
+
+    # ------------------------------
+    # OBS avatar and speech bubble
+    # ------------------------------
+
+    def connect_obs(self) -> None:
+        """Start the OBS connection manager, which keeps reconnecting until stopped."""
+        from obs import ObsConnection
+
+        self.obs_connection = ObsConnection(
+            url=self.obs_url,
+            password=self.obs_password,
+            items=[(OBS.AVA_SCENE, OBS.AVA_SOURCE), (OBS.BUB_SCENE, OBS.BUB_SOURCE)],
+            cache_file=os.path.join(self.cache_dir, os.path.basename(Const.OBS_ITEMS_FILE)),
+            on_status=self.on_obs_status,
+            base_delay=Reconnect.BASE_MS / 1000,
+            max_delay=Reconnect.MAX_MS / 1000,
+        )
+        self.obs = self.obs_connection.commands
+        self.obs_task = asyncio.create_task(self.obs_connection.run())
+
+    async def disconnect_obs(self) -> None:
+        if self.obs_task:
+            self.obs_task.cancel()
+            try:
+                await self.obs_task
+            except asyncio.CancelledError:
+                pass
+            _LOGGER.info("OBS connection: %s", self.obs_connection.stats())
+            self.obs_task = None
+            await self.on_obs_status(ObsStatus.DISCONNECTED, "OBS Disconnected")
+
+    async def on_obs_status(self, status: ObsStatus, message: str) -> None:
+        self.obs_status = status
+        if self.status_callback:
+            self.status_callback(status, message)
+        self.notify(message, 0 if status in (ObsStatus.CONNECTING, ObsStatus.RECONNECTING) else 2)
+        if status == ObsStatus.CONNECTED and not self.html_template:
+            await self.load_html_template()
+
+    def obs_ready(self) -> bool:
+        return bool(self.obs_connection and self.obs_connection.ready)
+
+    async def write_speech_bubble_file(
+        self, text: str, alt_channel: bool, icon: str | None
+    ) -> None:
+        """Fallback for a file-based browser source: fill in the template and write it out."""
+        if not self.html_template:
+            await self.load_html_template()
+        if not self.html_template:
+            self.notify("HTML template could not be loaded")
+            return
+        icon_html = f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;<img src="icons/{icon}.png" />' if icon else ""
+        html = self.html_template.replace(Const.REPLACE, "show" if alt_channel else "hide", 1)
+        html = html.replace(Const.REPLACE, text + icon_html, 1)
+        async with aiofiles.open("speech-bubble.html", "w") as f:
+            await f.write(html)
+
+    async def load_html_template(self):
+        try:
+            async with aiofiles.open("speech-bubble-template.html", "r") as f:
+                self.html_template = await f.read()
+        except OSError as e:
+            _LOGGER.warning("Could not load the speech bubble template: %s", e)
+
+    def start_avatar(self, channel: str, **kwargs) -> None:
+        """Hand the avatar to what just started playing on a channel.
+
+        There is one avatar, so the main channel takes it over from anything,
+        but the alt channel doesn't interrupt the main channel while it talks."""
+        if (
+            channel != Const.MAIN_CHANNEL
+            and self.speaking_channel == Const.MAIN_CHANNEL
+            and self.speaking_task
+            and not self.speaking_task.done()
+            and self.player.is_playing(Const.MAIN_CHANNEL)
+        ):
+            return
+        if self.speaking_task:
+            self.speaking_task.cancel()
+        self.speaking_channel = channel
+        self.speaking_task = asyncio.create_task(self.avatar_talk(channel, **kwargs))
+
+    async def avatar_talk(
+        self,
+        channel: str = Const.MAIN_CHANNEL,
+        override: str | None = None,
+        captions: list[tuple[float, str]] | None = None,
+    ) -> None:
+        """Make the on-screen avatar talk while the speech audio is playing on a channel.
+
+        The mouth follows the loudness envelope of the audio, changing only on
+        transitions aligned with the playback clock. With captions, the speech
+        bubble follows the playback position sentence by sentence. Bubble changes
+        wait for a mouth change due within a loop pass and go to OBS with it as one
+        request batch."""
+        if self.obs_ready():
+            track = self.mouth_tracks.get(channel)
+            alt_channel = channel != Const.MAIN_CHANNEL
+            await self.send_speech_bubble_text(False)
+            await asyncio.sleep(0.2)
+            text = captions[0][1] if captions else override or self.last_tts_text
+            await self.send_speech_bubble_text(True, text, alt_channel, flush=False)
+            staged = True
+            shown = 1
+            mouth_open = False
+            applied = 0
+            while self.player.is_playing(channel):
+                position = self.player.position(channel)
+                if captions and shown < len(captions) and position >= captions[shown][0]:
+                    await self.send_speech_bubble_text(
+                        True, captions[shown][1], alt_channel, flush=False
+                    )
+                    staged = True
+                    shown += 1
+
+                if track is None:
+                    # Nothing to analyse (played from a file), so flap at a fixed rate.
+                    mouth_open = not mouth_open
+                    await self.move_mouth(mouth_open)
+                    staged = False
+                    await asyncio.sleep(0.2)
+                    continue
+
+                transitions = track.update()
+                want_open = mouth_open
+                while applied < len(transitions) and transitions[applied][0] <= position:
+                    want_open = transitions[applied][1]
+                    applied += 1
+                if want_open != mouth_open:
+                    mouth_open = want_open
+                    await self.move_mouth(mouth_open)  # with any staged bubble change
+                    staged = False
+                next_change = 0.1
+                if applied < len(transitions):
+                    next_change = transitions[applied][0] - position
+                if staged and next_change >= 0.1:
+                    # No mouth change coming soon for the bubble change to go out with.
+                    await self.obs.flush()
+                    staged = False
+                await asyncio.sleep(min(max(next_change, 0.01), 0.1))
+            await self.move_mouth(False)
+            await asyncio.sleep(3)
+            await self.send_speech_bubble_text(False)
+
+    async def move_mouth(self, enable: bool, flush: bool = True) -> None:
+        """Enable and disable the open-mouth image of the avatar.
+
+        Without flush the change is only staged, to be sent with the next one."""
+        if not self.obs_ready():
+            return
+        if avatar_item_id := self.obs_connection.item_id(OBS.AVA_SCENE, OBS.AVA_SOURCE):
+            self.obs.set_enabled(OBS.AVA_SCENE, avatar_item_id, enable)
+        if flush:
+            await self.obs.flush()
+
+    async def send_speech_bubble_text(
+        self, enable: bool, text: str = "", alt_channel: bool = False, flush: bool = True
+    ) -> None:
+        """Update the speech-bubble text, and enable/disable the speech-bubble browser source.
+
+        Text is pushed to the live bubble page when one is connected, otherwise
+        speech-bubble.html is rewritten. Without flush the change is only staged,
+        to be sent with the next one."""
+        if text:
+            icon = None
+            if text.endswith(Const.REPLACE):
+                text = icon = text.removesuffix(Const.REPLACE)
+            if self.bubble_server.clients:
+                self.bubble_server.push(text, alt_channel, icon)
+            else:
+                await self.write_speech_bubble_file(text, alt_channel, icon)
+
+        if not self.obs_ready():
+            return
+        if bubble_item_id := self.obs_connection.item_id(OBS.BUB_SCENE, OBS.BUB_SOURCE):
+            self.obs.set_enabled(OBS.BUB_SCENE, bubble_item_id, enable)
+            if flush:
+                await self.obs.flush()
+        else:
+            self.notify("Speech bubble ID not loaded")
@@ -0,0 +1,131 @@
+import math
+
+import numpy as np
+
+from audio import HEADER_SIZE, SAMPLE_WIDTH, AudioBuffer
+
+FRAME = 0.02  # seconds of audio per envelope frame
+OPEN_DB = -32.0  # RMS level (dBFS) that opens the mouth
+CLOSE_DB = -40.0  # RMS level (dBFS) that closes it again
+MIN_HOLD = 0.08  # seconds the mouth stays in a state before it may change
+
+
+def rms_envelope(pcm: bytes | memoryview, frame_size: int) -> np.ndarray:
+    """RMS level (0..1) of each full frame of 16-bit mono PCM."""
+    samples = np.frombuffer(pcm, dtype="<i2")
+    frames = len(samples) // frame_size
+    blocks = samples[: frames * frame_size].reshape(frames, frame_size).astype(np.float32)
+    return np.sqrt(np.mean(np.square(blocks / 32768.0), axis=1))
+
+
+def hysteresis(envelope: np.ndarray, open_level: float, close_level: float, initial: bool):
+    """Per-frame open/closed state: opens above open_level, closes below close_level,
+    and otherwise keeps the previous state."""
+    marks = np.full(len(envelope), -1, dtype=np.int8)
+    marks[envelope >= open_level] = 1
+    marks[envelope <= close_level] = 0
+    last_mark = np.where(marks >= 0, np.arange(len(envelope)), -1)
+    np.maximum.accumulate(last_mark, out=last_mark)
+    return np.where(last_mark >= 0, marks[last_mark] == 1, initial)
+
+
+class LipSync:
+    """Turns PCM into a compact list of (seconds, open) mouth transitions.
+
+    Audio can be fed in chunks as it arrives; the envelope and hysteresis are
+    vectorized and only actual state changes are walked to apply the hold time."""
+
+    def __init__(
+        self,
+        sample_rate: int,
+        open_db: float = OPEN_DB,
+        close_db: float = CLOSE_DB,
+        min_hold: float = MIN_HOLD,
+    ):
+        self.frame_size: int = int(sample_rate * FRAME)
+        self.frame_seconds: float = self.frame_size / sample_rate
+        self.open_level: float = 10 ** (open_db / 20)
+        self.close_level: float = 10 ** (close_db / 20)
+        self.hold_frames: int = math.ceil(min_hold / self.frame_seconds)
+        self.transitions: list[tuple[float, bool]] = []
+        self.is_open: bool = False
+        self._desired: bool = False
+        self._last_change: int = -self.hold_frames
+        self._frames: int = 0
+        self._rest: bytes = b""
+
+    def feed(self, pcm: bytes | memoryview) -> list[tuple[float, bool]]:
+        """Process more audio and return any new transitions."""
+        data = self._rest + bytes(pcm)
+        usable = len(data) - len(data) % (self.frame_size * SAMPLE_WIDTH)
+        self._rest = data[usable:]
+        envelope = rms_envelope(data[:usable], self.frame_size)
+        if not len(envelope):
+            return []
+
+        state = hysteresis(envelope, self.open_level, self.close_level, self._desired)
+        base = self._frames
+        self._frames += len(state)
+        changes = base + np.flatnonzero(np.diff(state, prepend=self._desired))
+        self._desired = bool(state[-1])
+
+        new = []
+        candidates = sorted({max(base, self._last_change + self.hold_frames), *changes.tolist()})
+        for frame in candidates:
+            frame = max(frame, self._last_change + self.hold_frames)
+            if frame >= self._frames:
+                break  # held back by the minimum hold, picked up on the next feed
+            if bool(state[frame - base]) != self.is_open:
+                self.is_open = not self.is_open
+                self._last_change = frame
+                new.append((frame * self.frame_seconds, self.is_open))
+        self.transitions.extend(new)
+        return new
+
+    def flush(self) -> list[tuple[float, bool]]:
+        """Close the mouth at the end of the audio."""
+        if not self.is_open:
+            return []
+        self.is_open = False
+        end = (self._frames + len(self._rest) // SAMPLE_WIDTH / self.frame_size) * self.frame_seconds
+        self.transitions.append((end, False))
+        return self.transitions[-1:]
+
+
+class MouthTrack:
+    """Mouth transitions for an AudioBuffer, computed incrementally while it streams in."""
+
+    def __init__(self, audio: AudioBuffer):
+        self.audio: AudioBuffer = audio
+        self.lipsync: LipSync = LipSync(audio.sample_rate)
+        self._offset: int = HEADER_SIZE
+        self.complete: bool = False
+        self.update()
+
+    @classmethod
+    def from_transitions(
+        cls, audio: AudioBuffer, transitions: list[tuple[float, bool]]
+    ) -> "MouthTrack":
+        """A complete track for finished audio whose transitions were computed before,
+        e.g. when its macro pack was built."""
+        track = cls.__new__(cls)
+        track.audio = audio
+        track.lipsync = LipSync(audio.sample_rate)
+        track.lipsync.transitions = list(transitions)
+        track._offset = audio.size
+        track.complete = True
+        return track
+
+    def update(self) -> list[tuple[float, bool]]:
+        """Analyse any audio that arrived since the last call and return all transitions."""
+        if self.complete:
+            return self.lipsync.transitions
+        finished = self.audio.finished
+        size = self.audio.size
+        if size > self._offset:
+            self.lipsync.feed(self.audio.read(self._offset, size - self._offset))
+            self._offset = size
+        if finished:
+            self.lipsync.flush()
+            self.complete = True
+        return self.lipsync.transitions
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+REASONS = {
+    200: "OK",
+    204: "No Content",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    415: "Unsupported Media Type",
+    500: "Internal Server Error",
+}
+
+
+async def read_request(reader: asyncio.StreamReader) -> tuple[str, str, dict[str, str], bytes]:
+    """Read one HTTP/1.1 request: method, path, lower-cased headers and body."""
+    request = await reader.readline()
+    method, path, _ = request.decode("latin-1").split(" ", 2)
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, path, headers, body
+
+
+async def respond(
+    writer: asyncio.StreamWriter, status: int, body: bytes = b"", content_type: str = ""
+) -> None:
+    """Send a complete response and leave the connection to be closed."""
+    head = f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Length: {len(body)}\r\n"
+    if content_type:
+        head += f"Content-Type: {content_type}\r\n"
+    writer.write(f"{head}Connection: close\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+
+
+async def respond_json(writer: asyncio.StreamWriter, data, status: int = 200) -> None:
+    await respond(writer, status, json.dumps(data, indent=2).encode("utf-8"), "application/json")
+
+
+class EventStream:
+    """Server-Sent Events fan-out: every published message goes to all listeners.
+
+    With replay_last, a new listener first gets the latest message, so it starts
+    out in the current state."""
+
+    def __init__(self, replay_last: bool = False):
+        self.replay_last: bool = replay_last
+        self._queues: set[asyncio.Queue] = set()
+        self._last: bytes | None = None
+        self.connections: int = 0
+
+    @property
+    def listeners(self) -> int:
+        return len(self._queues)
+
+    def publish(self, data: dict) -> None:
+        message = f"data: {json.dumps(data)}\n\n".encode("utf-8")
+        self._last = message
+        for queue in self._queues:
+            queue.put_nowait(message)
+
+    async def serve(self, writer: asyncio.StreamWriter) -> None:
+        """Stream messages to one listener until it disconnects or close() is called."""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n"
+        )
+        queue: asyncio.Queue = asyncio.Queue()
+        if self.replay_last and self._last:
+            queue.put_nowait(self._last)
+        self._queues.add(queue)
+        self.connections += 1
+        try:
+            while (message := await queue.get()) is not None:
+                writer.write(message)
+                await writer.drain()
+        finally:
+            self._queues.discard(queue)
+
+    def close(self) -> None:
+        """End every open stream."""
+        for queue in self._queues:
+            queue.put_nowait(None)
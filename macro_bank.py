@@ -0,0 +1,149 @@
+import glob
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from audio import AudioBuffer, MappedAudio
+from lipsync import MouthTrack
+from macro_pack import MacroPack, PackError
+from postprocess import process_wav
+
+_LOGGER = logging.getLogger("TTS.macros")
+
+
+@dataclass
+class Macro:
+    audio: AudioBuffer
+    media: Any  # the player's prepared media, e.g. a parsed vlc.Media
+    mouth: MouthTrack
+
+
+class MacroBank:
+    """Macro audio from memory-mapped packs, or decoded into memory from loose files,
+    trimmed and loudness-normalized, with ready-to-play media from the player and
+    precomputed mouth movements per macro.
+
+    Entries are keyed by their file path (e.g. "macro/skull.wav") so callers can
+    fall back to the file itself for anything not loaded.
+    """
+
+    def __init__(self, prepare: Callable[[AudioBuffer], Any]):
+        self.prepare = prepare
+        self._macros: dict[str, Macro] = {}
+        self._packs: dict[str, MacroPack] = {}
+        self._origin: dict[str, str] = {}  # key -> pack it was loaded from
+        self._lock = threading.Lock()
+        self.load_ms: float = 0.0
+
+    def load(self, pattern: str, into: str | None = None, skip: tuple[str, ...] = ()) -> int:
+        """Load every file matching a glob pattern, replacing existing entries.
+
+        With into, entries are keyed as if the files lived in that directory, which
+        lets a voice pack stand in for the default macros. Keys in skip are left alone."""
+        start = time.perf_counter()
+        files = sorted(glob.glob(pattern))
+        skip = tuple(os.path.normpath(file) for file in skip)
+        for file in files:
+            key = os.path.join(into, os.path.basename(file)) if into else file
+            if os.path.normpath(key) not in skip:
+                self.reload(file, key)
+        self.load_ms = (time.perf_counter() - start) * 1000
+        stats = self.stats()
+        _LOGGER.info(
+            "Loaded %d macros (%.1f MB) in %.1f ms",
+            stats["entries"],
+            stats["bytes"] / 1e6,
+            self.load_ms,
+        )
+        return len(files)
+
+    def load_pack(self, path: str, into: str = "", skip: tuple[str, ...] = ()) -> int:
+        """Map a macro pack and add its entries, replacing existing ones.
+
+        Entries are keyed as files named after them in into, so a pack for a voice
+        can stand in for the default macros. Keys in skip are left alone. The audio
+        stays in the mapping; nothing is read until it plays."""
+        start = time.perf_counter()
+        try:
+            pack = MacroPack(path)
+        except PackError as e:
+            _LOGGER.warning("%s", e)
+            return 0
+        skip = tuple(os.path.normpath(file) for file in skip)
+        macros = {}
+        for name, entry in pack.entries.items():
+            key = os.path.normpath(os.path.join(into, f"{name}.wav"))
+            if key not in skip:
+                audio = MappedAudio(pack.pcm(name), entry.sample_rate)
+                mouth = MouthTrack.from_transitions(audio, entry.mouth)
+                macros[key] = Macro(audio, self.prepare(audio), mouth)
+        path = os.path.normpath(path)
+        with self._lock:
+            self._macros.update(macros)
+            self._origin.update(dict.fromkeys(macros, path))
+            self._packs[path] = pack
+        self.load_ms = (time.perf_counter() - start) * 1000
+        _LOGGER.info("Mapped %d macros from %s in %.1f ms", len(macros), path, self.load_ms)
+        return len(macros)
+
+    def release(self, path: str) -> bool:
+        """Drop the entries still coming from a pack and unmap it, e.g. before the
+        pack file is replaced. False if some of its audio is still playing."""
+        path = os.path.normpath(path)
+        with self._lock:
+            pack = self._packs.pop(path, None)
+            for key in [key for key, origin in self._origin.items() if origin == path]:
+                del self._origin[key]
+                del self._macros[key]
+        return pack.close() if pack else True
+
+    def pack_of(self, file: str) -> MacroPack | None:
+        """The pack a macro is mapped from, or None if it was loaded from a file."""
+        with self._lock:
+            origin = self._origin.get(os.path.normpath(file))
+            return self._packs.get(origin) if origin else None
+
+    def reload(self, file: str, key: str | None = None) -> bool:
+        """Re-read a single macro from disk, e.g. after it was regenerated."""
+        key = key or file
+        try:
+            with open(file, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            _LOGGER.warning("Could not load macro %s: %s", file, e)
+            with self._lock:
+                self._macros.pop(os.path.normpath(key), None)
+                self._origin.pop(os.path.normpath(key), None)
+            return False
+        self.store(key, data)
+        return True
+
+    def store(self, file: str, data: bytes | memoryview) -> Macro:
+        """Add or replace a macro from WAV data already in memory."""
+        audio = AudioBuffer.from_wav(process_wav(data))
+        macro = Macro(audio, self.prepare(audio), MouthTrack(audio))
+        with self._lock:
+            self._macros[os.path.normpath(file)] = macro
+            self._origin.pop(os.path.normpath(file), None)
+        return macro
+
+    def get(self, file: str) -> Macro | None:
+        """The preloaded macro for a file, or None if it isn't loaded."""
+        with self._lock:
+            return self._macros.get(os.path.normpath(file))
+
+    def stats(self) -> dict:
+        """Entry count, memory footprint (mapped audio separately) and last load time."""
+        with self._lock:
+            mapped = [key in self._origin for key in self._macros]
+            sizes = [macro.audio.size for macro in self._macros.values()]
+            return {
+                "entries": len(self._macros),
+                "bytes": sum(size for size, is_mapped in zip(sizes, mapped) if not is_mapped),
+                "mapped_bytes": sum(size for size, is_mapped in zip(sizes, mapped) if is_mapped),
+                "packs": list(self._packs),
+                "load_ms": self.load_ms,
+            }
@@ -0,0 +1,188 @@
+"""Regenerate the macro library for a voice and emotion as a macro pack (see macro_pack.py).
+
+    python macro_builder.py --voice en-GB-SoniaNeural --emotion Cheerful --concurrency 4
+    python macro_builder.py --fake  # offline, against FakeSynthesizer
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from audio import split_wav
+from const import Batch, Const, MacroBuild, Emotion, Voice
+from macro_pack import MacroPack, PackEntry, PackError, macro_texts, write_pack
+from postprocess import PROCESSING, process_wav
+from synthesis import (
+    AzureSynthesizer,
+    FakeSynthesizer,
+    SynthesisError,
+    Synthesizer,
+    batch_ssml,
+    build_ssml,
+    split_marked,
+)
+
+_LOGGER = logging.getLogger("TTS.builder")
+
+
+def macro_ssml(text: str, voice: str, emotion: str) -> str:
+    return build_ssml(text, voice, emotion, Const.TTS_RATE, Const.TTS_PITCH)
+
+
+def pack_file(voice: str, emotion: str) -> str:
+    """The macro pack for a voice and emotion."""
+    return os.path.join(Const.PACK_DIR, f"{voice}-{emotion.lower()}.pack")
+
+
+@dataclass
+class BuildReport:
+    built: int = 0
+    skipped: int = 0
+    failed: int = 0
+    requests: int = 0
+    wall_time: float = 0.0
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.wall_time if self.wall_time else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.built} built, {self.skipped} unchanged, {self.failed} failed - "
+            f"{self.requests} requests in {self.wall_time:.2f}s "
+            f"({self.requests_per_second:.1f} req/s)"
+        )
+
+
+async def build_macro_pack(
+    backends: list[Synthesizer],
+    voice: str,
+    emotion: str,
+    retries: int = MacroBuild.RETRIES,
+    release: Callable[[str], object] | None = None,
+    batch: int = 1,
+) -> BuildReport:
+    """Render every macro for a voice/emotion, one request in flight per backend.
+
+    Entries whose text and SSML hash match the existing pack are reused, and with
+    batch > 1 up to that many of the others share a request, split at bookmarks.
+    The new pack only replaces the old one if every entry succeeded; release() is
+    called with its path first, so whoever has the old one mapped can let go of it."""
+    start = time.perf_counter()
+    report = BuildReport()
+    target = pack_file(voice, emotion)
+    try:
+        old = MacroPack(target)
+    except PackError:
+        old = None
+    entries: dict[str, tuple[PackEntry, bytes | memoryview]] = {}
+    todo: list[tuple[str, str, str, str]] = []
+    for name, text in macro_texts().items():
+        ssml = macro_ssml(text, voice, emotion)
+        # Covers the post-processing too, so changing it rebuilds the macros.
+        ssml_hash = hashlib.sha256(f"{PROCESSING}:{ssml}".encode("utf-8")).hexdigest()
+        entry = old.entries.get(name) if old else None
+        if entry and entry.text == text and entry.ssml_hash == ssml_hash:
+            entries[name] = (entry, bytes(old.pcm(name)))
+            report.skipped += 1
+        else:
+            todo.append((name, text, ssml, ssml_hash))
+    if old:
+        old.close()
+
+    free: asyncio.Queue = asyncio.Queue()
+    for backend in backends:
+        free.put_nowait(backend)
+
+    async def request(backend: Synthesizer, group: list[tuple[str, str, str, str]]) -> list[bytes]:
+        if len(group) == 1:
+            return [await backend.synthesize(group[0][2])]
+        audio, marks = await backend.synthesize_marked(
+            batch_ssml([ssml for _, _, ssml, _ in group], Batch.BREAK_MS / 1000)
+        )
+        pieces = split_marked(audio, marks, len(group))
+        if pieces is None:
+            raise SynthesisError("bookmarks missing from the batch")
+        return pieces
+
+    async def render(group: list[tuple[str, str, str, str]]) -> None:
+        for attempt in range(retries + 1):
+            if attempt:
+                await asyncio.sleep(MacroBuild.RETRY_DELAY_MS / 1000 * 2 ** (attempt - 1))
+            backend = await free.get()
+            try:
+                report.requests += 1
+                pieces = await request(backend, group)
+                break
+            except Exception as e:
+                names = ", ".join(name for name, _, _, _ in group)
+                _LOGGER.warning("Macros %s failed (attempt %d): %s", names, attempt + 1, e)
+            finally:
+                free.put_nowait(backend)
+        else:
+            if len(group) > 1:
+                # Maybe it was the batch; give them a try one at a time.
+                await asyncio.gather(*(render([item]) for item in group))
+            else:
+                report.failed += 1
+            return
+
+        for (name, text, _, ssml_hash), audio in zip(group, pieces):
+            pcm, sample_rate = split_wav(await asyncio.to_thread(process_wav, audio))
+            entries[name] = (PackEntry(sample_rate, text, ssml_hash), pcm)
+            report.built += 1
+
+    batch = max(1, batch)
+    await asyncio.gather(*(render(todo[i : i + batch]) for i in range(0, len(todo), batch)))
+
+    if report.failed:
+        _LOGGER.warning("Keeping the existing pack, %d macros failed", report.failed)
+    else:
+        if release:
+            release(target)
+        os.makedirs(Const.PACK_DIR, exist_ok=True)
+        await asyncio.to_thread(write_pack, target, entries, voice=voice, emotion=emotion)
+
+    report.wall_time = time.perf_counter() - start
+    _LOGGER.info("Macro pack %s: %s", target, report)
+    return report
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the macro pack for a voice/emotion.")
+    parser.add_argument("--voice", default=Voice.EN_JANE.value, choices=[v.value for v in Voice])
+    parser.add_argument(
+        "--emotion", default=Emotion.FRIENDLY.value, choices=[e.value for e in Emotion]
+    )
+    parser.add_argument("--concurrency", type=int, default=MacroBuild.CONCURRENCY)
+    parser.add_argument("--retries", type=int, default=MacroBuild.RETRIES)
+    parser.add_argument(
+        "--batch", type=int, default=1, help="macros per request, split at SSML bookmarks"
+    )
+    parser.add_argument("--fake", action="store_true", help="use the offline fake synthesizer")
+    parser.add_argument("--fake-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    if args.fake:
+        backends = [FakeSynthesizer(args.fake_latency) for _ in range(args.concurrency)]
+    else:
+        backends = await asyncio.gather(
+            *(
+                asyncio.to_thread(AzureSynthesizer, Const.API_KEY, Const.API_REGION)
+                for _ in range(args.concurrency)
+            )
+        )
+    report = await build_macro_pack(
+        backends, args.voice, args.emotion, args.retries, batch=args.batch
+    )
+    print(report)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,237 @@
+"""Single-file macro packs: the PCM of every macro plus an index, memory-mapped on load.
+
+Layout: a 32-byte header (magic, version, index offset and size), the PCM of each
+entry aligned to 16 bytes, then a JSON index of name -> offset, length, sample
+rate, text, SSML hash and precomputed mouth transitions. PCM is stored trimmed and
+loudness-normalized, so entries can be played straight from the mapping.
+
+    python macro_pack.py pack macro macro/macros.pack   # loose WAV files -> pack
+    python macro_pack.py unpack macro/macros.pack out   # pack -> WAV files + manifest.json
+    python macro_pack.py list macro/macros.pack
+"""
+
+import argparse
+import glob
+import json
+import mmap
+import os
+import struct
+from dataclasses import asdict, dataclass, field
+
+from audio import SAMPLE_RATE, split_wav, wav_header
+from const import COMPOSE_CLIPS, Const, PhraseMacro, RaidIcon
+from lipsync import LipSync
+from postprocess import process_wav
+
+MAGIC = b"TTSPACK\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")  # magic, version, reserved, index offset, index size
+ALIGN = 16
+MANIFEST = "manifest.json"
+
+
+class PackError(Exception):
+    """A macro pack is missing, truncated or not a pack at all."""
+
+
+def macro_texts() -> dict[str, str]:
+    """Macro name -> spoken text for every raid icon, phrase and number, and the
+    extra clips numbers and templates are composed from."""
+    texts = {icon.value: icon.value.capitalize() for icon in RaidIcon}
+    texts.update(
+        {
+            phrase.name.lower(): phrase.value[Const.PHRASE]
+            for phrase in PhraseMacro
+            if Const.PHRASE in phrase.value  # skips the _phrase_numbers helper member
+        }
+    )
+    texts.update(COMPOSE_CLIPS)
+    return texts
+
+
+@dataclass
+class PackEntry:
+    sample_rate: int = SAMPLE_RATE
+    text: str = ""
+    ssml_hash: str = ""
+    mouth: list[tuple[float, bool]] = field(default_factory=list)
+    offset: int = 0
+    length: int = 0
+
+
+def mouth_transitions(pcm: bytes | memoryview, sample_rate: int) -> list[tuple[float, bool]]:
+    lipsync = LipSync(sample_rate)
+    lipsync.feed(pcm)
+    lipsync.flush()
+    return lipsync.transitions
+
+
+def write_pack(
+    path: str, entries: dict[str, tuple[PackEntry, bytes | memoryview]], **info
+) -> int:
+    """Write entries (already post-processed PCM) to a pack, replacing the file at path
+    only once it is complete. Extra keyword arguments (voice, emotion) go in the index."""
+    tmp = path + ".tmp"
+    index = {}
+    with open(tmp, "wb") as f:
+        f.write(bytes(HEADER.size))
+        for name, (entry, pcm) in sorted(entries.items()):
+            f.write(bytes(-f.tell() % ALIGN))
+            if not entry.mouth:
+                entry.mouth = mouth_transitions(pcm, entry.sample_rate)
+            entry.offset, entry.length = f.tell(), len(pcm)
+            f.write(pcm)
+            index[name] = asdict(entry)
+        data = json.dumps({**info, "version": VERSION, "macros": index}).encode("utf-8")
+        index_offset = f.tell()
+        f.write(data)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, index_offset, len(data)))
+    os.replace(tmp, path)
+    return len(index)
+
+
+class MacroPack:
+    """A memory-mapped macro pack. pcm() returns views into the mapping, so the
+    audio is only paged in when it is read."""
+
+    def __init__(self, path: str):
+        self.path: str = path
+        try:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:  # ValueError: empty file
+            raise PackError(f"Cannot open macro pack {path}: {e}") from e
+        try:
+            magic, version, _, index_offset, index_size = HEADER.unpack_from(self._map)
+            if magic != MAGIC or version != VERSION:
+                raise PackError(f"{path} is not a version {VERSION} macro pack")
+            index = json.loads(self._map[index_offset : index_offset + index_size])
+            macros = index["macros"]
+        except (struct.error, ValueError, KeyError) as e:
+            self._map.close()
+            raise PackError(f"Corrupt macro pack {path}: {e}") from e
+        except PackError:
+            self._map.close()
+            raise
+        self.voice: str = index.get("voice", "")
+        self.emotion: str = index.get("emotion", "")
+        self.entries: dict[str, PackEntry] = {}
+        for name, entry in macros.items():
+            entry["mouth"] = [(t, bool(is_open)) for t, is_open in entry.get("mouth", [])]
+            self.entries[name] = PackEntry(**entry)
+            if entry["offset"] + entry["length"] > len(self._map):
+                self._map.close()
+                raise PackError(f"Truncated macro pack {path}: {name}")
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def pcm(self, name: str) -> memoryview:
+        """The PCM of an entry, without copying."""
+        entry = self.entries[name]
+        return memoryview(self._map)[entry.offset : entry.offset + entry.length]
+
+    def wav(self, name: str) -> bytes:
+        pcm = self.pcm(name)
+        return wav_header(len(pcm), self.entries[name].sample_rate) + pcm
+
+    def close(self) -> bool:
+        """Unmap the pack; False if audio from it is still in use."""
+        try:
+            self._map.close()
+        except BufferError:
+            return False
+        return True
+
+
+def pack_directory(
+    directory: str, path: str, skip: tuple[str, ...] = (Const.CUSTOM_FILE,)
+) -> int:
+    """Convert loose macro WAV files into a pack, trimming and normalizing them. Text
+    and SSML hashes come from a manifest.json next to them, if there is one; files
+    written by unpack() are marked as processed there and copied unchanged, since
+    trimming and normalizing them again would alter them."""
+    info, known = {}, {}
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            info = json.load(f)
+        known = info.pop("macros", {})
+    except (OSError, ValueError):
+        pass
+    processed = info.pop("processed", False)
+    texts = macro_texts()
+    skip = tuple(os.path.normpath(file) for file in skip)
+    entries = {}
+    for file in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+        if os.path.normpath(file) in skip:
+            continue
+        name = os.path.splitext(os.path.basename(file))[0]
+        with open(file, "rb") as f:
+            data = f.read()
+        pcm, sample_rate = split_wav(data if processed else process_wav(data))
+        known_entry = known.get(name, {})
+        entry = PackEntry(
+            sample_rate,
+            known_entry.get("text", texts.get(name, "")),
+            known_entry.get("ssml_hash", ""),
+        )
+        entries[name] = (entry, pcm)
+    return write_pack(path, entries, **info)
+
+
+def unpack(path: str, directory: str) -> int:
+    """Write every entry of a pack out as a WAV file, with a manifest.json of their
+    text and SSML hashes that marks them as already processed."""
+    pack = MacroPack(path)
+    os.makedirs(directory, exist_ok=True)
+    manifest = {}
+    for name, entry in pack.entries.items():
+        with open(os.path.join(directory, f"{name}.wav"), "wb") as f:
+            f.write(pack.wav(name))
+        manifest[name] = {"text": entry.text, "ssml_hash": entry.ssml_hash}
+    with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "voice": pack.voice,
+                "emotion": pack.emotion,
+                "processed": True,
+                "macros": manifest,
+            },
+            f,
+            indent=2,
+        )
+    pack.close()
+    return len(manifest)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert between macro packs and WAV files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("pack", help="WAV files in a directory -> pack")
+    command.add_argument("directory", nargs="?", default=Const.MACRO_DIR)
+    command.add_argument("pack", nargs="?", default=Const.MACRO_PACK)
+    command = commands.add_parser("unpack", help="pack -> WAV files in a directory")
+    command.add_argument("pack")
+    command.add_argument("directory")
+    command = commands.add_parser("list", help="show the entries of a pack")
+    command.add_argument("pack", nargs="?", default=Const.MACRO_PACK)
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        print(f"{pack_directory(args.directory, args.pack)} macros written to {args.pack}")
+    elif args.command == "unpack":
+        print(f"{unpack(args.pack, args.directory)} macros written to {args.directory}")
+    else:
+        pack = MacroPack(args.pack)
+        print(f"{args.pack}: {pack.voice or '-'} {pack.emotion or '-'}, {len(pack)} macros")
+        for name, entry in sorted(pack.entries.items()):
+            seconds = entry.length / 2 / entry.sample_rate
+            print(f"{name:<14} {seconds:>5.2f}s {entry.sample_rate:>6} Hz  {entry.text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,22 @@
-import re
+from metrics import startup  # first, so startup timing covers the other imports
+
 import sys
-import aiofiles
-import vlc
 import logging
 import asyncio
+import importlib
 from functools import partial
 from enum import StrEnum
 from qasync import QEventLoop, asyncSlot
 
 from PySide6.QtGui import (
+    QAction,
     QFont,
     QFontDatabase,
     QIcon,
     QKeyEvent,
     QMouseEvent,
 )
-from PySide6.QtCore import QSize, Qt, QTimer, QPointF, QMetaObject, Slot
+from PySide6.QtCore import QSize, Qt, QTimer, QPointF
 
 from PySide6.QtWidgets import (
     QApplication,
@@ -29,38 +30,28 @@ from PySide6.QtWidgets import (
     QVBoxLayout,
     QMenu,
 )
-from azure.cognitiveservices.speech import (
-    SpeechConfig,
-    SpeechSynthesizer,
-    Connection,
-    SpeechSynthesisOutputFormat,
-    AudioDataStream,
-    ResultReason,
-    CancellationReason,
-)
 
+from client import EngineClient, EngineUnavailable
 from const import (
     Const,
     Layout,
-    OBS,
+    ObsStatus,
     Emotion,
     Voice,
     RaidIcon,
     WebSocketIcon,
     PhraseMacro,
-    FIXES,
-    PRONUNCIATIONS,
-    ON,
-    OFF,
 )
-import simpleobsws
 
 logging.basicConfig(level=logging.INFO)
 _LOGGER = logging.getLogger("TTS")
 
 
 class MainWindow(QMainWindow):
-    """Application window."""
+    """Application window, a client of the engine service.
+
+    Connects to a running service.py if there is one, otherwise starts the
+    engine and its API inside this process, so other clients can still use it."""
 
     def __init__(self, app):
         super().__init__()
@@ -68,31 +59,20 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Text to Speech")
         self.start_pos: QPointF = None
 
-        # VLC
-        self.player: vlc.MediaPlayer = vlc.MediaPlayer()
-        self.custom_macro_text: str = ""
-
-        # Azure
-        self.speech_synthesizer: SpeechSynthesizer | None = None
-        self.tts_emotion: str = Emotion.FRIENDLY
-        self.tts_voice: str = Voice.EN_JANE
-        self.setup_synthesis()
-
-        # OBS
-        self.websocket: simpleobsws.WebSocketClient | None = None
-        self.websocket_reconnect_task: asyncio.Task | None = None
-        self.websocket_connected: bool = False
-        self.avatar_item_id: int | None = None
-        self.bubble_item_id: int | None = None
-        self.speaking_task: asyncio.Task | None = None
-        self.html_template: str = ""
-        self.last_tts_text: str = ""
+        # Engine
+        self.client = EngineClient()
+        self.service = None  # (engine, server) when the engine runs in this process
+        self.events_task: asyncio.Task | None = None
+        self.state: dict = {"voice": Voice.EN_JANE, "emotion": Emotion.FRIENDLY, "obs": ""}
+        self.custom_macro_set: bool = False
+        self.toggles: dict[str, QAction] = {}
 
         # Widgets
         self.btn_cust_macro: QPushButton | None = None
         self.input_text: QLineEdit | None = None
         self.menu_emotion: QMenu | None = None
         self.menu_voice: QMenu | None = None
+        self.menu_settings: QMenu | None = None
         self.number_row_state: bool = False
         self.number_row_container: QWidget | None = None
         self.active_rows: int = Layout.DEFAULT_ROWS
@@ -139,6 +119,14 @@ class MainWindow(QMainWindow):
             for value in items:
                 menu.addAction(value.value).triggered.connect(lambda _, v=value.value: handler(v))
 
+        def add_toggle(menu: QMenu, text: str, checked: bool, handler) -> QAction:
+            """Add a checkable QAction to a QMenu, calling handler with the new state."""
+            action = menu.addAction(text)
+            action.setCheckable(True)
+            action.setChecked(checked)
+            action.toggled.connect(handler)
+            return action
+
         # Raid Icon Macros
         for icon in RaidIcon:
             row_1.addWidget(
@@ -193,6 +181,8 @@ class MainWindow(QMainWindow):
         self.input_text.setMinimumSize(340, 30)
         self.input_text.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
         self.input_text.setMouseTracking(True)
+        # Only user edits, so clearing the box on Return doesn't cancel speculation.
+        self.input_text.textEdited.connect(self.speculate)
         row_3.addWidget(self.input_text)
 
         # Stop & Repeat Buttons
@@ -220,8 +210,11 @@ class MainWindow(QMainWindow):
         self.context_menu = QMenu(self)
         self.menu_emotion = self.context_menu.addMenu("Emotion")
         self.menu_voice = self.context_menu.addMenu("Voice")
+        self.menu_settings = self.context_menu.addMenu("Settings")
         self.context_menu.addAction("Toggle Numbers").triggered.connect(self.toggle_number_row)
         self.context_menu.addAction("Set Custom Macro").triggered.connect(self.set_custom_macro)
+        self.context_menu.addAction("Rebuild Macro Pack").triggered.connect(self.rebuild_macro_pack)
+        self.context_menu.addAction("Clear Voice Cache").triggered.connect(self.clear_voice_cache)
         self.context_menu.addAction("Exit").triggered.connect(
             lambda: asyncio.create_task(self.shutdown())
         )
@@ -229,9 +222,75 @@ class MainWindow(QMainWindow):
         # Fill menus
         populate_menu(self.menu_emotion, Emotion, self.set_emotion)
         populate_menu(self.menu_voice, Voice, self.set_voice)
+        for setting, text in (
+            ("streaming", "Streaming Playback"),
+            ("pipeline", "Pipelined Long Text"),
+            ("speculative", "Synthesize While Typing"),
+            ("batching", "Batch Short Phrases"),
+            ("save_audio", "Save Audio Files"),
+            ("metrics", "Latency Metrics"),
+            ("trace", "Latency Trace File"),
+        ):
+            self.toggles[setting] = add_toggle(
+                self.menu_settings, text, False, partial(self.set_toggle, setting)
+            )
 
     async def setup(self):
-        self.websocket_reconnect_task = asyncio.create_task(self.connect_obs_websocket())
+        """Connect to the engine service, starting it in-process if none is running."""
+        try:
+            state = await self.client.state()
+            _LOGGER.info("Using the TTS engine service on port %s", self.client.port)
+        except EngineUnavailable:
+            # The window is already up: import the engine, open VLC and connect to
+            # Azure in the background, with progress in the placeholder text.
+            await self.set_progress_message("Starting TTS engine...")
+            try:
+                with startup.phase("engine import"):
+                    service = await asyncio.to_thread(importlib.import_module, "service")
+                self.service = await service.start_service(self.client.host, self.client.port)
+                state = await self.client.state()
+            except (OSError, ImportError, EngineUnavailable) as e:
+                # E.g. the port is taken by something else, or VLC could not be loaded.
+                _LOGGER.error("Could not start the TTS engine: %s", e)
+                await self.set_progress_message(f"TTS engine failed to start: {e}")
+                return
+        self.events_task = asyncio.create_task(self.follow_events())
+        self.apply_state(state)
+        self.on_obs_status(state["obs"])
+        if state["ready"]:
+            await self.set_progress_message()
+
+    async def follow_events(self) -> None:
+        """Show the engine's status messages, OBS status and settings changes."""
+        try:
+            async for event in self.client.events():
+                if event["event"] == "message":
+                    self.show_message(event["text"], event["show_for"])
+                elif event["event"] == "obs":
+                    self.on_obs_status(event["status"])
+                elif event["event"] == "state":
+                    self.apply_state(event)
+                    asyncio.create_task(self.set_progress_message())
+        except EngineUnavailable as e:
+            _LOGGER.warning("%s", e)
+        await self.set_progress_message("TTS engine stopped")
+
+    def apply_state(self, state: dict) -> None:
+        """Reflect the engine's settings in the menus."""
+        self.state.update(state)
+        self.custom_macro_set = self.custom_macro_set or bool(state.get("custom_macro"))
+        for setting, action in self.toggles.items():
+            action.blockSignals(True)
+            action.setChecked(bool(state.get(setting)))
+            action.blockSignals(False)
+
+    async def request(self, call) -> None:
+        """Await a client call, showing a message if the engine can't be reached."""
+        try:
+            await call
+        except EngineUnavailable as e:
+            _LOGGER.warning("%s", e)
+            await self.set_progress_message(str(e), 4)
 
     def toggle_number_row(self) -> None:
         """Show or hide the number row."""
@@ -246,54 +305,34 @@ class MainWindow(QMainWindow):
             self.number_row_container.hide()
 
     # ------------------------------
-    # VLC Media Player
+    # Speech and macros
     # ------------------------------
 
-    def play(self, file: str, channel: str) -> None:
-        """Play audio file."""
-        self.player.pause()
-        self.player.set_media(vlc.Media(file))
-        self.player.audio_output_device_set(None, channel)
-        _LOGGER.info("Playing audio file (%s) on %s", file, Const(channel).name)
-        self.player.play()
-
     def stop(self) -> None:
-        """Stop the player."""
-        _LOGGER.info("Stopping the player")
-        self.player.stop()
+        asyncio.create_task(self.request(self.client.stop()))
 
-    @asyncSlot()
-    async def play_macro(self, macro: str) -> None:
-        """Play the macro file."""
+    def play_macro(self, macro: str) -> None:
+        """Play a macro. The custom macro button sets it from the input text if unset."""
+        if macro == Const.CUSTOM and not self.custom_macro_set and self.input_text.text():
+            self.set_custom_macro()
+            return
         if macro == Const.REPEAT:
-            file = Const.TTS_FILE
-            text = ""
-        elif macro == Const.CUSTOM:
-            if not self.custom_macro_text:
-                if not self.input_text.text():
-                    _LOGGER.warning("A custom macro has not been set")
-                    await self.set_progress_message("A custom macro has not been set", 4)
-                    return
-                return self.set_custom_macro()
-            file = Const.CUSTOM_FILE
-            text = self.custom_macro_text
+            asyncio.create_task(self.request(self.client.repeat()))
         else:
-            file = Const.MACRO_FILE.replace(Const.REPLACE, macro, 1)
-            try:
-                text = RaidIcon(macro).value.capitalize() + (
-                    Const.REPLACE if macro != RaidIcon.UNMARKED else ""
-                )
-                _LOGGER.info("Macro is a raid icon")
-            except ValueError:
-                text = PhraseMacro[macro.upper()].value[Const.PHRASE]
-                _LOGGER.info("Macro is a phrase")
-
-        _LOGGER.info(f"Playing macro: {macro}")
-        self.play(file, Const.MAIN_CHANNEL)
-        if self.speaking_task:
-            self.speaking_task.cancel()
-        self.speaking_task = asyncio.create_task(self.avatar_talk(text))
-        # await self.avatar_talk(text)
+            asyncio.create_task(self.request(self.client.macro(macro)))
+
+    @asyncSlot()
+    async def set_custom_macro(self) -> None:
+        """Set the custom macro."""
+        custom_text = self.input_text.text()
+        if not custom_text:
+            _LOGGER.warning("Custom Macro: No text was entered")
+            await self.set_progress_message("Type macro text here first!", 4)
+            return
+        self.btn_cust_macro.setText(f"  {custom_text}  ")
+        self.input_text.clear()
+        self.custom_macro_set = True
+        await self.request(self.client.set_custom_macro(custom_text))
 
     # ------------------------------
     # Settings Menus
@@ -301,47 +340,47 @@ class MainWindow(QMainWindow):
 
     @asyncSlot()
     async def set_emotion(self, emotion: str) -> None:
-        """Set the emotion for the TTS."""
-        _LOGGER.info("Setting emotion to: %s", emotion)
-        self.tts_emotion = emotion
-        await self.set_progress_message()
+        await self.request(self.client.settings(emotion=emotion))
+
+    def speculate(self, text: str) -> None:
+        """Let the engine synthesize the text being typed, when that is turned on."""
+        if self.state.get("speculative"):
+            asyncio.create_task(self.request(self.client.speculate(text)))
 
     @asyncSlot()
     async def set_voice(self, voice: str) -> None:
-        """Set the voice for the TTS."""
-        _LOGGER.info("Setting voice to: %s", voice)
-        self.tts_voice = voice
-        await self.set_progress_message()
+        await self.request(self.client.settings(voice=voice))
 
     @asyncSlot()
-    async def set_custom_macro(self) -> None:
-        """Set the custom macro."""
-        custom_text = self.input_text.text()
-        if not custom_text:
-            _LOGGER.warning("Custom Macro: No text was entered")
-            await self.set_progress_message("Type macro text here first!", 4)
-            return
-        self.btn_cust_macro.setText(f"  {custom_text}  ")
-        await self.text_to_speech(custom_text, "", create_custom_macro=True)
-        self.custom_macro_text = custom_text
-        self.input_text.clear()
-        _LOGGER.info("Custom macro set: %s", custom_text)
-        await self.set_progress_message(f"Custom macro set to: {custom_text}", 4)
+    async def set_toggle(self, setting: str, enable: bool) -> None:
+        await self.request(self.client.settings(**{setting: enable}))
+
+    @asyncSlot()
+    async def rebuild_macro_pack(self) -> None:
+        await self.request(self.client.rebuild_macro_pack())
+
+    @asyncSlot()
+    async def clear_voice_cache(self) -> None:
+        await self.request(self.client.clear_voice_cache())
 
     # ------------------------------
     # LineEdit Information Text
     # ------------------------------
 
+    def show_message(self, text: str, show_for: float = 0) -> None:
+        """Engine status messages go to the text input placeholder."""
+        asyncio.create_task(self.set_progress_message(text, show_for))
+
     async def set_progress_message(self, text: str = "", show_for: float = 0) -> None:
         """Put a non-interactive message in the text input area to show status and progress messages.
 
         With no args given, Voice information is shown as default.
         Optionally show message for set amount of seconds before returning to default."""
         if not text:
-            voice = self.tts_voice.rsplit("-", 1)[-1]
+            voice = self.state["voice"].rsplit("-", 1)[-1]
             if "Neural" in voice:
                 voice = voice.removesuffix("Neural")
-            text = f" {voice} - {self.tts_emotion}"
+            text = f" {voice} - {self.state['emotion']}"
 
         _LOGGER.info("Setting the line-edit placeholder to: %s", text)
         self.input_text.setPlaceholderText(text)
@@ -350,255 +389,22 @@ class MainWindow(QMainWindow):
             await self.set_progress_message()
 
     # ------------------------------
-    # Azure Text to Speech
-    # ------------------------------
-
-    def setup_synthesis(self) -> None:
-        """Configure and connect to Azure TTS."""
-        speech_config = SpeechConfig(subscription=Const.API_KEY, region=Const.API_REGION)
-        speech_config.set_speech_synthesis_output_format(
-            SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm
-        )
-        self.speech_synthesizer = SpeechSynthesizer(speech_config=speech_config, audio_config=None)
-        _LOGGER.info("Connecting to Azure TTS")
-        connection = Connection.from_speech_synthesizer(self.speech_synthesizer)
-        connection.open(True)
-        _LOGGER.info("Connected!")
-
-    @Slot()
-    def clear_text_input(self):
-        self.input_text.clear()
-
-    async def text_to_speech(
-        self, input_text: str, channel: str, *, create_custom_macro: bool = False
-    ) -> None:
-        """Synthesize speech and play it on selected channel.
-
-        Optionally create the custom macro without playing it.
-        """
-
-        # text_to_speech() not in GUI thread, so interact with widget with invokeMethod
-        QMetaObject.invokeMethod(self, "clear_text_input")
-        tts_rate = "5"
-        tts_pitch = "4"
-
-        _LOGGER.info("Fixing typing mistakes")
-        for mistake, fix in FIXES.items():
-            input_text = re.sub(mistake, fix, input_text, flags=re.IGNORECASE)
-
-        # Differentiate Azure TTS input from the written text.
-        tts_input = input_text
-
-        _LOGGER.info("Fixing pronunciations")
-        for mispronounced, repronounced in PRONUNCIATIONS.items():
-            tts_input = re.sub(mispronounced, repronounced, tts_input, flags=re.IGNORECASE)
-
-        # SSML creation.
-        tts_ssml = (
-            '<speak xmlns="http://www.w3.org/2001/10/synthesis" xmlns:mstts="http://www.w3.org/2001/mstts" '
-            + 'xmlns:emo="http://www.w3.org/2009/10/emotionml" version="1.0" xml:lang="en-US">'
-            + f'<voice name="{self.tts_voice}"><mstts:express-as style="{self.tts_emotion.lower()}" styledegree="1">'
-            + f'<prosody rate="{tts_rate}%" pitch="{tts_pitch}%">{tts_input}</prosody>'
-            + "</mstts:express-as></voice></speak>"
-        )
-
-        tts_result = await asyncio.to_thread(self.speech_synthesizer.speak_ssml_async(tts_ssml).get)
-        if tts_result.reason == ResultReason.Canceled:
-            cancellation_details = tts_result.cancellation_details
-            _LOGGER.warning("Speech synthesis canceled: %s", cancellation_details.reason)
-            if cancellation_details.reason == CancellationReason.Error:
-                if cancellation_details.error_details:
-                    _LOGGER.error("Error details: %s", cancellation_details.error_details)
-            return
-
-        # Save speech to memory.
-        tts_stream = AudioDataStream(tts_result)
-
-        # Save the custom macro if applicable.
-        if create_custom_macro:
-            tts_stream.save_to_wav_file(Const.CUSTOM_FILE)
-            _LOGGER.info("Saved custom macro file: %s", Const.CUSTOM_FILE)
-            return
-
-        tts_stream.save_to_wav_file(Const.TTS_FILE)
-        _LOGGER.info("Saved speech file: %s", Const.TTS_FILE)
-        self.last_tts_text = input_text
-        self.play(Const.TTS_FILE, channel)
-        if self.speaking_task:
-            self.speaking_task.cancel()
-        self.speaking_task = asyncio.create_task(
-            self.avatar_talk(alt_channel=False if channel == Const.MAIN_CHANNEL else True)
-        )
-        # await self.avatar_talk()
-
-    # ------------------------------
-    # OBS Websocket
+    # OBS WebSocket
     # ------------------------------
 
     @asyncSlot()
     async def trigger_websocket(self):
-        # if self.websocket and self.websocket.is_identified():
-        if self.websocket:
-            await self.config_websocket_status(OFF)
-            await self.set_progress_message("OBS Disconnected", 2)
-            return
-        self.websocket_reconnect_task = asyncio.create_task(self.connect_obs_websocket())
-
-    async def config_websocket_status(self, toggle: bool, soft: bool = False) -> None:
-        if not toggle:
-            if not soft:
-                # if self.websocket and self.websocket.is_identified():
-                if self.websocket:
-                    await self.websocket.disconnect()
-                if self.websocket_reconnect_task:
-                    self.websocket_reconnect_task.cancel()
-            self.websocket = None
-            self.websocket_reconnect_task = None
-
-        self.websocket_connected = toggle
-        self.btn_websocket.setIcon(WebSocketIcon.ON if toggle else WebSocketIcon.OFF)
-
-    async def connect_obs_websocket(self) -> None:
-        """Set up async OBS WebSocket client and get scene item IDs."""
-        delay = 20  # seconds between connection checks
-        retries = 3  # number of retries after a disconnect
-        attempt = 0
-        disconnected = False
-
-        self.websocket = simpleobsws.WebSocketClient(
-            url=f"ws://{OBS.HOST}:{OBS.PORT}", password=OBS.PWD
-        )
-
-        while True:
-            if self.websocket_connected:
-                if self.websocket and self.websocket.is_identified():
-                    _LOGGER.info("OBS WebSocket identified.")
-                    await asyncio.sleep(delay)
-                    continue
-                _LOGGER.warning("OBS WebSocket disconnected, attempting reconnect...")
-                self.websocket_connected = False
-                disconnected = True
-                self.btn_websocket.setIcon(WebSocketIcon.OFF_RED)
-
-            if attempt >= retries:
-                _LOGGER.warning("Connection failed. Stopping attempts.")
-                await self.set_progress_message()
-                await self.config_websocket_status(OFF)
-                break
-            attempt += 1
-
-            _LOGGER.info("Attempting to connect to OBS WebSocket...")
-            if disconnected:
-                dc = "OBS disconnected! " if attempt == 1 else ""
-                await self.set_progress_message(dc + "Attempting to reconnect...")
-            else:
-                await self.set_progress_message("Connecting to OBS WebSocket...")
-
-            try:
-                await self.websocket.connect()
-                await self.websocket.wait_until_identified()
-
-                # Get avatar and speech-bubble item IDs
-                avatar_response = await self.websocket.call(
-                    simpleobsws.Request(
-                        "GetSceneItemId",
-                        {"sceneName": OBS.AVA_SCENE, "sourceName": OBS.AVA_SOURCE},
-                    )
-                )
-                self.avatar_item_id = avatar_response.responseData["sceneItemId"]
-
-                bubble_response = await self.websocket.call(
-                    simpleobsws.Request(
-                        "GetSceneItemId",
-                        {"sceneName": OBS.BUB_SCENE, "sourceName": OBS.BUB_SOURCE},
-                    )
-                )
-                self.bubble_item_id = bubble_response.responseData["sceneItemId"]
-
-                _LOGGER.info("Connected to OBS!")
-                attempt = 0
-                disconnected = False
-                await self.config_websocket_status(ON)
-                await self.set_progress_message("Connected to OBS!", 2)
-
-            except Exception as e:
-                _LOGGER.warning(f"OBS connection failed: {e}")
-                self.btn_websocket.setIcon(WebSocketIcon.OFF_RED)
-                await self.set_progress_message(str(e).split("]", 1)[-1], 5)
-                if not disconnected:
-                    await self.config_websocket_status(OFF)
-                    break
-            else:
-                if not self.html_template:
-                    await self.load_html_template()
-                await asyncio.sleep(delay)
-
-    async def load_html_template(self):
-        async with aiofiles.open("speech-bubble-template.html", "r") as f:
-            self.html_template = await f.read()
-
-    async def avatar_talk(self, override: str | None = None, alt_channel: bool = False) -> None:
-        """Make the on-screen avatar talk while the speech audio is playing."""
-        if self.websocket and self.websocket.is_identified():
-            await self.send_speech_bubble_text(False)
-            await asyncio.sleep(0.2)
-            await self.send_speech_bubble_text(True, override or self.last_tts_text, alt_channel)
-            await self.move_mouth(True)
-            while self.player.is_playing():
-                await self.move_mouth(False)
-                await asyncio.sleep(0.2)
-                await self.move_mouth(True)
-                await asyncio.sleep(0.2)
-            await self.move_mouth(False)
-            await asyncio.sleep(3)
-            await self.send_speech_bubble_text(False)
-
-    async def move_mouth(self, enable: bool) -> None:
-        """Enable and disable the open-mouth image of the avatar."""
-        if self.avatar_item_id:
-            await self.websocket.call(
-                simpleobsws.Request(
-                    "SetSceneItemEnabled",
-                    {
-                        "sceneName": OBS.AVA_SCENE,
-                        "sceneItemId": self.avatar_item_id,
-                        "sceneItemEnabled": enable,
-                    },
-                )
-            )
-
-    async def send_speech_bubble_text(
-        self, enable: bool, text: str = "", alt_channel: bool = False
-    ) -> None:
-        """Update the speech-bubble HTML, and enable/disable the speech-bubble browser source."""
-        if not self.html_template:
-            await self.load_html_template()
-        if not self.html_template:
-            await self.set_progress_message("HTML template could not be loaded")
-
-        if text and self.html_template:
-            icon = ""
-            if text.endswith(Const.REPLACE):
-                text = text.removesuffix(Const.REPLACE)
-                icon = f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;<img src="icons/{text}.png" />'
-            html = self.html_template.replace(Const.REPLACE, "show" if alt_channel else "hide", 1)
-            html = html.replace(Const.REPLACE, text + icon, 1)
-            async with aiofiles.open("speech-bubble.html", "w") as f:
-                await f.write(html)
-
-        if self.bubble_item_id:
-            await self.websocket.call(
-                simpleobsws.Request(
-                    "SetSceneItemEnabled",
-                    {
-                        "sceneName": OBS.BUB_SCENE,
-                        "sceneItemId": self.bubble_item_id,
-                        "sceneItemEnabled": enable,
-                    },
-                )
-            )
+        connect = self.state["obs"] in ("", ObsStatus.DISCONNECTED)
+        await self.request(self.client.obs(connect))
+
+    def on_obs_status(self, status: str) -> None:
+        self.state["obs"] = status
+        if status == ObsStatus.CONNECTED:
+            self.btn_websocket.setIcon(QIcon(WebSocketIcon.ON))
+        elif status == ObsStatus.RECONNECTING:
+            self.btn_websocket.setIcon(QIcon(WebSocketIcon.OFF_RED))
         else:
-            await self.set_progress_message("Speech bubble ID not loaded")
+            self.btn_websocket.setIcon(QIcon(WebSocketIcon.OFF))
 
     # ------------------------------
     # Event managers
@@ -607,18 +413,19 @@ class MainWindow(QMainWindow):
     def keyPressEvent(self, event: QKeyEvent) -> None:
         """Detect when Return or Shift + Return is pressed."""
         if event.key() == Qt.Key.Key_Return:
+            text = self.input_text.text()
             if event.modifiers() == Qt.KeyboardModifier.ShiftModifier:
-                if self.input_text.text():
+                if text:
                     _LOGGER.info("Shift + Return pressed for alt mic channel")
-                    asyncio.create_task(
-                        self.text_to_speech(self.input_text.text(), Const.ALT_CHANNEL)
-                    )
+                    self.input_text.clear()
+                    asyncio.create_task(self.request(self.client.speak(text, "alt")))
                 else:
                     _LOGGER.info("Shift + Return pressed with no text input. Stopping player.")
                     self.stop()
-            elif self.input_text.text():
+            elif text:
                 _LOGGER.info("Return pressed for main mic channel")
-                asyncio.create_task(self.text_to_speech(self.input_text.text(), Const.MAIN_CHANNEL))
+                self.input_text.clear()
+                asyncio.create_task(self.request(self.client.speak(text, "main")))
             else:
                 _LOGGER.info("Return pressed with no text input.")
 
@@ -655,17 +462,14 @@ class MainWindow(QMainWindow):
         asyncio.create_task(self.shutdown())
 
     async def shutdown(self):
-        """Disconnect from OBS and clean up."""
+        """Stop the in-process engine, if this window started it, and quit."""
         _LOGGER.info("Shutting down...")
-        try:
-            await self.config_websocket_status(OFF)
-            _LOGGER.info("OBS WebSocket disconnected.")
-        except Exception as e:
-            _LOGGER.warning(f"Error while disconnecting OBS WebSocket: {e}")
-        self.stop()
+        if self.events_task:
+            self.events_task.cancel()
+        if self.service:
+            await importlib.import_module("service").stop_service(*self.service)
         QTimer.singleShot(0, self.app.quit)
 
-
 def setup_event_loop(app):
     """Starting the event loop."""
     # from PySide6.QtAsyncio import QAsyncioEventLoop
@@ -683,8 +487,10 @@ def main():
     app.setFont(QFont("PT Sans"))
     app.setStyle("Fusion")
 
+    startup.mark("imports")
     window = MainWindow(app)
     window.show()
+    startup.mark("window shown")
 
     loop = setup_event_loop(app)
 
@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+_LOGGER = logging.getLogger("TTS.metrics")
+
+
+class Span:
+    """Times a with-block and records it under a name."""
+
+    __slots__ = ("metrics", "name", "attrs", "start")
+
+    def __init__(self, metrics: "Metrics", name: str, attrs: dict):
+        self.metrics = metrics
+        self.name = name
+        self.attrs = attrs
+        self.start = 0.0
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.metrics.record(self.name, time.perf_counter() - self.start, **self.attrs)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    """Rolling latency histograms per pipeline stage, plus an optional JSONL trace.
+
+    Disabled by default: span() then hands out a shared no-op and record()
+    returns immediately, so instrumented code costs a method call per stage.
+    Components can register their own stats() to be included in snapshot().
+    """
+
+    def __init__(self, window: int = 1000):
+        self.enabled: bool = False
+        self.window: int = window
+        self._samples: dict[str, deque[float]] = {}
+        self._counts: dict[str, int] = {}
+        self._sources: dict[str, Callable[[], dict]] = {}
+        self._trace = None
+        self._lock = threading.Lock()
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+
+    def open_trace(self, file: str | None) -> None:
+        """Append every recorded span to a JSONL file, or stop tracing with None."""
+        with self._lock:
+            if self._trace:
+                self._trace.close()
+                self._trace = None
+            if file:
+                os.makedirs(os.path.dirname(file) or ".", exist_ok=True)
+                self._trace = open(file, "a", encoding="utf-8")
+                _LOGGER.info("Writing latency trace to %s", file)
+
+    def span(self, name: str, **attrs) -> Span | _NullSpan:
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, attrs)
+
+    def clock(self) -> float:
+        """Start time for since(), for stages that don't fit a with-block."""
+        return time.perf_counter() if self.enabled else 0.0
+
+    def since(self, name: str, start: float, **attrs) -> None:
+        if self.enabled and start:
+            self.record(name, time.perf_counter() - start, **attrs)
+
+    def record(self, name: str, seconds: float, **attrs) -> None:
+        """Add a sample. Safe to call from any thread."""
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+                self._counts[name] = 0
+            samples.append(seconds)
+            self._counts[name] += 1
+            if self._trace:
+                entry = {"ts": time.time(), "span": name, "ms": round(seconds * 1000, 3), **attrs}
+                self._trace.write(json.dumps(entry) + "\n")
+
+    def register(self, name: str, stats: Callable[[], dict]) -> None:
+        """Include a component's stats() in snapshots."""
+        self._sources[name] = stats
+
+    def histograms(self) -> dict[str, dict]:
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            counts = dict(self._counts)
+        return {
+            name: {
+                "count": counts[name],
+                "p50_ms": values[int(len(values) * 0.50)] * 1000,
+                "p95_ms": values[int(len(values) * 0.95)] * 1000,
+                "p99_ms": values[int(len(values) * 0.99)] * 1000,
+                "max_ms": values[-1] * 1000,
+            }
+            for name, values in samples.items()
+        }
+
+    def snapshot(self) -> dict:
+        """Latency histograms and registered component stats."""
+        snapshot = {"enabled": self.enabled, "latency": self.histograms()}
+        for name, stats in self._sources.items():
+            try:
+                snapshot[name] = stats()
+            except Exception as e:
+                snapshot[name] = {"error": str(e)}
+        if self._trace:
+            with self._lock:
+                self._trace.flush()
+        return snapshot
+
+
+class StartupTimer:
+    """Breakdown of application start, from the first import of this module until ready.
+
+    Marks are points in time; phases are timed blocks that may run concurrently,
+    each recorded with its start offset and duration. Always on, unlike Metrics."""
+
+    def __init__(self):
+        self.start: float = time.perf_counter()
+        self.marks: dict[str, float] = {}
+        self.phases: dict[str, tuple[float, float]] = {}
+        self.ready_s: float | None = None
+
+    def mark(self, name: str) -> None:
+        self.marks[name] = time.perf_counter() - self.start
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (begin - self.start, time.perf_counter() - begin)
+
+    def ready(self, target: float = 0.0) -> float:
+        """Mark startup complete and log the breakdown. Returns seconds since start."""
+        self.ready_s = time.perf_counter() - self.start
+        breakdown = ", ".join(
+            [f"{name} at {at * 1000:.0f}" for name, at in self.marks.items()]
+            + [f"{name} {took * 1000:.0f}" for name, (_, took) in self.phases.items()]
+        )
+        _LOGGER.info("Ready in %.0f ms (%s ms)", self.ready_s * 1000, breakdown)
+        if target and self.ready_s > target:
+            _LOGGER.warning("Startup took longer than the %.0f ms target", target * 1000)
+        return self.ready_s
+
+    def report(self) -> dict:
+        return {
+            "ready_ms": round(self.ready_s * 1000, 1) if self.ready_s is not None else None,
+            "marks_ms": {name: round(at * 1000, 1) for name, at in self.marks.items()},
+            "phases": {
+                name: {"start_ms": round(at * 1000, 1), "ms": round(took * 1000, 1)}
+                for name, (at, took) in self.phases.items()
+            },
+        }
+
+
+metrics = Metrics()
+startup = StartupTimer()
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+import simpleobsws
+
+from const import ObsStatus
+from metrics import metrics
+
+_LOGGER = logging.getLogger("TTS.obs")
+
+
+class ObsError(Exception):
+    """An OBS request failed."""
+
+
+class ObsCommands:
+    """OBS requests on top of a simpleobsws client.
+
+    Scene item toggles are staged with set_enabled() and sent by flush(): items
+    already known to be in the requested state are skipped, and everything staged
+    together goes out as one request batch. Round-trips are counted and timed.
+    """
+
+    def __init__(self, websocket: simpleobsws.WebSocketClient):
+        self.websocket: simpleobsws.WebSocketClient = websocket
+        self._enabled: dict[tuple[str, int], bool] = {}
+        self._pending: dict[tuple[str, int], bool] = {}
+        self.latencies: deque[float] = deque(maxlen=200)
+        self.counters: dict[str, int] = dict.fromkeys(
+            ("calls", "requests", "skipped", "failed"), 0
+        )
+
+    def reset(self) -> None:
+        """Forget the known item states, e.g. after a reconnect."""
+        self._enabled.clear()
+        self._pending.clear()
+
+    def is_enabled(self, scene: str, item_id: int) -> bool | None:
+        """Last known state of a scene item, or None if unknown."""
+        return self._enabled.get((scene, item_id))
+
+    def set_enabled(self, scene: str, item_id: int, enabled: bool) -> None:
+        """Stage showing or hiding a scene item until the next flush()."""
+        key = (scene, item_id)
+        if self._enabled.get(key) == enabled:
+            self._pending.pop(key, None)
+            self.counters["skipped"] += 1
+        else:
+            self._pending[key] = enabled
+
+    async def flush(self) -> None:
+        """Send all staged scene item changes in a single round-trip."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        requests = [
+            simpleobsws.Request(
+                "SetSceneItemEnabled",
+                {"sceneName": scene, "sceneItemId": item_id, "sceneItemEnabled": enabled},
+            )
+            for (scene, item_id), enabled in pending.items()
+        ]
+        try:
+            responses = await self.call(requests)
+        except (simpleobsws.NotIdentifiedError, simpleobsws.MessageTimeout) as e:
+            _LOGGER.warning("OBS scene item update failed: %s", e)
+            for key in pending:
+                self._enabled.pop(key, None)
+            return
+        for ((scene, item_id), enabled), response in zip(pending.items(), responses):
+            if response.ok():
+                self._enabled[(scene, item_id)] = enabled
+            else:
+                # State unknown now, so the next change is sent regardless.
+                self._enabled.pop((scene, item_id), None)
+
+    def note_enabled(self, scene: str, item_id: int, enabled: bool) -> None:
+        """Record a state change made outside this client, e.g. from an OBS event."""
+        self._enabled[(scene, item_id)] = enabled
+
+    async def lookup_item_ids(self, items: list[tuple[str, str]]) -> list[int]:
+        """Scene item IDs for (scene, source) pairs, in one round-trip."""
+        responses = await self.call(
+            [
+                simpleobsws.Request("GetSceneItemId", {"sceneName": scene, "sourceName": source})
+                for scene, source in items
+            ]
+        )
+        for response in responses:
+            if not response.ok():
+                raise ObsError(response.requestStatus.comment or "GetSceneItemId failed")
+        return [response.responseData["sceneItemId"] for response in responses]
+
+    async def refresh_states(self, items: list[tuple[str, int]]) -> list[bool]:
+        """Fetch the enabled state of (scene, item ID) pairs in one round-trip.
+
+        Returns per item whether it still exists."""
+        responses = await self.call(
+            [
+                simpleobsws.Request(
+                    "GetSceneItemEnabled", {"sceneName": scene, "sceneItemId": item_id}
+                )
+                for scene, item_id in items
+            ]
+        )
+        for (scene, item_id), response in zip(items, responses):
+            if response.ok():
+                self._enabled[(scene, item_id)] = response.responseData["sceneItemEnabled"]
+        return [response.ok() for response in responses]
+
+    async def call(self, requests: list[simpleobsws.Request]) -> list[simpleobsws.RequestResponse]:
+        """Send one request, or several as a batch, and time the round-trip."""
+        start = time.perf_counter()
+        if len(requests) == 1:
+            responses = [await self.websocket.call(requests[0])]
+        else:
+            responses = await self.websocket.call_batch(requests, halt_on_failure=False)
+        self.latencies.append(time.perf_counter() - start)
+        metrics.record("obs.call", self.latencies[-1], requests=len(requests))
+        self.counters["calls"] += 1
+        self.counters["requests"] += len(requests)
+        for request, response in zip(requests, responses):
+            if not response.ok():
+                self.counters["failed"] += 1
+                _LOGGER.warning(
+                    "OBS %s failed: %s", request.requestType, response.requestStatus.comment
+                )
+        return responses
+
+    def stats(self) -> dict:
+        """Round-trip latency and request counters."""
+        latencies = sorted(self.latencies)
+        return {
+            "rtt_mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            "rtt_p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+            "rtt_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+            **self.counters,
+        }
+
+
+class ObsConnection:
+    """Keeps an OBS websocket session up and the wanted scene item IDs resolved.
+
+    Disconnects are noticed as soon as the client's receive task ends, and
+    reconnects use jittered exponential backoff with no retry limit. Item IDs are
+    cached in a JSON file across runs, so a reconnect is usable after a single
+    state check; scene item events keep the IDs and the known states current.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        password: str,
+        items: list[tuple[str, str]],
+        cache_file: str,
+        on_status: Callable[[ObsStatus, str], Awaitable[None]],
+        base_delay: float = 0.1,
+        max_delay: float = 1.0,
+    ):
+        self.websocket = simpleobsws.WebSocketClient(url=url, password=password)
+        self.commands = ObsCommands(self.websocket)
+        self.items: list[tuple[str, str]] = items
+        self.cache_file: str = cache_file
+        self.on_status = on_status
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.item_ids: dict[tuple[str, str], int] = self._read_cache()
+        self.ready: bool = False
+
+        self.outages: deque[float] = deque(maxlen=50)
+        self.counters: dict[str, int] = dict.fromkeys(
+            ("connects", "disconnects", "failed_attempts", "id_lookups"), 0
+        )
+        self.last_connect_ms: float = 0.0
+
+        self.websocket.register_event_callback(self._on_item_created, "SceneItemCreated")
+        self.websocket.register_event_callback(self._on_item_removed, "SceneItemRemoved")
+        self.websocket.register_event_callback(
+            self._on_item_enable_changed, "SceneItemEnableStateChanged"
+        )
+
+    def item_id(self, scene: str, source: str) -> int | None:
+        return self.item_ids.get((scene, source)) if self.ready else None
+
+    async def run(self) -> None:
+        """Connect and stay connected until cancelled."""
+        attempt = 0
+        down_since: float | None = None
+        await self.on_status(ObsStatus.CONNECTING, "Connecting to OBS WebSocket...")
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    await self._connect()
+                except Exception as e:
+                    self.counters["failed_attempts"] += 1
+                    _LOGGER.debug("OBS connection attempt failed: %s", e)
+                    await self.websocket.disconnect()
+                    if attempt == 0:
+                        _LOGGER.warning("OBS connection failed: %s", e)
+                        down_since = down_since or start
+                        message = str(e).split("]", 1)[-1].strip()
+                        await self.on_status(ObsStatus.RECONNECTING, message)
+                    delay = min(self.max_delay, self.base_delay * 2**attempt)
+                    attempt += 1
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                    continue
+
+                self.last_connect_ms = (time.perf_counter() - start) * 1000
+                if down_since:
+                    self.outages.append(time.perf_counter() - down_since)
+                    _LOGGER.info("OBS reconnected after %.2fs outage", self.outages[-1])
+                self.counters["connects"] += 1
+                attempt = 0
+                down_since = None
+                self.ready = True
+                await self.on_status(ObsStatus.CONNECTED, "Connected to OBS!")
+
+                # The receive task ends as soon as the socket closes.
+                await asyncio.wait({self.websocket.recv_task})
+                self.ready = False
+                down_since = time.perf_counter()
+                self.counters["disconnects"] += 1
+                _LOGGER.warning("OBS WebSocket disconnected, reconnecting...")
+                await self.on_status(ObsStatus.RECONNECTING, "OBS disconnected! Reconnecting...")
+        finally:
+            self.ready = False
+            await self.websocket.disconnect()
+
+    async def _connect(self) -> None:
+        await self.websocket.connect()
+        if not await self.websocket.wait_until_identified(timeout=5):
+            raise ObsError("Identification with OBS timed out")
+        self.commands.reset()
+
+        cached = [(item, self.item_ids[item]) for item in self.items if item in self.item_ids]
+        exists = await self.commands.refresh_states([(scene, i) for (scene, _), i in cached])
+        missing = [item for item in self.items if item not in self.item_ids]
+        missing += [item for (item, _), ok in zip(cached, exists) if not ok]
+        if missing:
+            self.counters["id_lookups"] += 1
+            item_ids = await self.commands.lookup_item_ids(missing)
+            self.item_ids.update(zip(missing, item_ids))
+            await self.commands.refresh_states(
+                [(scene, item_id) for (scene, _), item_id in zip(missing, item_ids)]
+            )
+            self._write_cache()
+
+    def _read_cache(self) -> dict[tuple[str, str], int]:
+        try:
+            with open(self.cache_file, encoding="utf-8") as f:
+                entries = json.load(f)
+            return {(entry["scene"], entry["source"]): entry["id"] for entry in entries}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def _write_cache(self) -> None:
+        entries = [
+            {"scene": scene, "source": source, "id": item_id}
+            for (scene, source), item_id in self.item_ids.items()
+        ]
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+            with open(self.cache_file, "w", encoding="utf-8") as f:
+                json.dump(entries, f, indent=2)
+        except OSError as e:
+            _LOGGER.warning("Could not save OBS item cache: %s", e)
+
+    async def _on_item_created(self, data: dict) -> None:
+        item = (data["sceneName"], data["sourceName"])
+        if item in self.items:
+            self.item_ids[item] = data["sceneItemId"]
+            self._write_cache()
+
+    async def _on_item_removed(self, data: dict) -> None:
+        item = (data["sceneName"], data["sourceName"])
+        if self.item_ids.get(item) == data["sceneItemId"]:
+            _LOGGER.warning("OBS scene item removed: %s / %s", *item)
+            del self.item_ids[item]
+            self._write_cache()
+
+    async def _on_item_enable_changed(self, data: dict) -> None:
+        self.commands.note_enabled(data["sceneName"], data["sceneItemId"], data["sceneItemEnabled"])
+
+    def stats(self) -> dict:
+        """Connection counters, last connect time and outage durations."""
+        outages = sorted(self.outages)
+        return {
+            "connected": self.ready,
+            "last_connect_ms": self.last_connect_ms,
+            "outage_last_s": self.outages[-1] if outages else 0.0,
+            "outage_max_s": outages[-1] if outages else 0.0,
+            "outage_total_s": sum(outages),
+            **self.counters,
+        }
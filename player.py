@@ -0,0 +1,241 @@
+import asyncio
+import ctypes
+import itertools
+import threading
+import time
+import weakref
+from typing import Callable, Iterable
+
+import vlc
+
+from audio import AudioBuffer
+from metrics import metrics
+
+UNKNOWN_SIZE = 2**64 - 1
+
+# VLC calls the media callbacks from its own threads with integer handles.
+_sources: dict[int, AudioBuffer] = {}
+_readers: dict[int, list] = {}  # reader handle -> [buffer, position]
+_handles = itertools.count(1)
+_lock = threading.Lock()
+
+
+@vlc.CallbackDecorators.MediaOpenCb
+def _media_open(opaque, datap, sizep):
+    with _lock:
+        buffer = _sources.get(opaque)
+        if buffer is None:
+            return -1
+        handle = next(_handles)
+        _readers[handle] = [buffer, 0]
+    datap.contents.value = handle
+    sizep.contents.value = buffer.size if buffer.finished else UNKNOWN_SIZE
+    return 0
+
+
+@vlc.CallbackDecorators.MediaReadCb
+def _media_read(opaque, buf, length):
+    reader = _readers.get(opaque)
+    if reader is None:
+        return -1
+    data = reader[0].read(reader[1], length)
+    if not data and reader[0].failed:
+        return -1
+    ctypes.memmove(buf, data, len(data))
+    reader[1] += len(data)
+    return len(data)
+
+
+@vlc.CallbackDecorators.MediaSeekCb
+def _media_seek(opaque, offset):
+    reader = _readers.get(opaque)
+    if reader is None:
+        return -1
+    reader[1] = offset
+    return 0
+
+
+@vlc.CallbackDecorators.MediaCloseCb
+def _media_close(opaque):
+    with _lock:
+        _readers.pop(opaque, None)
+
+
+def buffer_media(instance: vlc.Instance, buffer: AudioBuffer) -> vlc.Media:
+    """Create a VLC media that reads straight from an AudioBuffer, even while it is growing."""
+    with _lock:
+        handle = next(_handles)
+        _sources[handle] = buffer
+    media = instance.media_new_callbacks(
+        _media_open, _media_read, _media_seek, _media_close, ctypes.c_void_p(handle)
+    )
+    weakref.finalize(media, _sources.pop, handle, None)
+    return media
+
+
+class VlcPlayer:
+    """Plays files, in-memory audio and prepared media through VLC on one output device.
+
+    The device is bound once. Players sharing a vlc.Instance can play each
+    other's prepared media."""
+
+    def __init__(self, device: str | None = None, instance: vlc.Instance | None = None):
+        self.instance: vlc.Instance = instance or vlc.Instance()
+        self.player: vlc.MediaPlayer = self.instance.media_player_new()
+        self.device: str | None = device
+        if device is not None:
+            self.player.audio_output_device_set(None, device)
+        self._clock_ms: int = -1
+        self._clock_at: float = 0.0
+        self._play_requested: float = 0.0
+        self.player.event_manager().event_attach(
+            vlc.EventType.MediaPlayerPlaying,
+            lambda _: metrics.since("play.start", self._play_requested),
+        )
+
+    def prepare(self, buffer: AudioBuffer) -> vlc.Media:
+        """A parsed, ready-to-play media for audio that will be played repeatedly."""
+        media = buffer_media(self.instance, buffer)
+        media.parse_with_options(vlc.MediaParseFlag.local, 0)
+        return media
+
+    def play(self, source: str | AudioBuffer, media: vlc.Media | None = None) -> None:
+        """Play a file or an AudioBuffer (optionally with its prepared media)."""
+        self.player.pause()
+        if isinstance(source, str):
+            media = vlc.Media(source)
+        elif media is None:
+            media = buffer_media(self.instance, source)
+        self.player.set_media(media)
+        self._play_requested = metrics.clock()
+        self.player.play()
+
+    def stop(self) -> None:
+        self.player.stop()
+
+    def is_playing(self) -> bool:
+        return self.player.is_playing()
+
+    def position(self) -> float:
+        """Seconds into the current media, interpolated between VLC's coarse time updates."""
+        now = time.monotonic()
+        position_ms = self.player.get_time()
+        if position_ms != self._clock_ms:
+            self._clock_ms, self._clock_at = position_ms, now
+        if position_ms < 0:
+            return 0.0
+        return position_ms / 1000 + (now - self._clock_at if self.player.is_playing() else 0.0)
+
+    async def wait_finished(self) -> None:
+        """Wait until the current media has ended or was stopped."""
+        while self.player.get_state() not in (vlc.State.Ended, vlc.State.Stopped, vlc.State.Error):
+            await asyncio.sleep(0.05)
+
+
+class NullPlayer:
+    """Audio sink that plays nothing but keeps real-time playback state.
+
+    For headless runs and benchmarks without libvlc or an audio device. Each
+    play() is logged with its start time in plays, which players can share."""
+
+    def __init__(self, device: str | None = None, plays: list | None = None):
+        self.device: str | None = device
+        self.plays: list[tuple[float, str | None, str]] = [] if plays is None else plays
+        self._audio: AudioBuffer | None = None
+        self._started: float = 0.0
+        self._stopped: bool = True
+
+    def prepare(self, buffer: AudioBuffer) -> None:
+        return None
+
+    def play(self, source: str | AudioBuffer, media: None = None) -> None:
+        self._started = time.monotonic()
+        self._stopped = False
+        if isinstance(source, str):
+            try:
+                with open(source, "rb") as f:
+                    self._audio = AudioBuffer.from_wav(f.read())
+            except (OSError, ValueError):
+                self._audio = AudioBuffer.from_wav(b"")
+            kind = "file"
+        else:
+            self._audio = source
+            kind = "buffer"
+        self.plays.append((self._started, self.device, kind))
+
+    def stop(self) -> None:
+        self._stopped = True
+
+    def is_playing(self) -> bool:
+        if self._stopped or self._audio is None:
+            return False
+        if self._audio.finished and self.position() >= self._audio.duration:
+            self._stopped = True
+        return not self._stopped
+
+    def position(self) -> float:
+        if self._audio is None:
+            return 0.0
+        return min(time.monotonic() - self._started, self._audio.duration)
+
+    async def wait_finished(self) -> None:
+        while self.is_playing():
+            await asyncio.sleep(0.01)
+
+
+class PlayerPool:
+    """One player per output channel, created up front and bound to its device.
+
+    Channels play independently, so a line on one doesn't cut off another, and
+    nothing switches devices on the play path. One utterance can be mirrored to
+    several channels. Media prepared by prepare() plays on the first channel;
+    mirrors read the same audio through media of their own."""
+
+    def __init__(self, factory: Callable[[str], VlcPlayer | NullPlayer], channels: Iterable[str]):
+        self.players: dict[str, VlcPlayer | NullPlayer] = {
+            channel: factory(channel) for channel in dict.fromkeys(channels)
+        }
+        self.counters: dict[str, int] = dict.fromkeys(("plays", "mirrored", "overlapped"), 0)
+
+    def prepare(self, buffer: AudioBuffer):
+        return next(iter(self.players.values())).prepare(buffer)
+
+    def play(
+        self, source: str | AudioBuffer, channels: str | Iterable[str], media=None
+    ) -> None:
+        """Play on one channel, or the same audio on several at once."""
+        channels = list(dict.fromkeys([channels] if isinstance(channels, str) else channels))
+        first = next(iter(self.players))
+        for channel in channels:
+            if any(self.is_playing(other) for other in self.players if other != channel):
+                self.counters["overlapped"] += 1
+            # Prepared media belongs to the first player and isn't shared.
+            self.players[channel].play(source, media if channel == first else None)
+        self.counters["plays"] += 1
+        self.counters["mirrored"] += len(channels) > 1
+
+    def stop(self, channel: str | None = None) -> None:
+        """Stop one channel, or all of them."""
+        for name, player in self.players.items():
+            if channel is None or name == channel:
+                player.stop()
+
+    def is_playing(self, channel: str | None = None) -> bool:
+        """Whether a channel, or any channel, is playing."""
+        if channel is None:
+            return any(player.is_playing() for player in self.players.values())
+        return self.players[channel].is_playing()
+
+    def position(self, channel: str) -> float:
+        return self.players[channel].position()
+
+    async def wait_finished(self, channel: str | None = None) -> None:
+        """Wait until a channel, or every channel, has finished playing."""
+        players = self.players.values() if channel is None else [self.players[channel]]
+        await asyncio.gather(*(player.wait_finished() for player in players))
+
+    def busy(self) -> dict[str, bool]:
+        return {channel: player.is_playing() for channel, player in self.players.items()}
+
+    def stats(self) -> dict:
+        return {"channels": len(self.players), **self.counters}
@@ -0,0 +1,161 @@
+import hashlib
+from typing import Callable
+
+import numpy as np
+
+from audio import SAMPLE_RATE, SAMPLE_WIDTH, STREAM_SIZE, AudioBuffer, split_wav, wav_header
+from const import PostProcess
+
+FRAME = 0.01  # seconds per loudness frame
+_EMPTY = np.zeros(0, dtype=np.float32)
+VERSION = 1  # bump when the processing changes, not just its settings
+# Identifies how stored audio was processed; part of cache keys and macro SSML hashes,
+# so audio processed differently (or not at all) isn't reused.
+PROCESSING = hashlib.sha256(
+    repr((VERSION, sorted((m.name, m.value) for m in PostProcess))).encode("utf-8")
+).hexdigest()[:12]
+
+
+def db_to_level(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+class PostProcessor:
+    """Trims leading and trailing silence off 16-bit mono PCM and normalizes its loudness.
+
+    Audio can be fed in chunks as it arrives. Silence after the last sound is held
+    back until more sound follows, and dropped but for a pad when the audio ends.
+    Loudness is the RMS of the frames above the gate, so audio fed in one piece is
+    normalized exactly, while streamed audio gets a gain that settles as more of
+    it arrives, ramped across each chunk so it doesn't click.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = SAMPLE_RATE,
+        silence_db: float = PostProcess.SILENCE_DB,
+        lead_pad: float = PostProcess.LEAD_PAD_MS / 1000,
+        tail_pad: float = PostProcess.TAIL_PAD_MS / 1000,
+        target_db: float = PostProcess.TARGET_DB,
+        gate_db: float = PostProcess.GATE_DB,
+        peak_db: float = PostProcess.PEAK_DB,
+        max_gain_db: float = PostProcess.MAX_GAIN_DB,
+    ):
+        self.frame_size: int = max(1, int(sample_rate * FRAME))
+        self.silence: float = db_to_level(silence_db) * 32768
+        self.lead_pad: int = int(sample_rate * lead_pad)
+        self.tail_pad: int = int(sample_rate * tail_pad)
+        self.target: float = db_to_level(target_db)
+        self.gate: float = db_to_level(gate_db) ** 2
+        self.peak: float = db_to_level(peak_db) * 32767
+        self.max_gain: float = db_to_level(max_gain_db)
+        self.started: bool = False
+        self.trimmed: int = 0  # samples of silence dropped so far
+        self._held: np.ndarray = _EMPTY
+        self._rest: bytes = b""
+        self._sum_squares: float = 0.0
+        self._loud_frames: int = 0
+        self._max_sample: float = 0.0
+        self._gain: float | None = None
+
+    def feed(self, pcm: bytes | memoryview) -> bytes:
+        """Process more audio and return what is ready to play."""
+        data = self._rest + bytes(pcm)
+        usable = len(data) - len(data) % SAMPLE_WIDTH
+        self._rest = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32)
+        segment = np.concatenate((self._held, samples)) if len(self._held) else samples
+        loud = np.flatnonzero(np.abs(segment) > self.silence)
+        if not len(loud):
+            if not self.started:
+                keep = min(len(segment), self.lead_pad)
+                self.trimmed += len(segment) - keep
+                segment = segment[len(segment) - keep :]
+            self._held = segment
+            return b""
+        begin = 0
+        if not self.started:
+            self.started = True
+            begin = max(0, int(loud[0]) - self.lead_pad)
+            self.trimmed += begin
+        end = int(loud[-1]) + 1
+        self._held = segment[end:]
+        return self._emit(segment[begin:end])
+
+    def finish(self) -> bytes:
+        """End of the audio: the rest of it, up to the tail pad of silence."""
+        tail = self._held[: self.tail_pad] if self.started else _EMPTY
+        self.trimmed += len(self._held) - len(tail)
+        self._held = _EMPTY
+        return self._emit(tail) if len(tail) else b""
+
+    def _emit(self, samples: np.ndarray) -> bytes:
+        self._measure(samples)
+        gain = self._target_gain()
+        if self._gain is None or self._gain == gain:
+            samples = samples * gain
+        else:
+            samples = samples * np.linspace(self._gain, gain, len(samples), dtype=np.float32)
+        self._gain = gain
+        return np.clip(samples, -32768, 32767).astype("<i2").tobytes()
+
+    def _measure(self, samples: np.ndarray) -> None:
+        frames = len(samples) // self.frame_size
+        if frames:
+            blocks = samples[: frames * self.frame_size].reshape(frames, self.frame_size) / 32768
+            squares = np.mean(np.square(blocks), axis=1)
+            loud = squares[squares > self.gate]
+            self._sum_squares += float(loud.sum())
+            self._loud_frames += len(loud)
+        if len(samples):
+            self._max_sample = max(self._max_sample, float(np.abs(samples).max()))
+
+    def _target_gain(self) -> float:
+        if not self._loud_frames:
+            return self._gain or 1.0
+        rms = (self._sum_squares / self._loud_frames) ** 0.5
+        return min(self.target / rms, self.max_gain, self.peak / max(self._max_sample, 1.0))
+
+
+def process_wav(data: bytes | memoryview) -> bytes:
+    """Trim and normalize complete WAV (or raw PCM) data."""
+    pcm, sample_rate = split_wav(data)
+    processor = PostProcessor(sample_rate)
+    out = processor.feed(pcm) + processor.finish()
+    return wav_header(len(out), sample_rate) + out
+
+
+class ProcessedStream:
+    """Feeds a synthesizer's stream through a PostProcessor into an AudioBuffer.
+
+    Stands in for the buffer given to Synthesizer.stream(). on_first_audio is only
+    called once processed audio reaches the buffer, so trimmed silence at the start
+    doesn't count as audio."""
+
+    def __init__(self, buffer: AudioBuffer, on_first_audio: Callable[[], None]):
+        self.buffer: AudioBuffer = buffer
+        self.on_first_audio = on_first_audio
+        self._processor: PostProcessor | None = None
+        self._first: bool = True
+
+    def append(self, chunk: bytes | memoryview) -> None:
+        if self._processor is None:
+            sample_rate = self.buffer.sample_rate
+            if bytes(chunk[:4]) == b"RIFF":
+                chunk, sample_rate = split_wav(chunk)
+            self._processor = PostProcessor(sample_rate)
+            # Sets the buffer's sample rate; the header itself is dropped.
+            self.buffer.append(wav_header(STREAM_SIZE, sample_rate))
+        self._forward(self._processor.feed(chunk))
+
+    def finish(self, failed: bool = False) -> None:
+        if self._processor and not failed:
+            self._forward(self._processor.finish())
+        self.buffer.finish(failed)
+
+    def _forward(self, pcm: bytes) -> None:
+        if pcm:
+            self.buffer.append(pcm)
+            if self._first:
+                self._first = False
+                self.on_first_audio()
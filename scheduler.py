@@ -0,0 +1,170 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from const import Policy
+from metrics import metrics
+
+_LOGGER = logging.getLogger("TTS.scheduler")
+
+
+@dataclass(order=True)
+class Utterance:
+    priority: int
+    seq: int
+    key: str = field(compare=False)
+    job: Callable[[], Awaitable[None]] = field(compare=False)
+    policy: Policy = field(compare=False)
+    on_drop: Callable[[], None] | None = field(compare=False, default=None)
+    created: float = field(compare=False, default_factory=time.monotonic)
+
+    def drop(self) -> None:
+        if self.on_drop:
+            self.on_drop()
+
+
+class SpeechScheduler:
+    """Priority queue of utterances played one at a time.
+
+    Lower priority values play first. Per-utterance policies decide whether an
+    utterance cuts off the one playing (PREEMPT), waits its turn (ENQUEUE), is
+    skipped when it waited too long (DROP_IF_STALE) or is dropped when the same
+    key is already waiting (COALESCE). The queue is capped at max_depth: a full
+    queue sheds its least important entry for a more important one, otherwise
+    submit() refuses the utterance.
+    """
+
+    def __init__(self, max_depth: int, stale_after: float):
+        self.max_depth: int = max_depth
+        self.stale_after: float = stale_after
+        self._queue: list[Utterance] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dequeued = asyncio.Event()  # set whenever the queue gets shorter
+        self.current: Utterance | None = None
+        self.current_task: asyncio.Task | None = None
+
+        self.waits: deque[float] = deque(maxlen=200)
+        self.counters: dict[str, int] = dict.fromkeys(
+            ("submitted", "played", "preempted", "coalesced", "stale", "rejected", "shed"), 0
+        )
+        self.max_depth_seen: int = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    async def wait_below(self, depth: int) -> None:
+        """Wait until fewer than depth utterances are queued."""
+        while len(self._queue) >= depth:
+            self._dequeued.clear()
+            await self._dequeued.wait()
+
+    def submit(
+        self,
+        key: str,
+        job: Callable[[], Awaitable[None]],
+        priority: int,
+        policy: Policy,
+        on_drop: Callable[[], None] | None = None,
+    ) -> bool:
+        """Queue an utterance. Returns False if it was coalesced or refused."""
+        utterance = Utterance(priority, next(self._seq), key, job, policy, on_drop)
+        self.counters["submitted"] += 1
+
+        if Policy.COALESCE in policy and any(u.key == key for u in self._queue):
+            _LOGGER.info("Coalescing duplicate utterance: %s", key)
+            self.counters["coalesced"] += 1
+            utterance.drop()
+            return False
+
+        if len(self._queue) >= self.max_depth:
+            least = max(self._queue)
+            if least.priority <= priority:
+                _LOGGER.warning("Speech queue full, refusing: %s", key)
+                self.counters["rejected"] += 1
+                utterance.drop()
+                return False
+            self._queue.remove(least)
+            heapq.heapify(self._queue)
+            least.drop()
+            self.counters["shed"] += 1
+            _LOGGER.warning("Speech queue full, shedding: %s", least.key)
+
+        heapq.heappush(self._queue, utterance)
+        self.max_depth_seen = max(self.max_depth_seen, len(self._queue))
+
+        if (
+            Policy.PREEMPT in policy
+            and self.current_task
+            and self.current
+            and self.current.priority >= priority
+        ):
+            _LOGGER.info("Preempting %s with %s", self.current.key, key)
+            self.counters["preempted"] += 1
+            self.current_task.cancel()
+
+        self._wakeup.set()
+        return True
+
+    def clear(self) -> None:
+        """Drop everything queued and cut off the current utterance."""
+        while self._queue:
+            heapq.heappop(self._queue).drop()
+        self._dequeued.set()
+        if self.current_task:
+            self.current_task.cancel()
+
+    async def run(self) -> None:
+        """Play queued utterances until cancelled."""
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            utterance = heapq.heappop(self._queue)
+            self._dequeued.set()
+            waited = time.monotonic() - utterance.created
+            if Policy.DROP_IF_STALE in utterance.policy and waited > self.stale_after:
+                _LOGGER.info("Dropping stale utterance after %.1fs: %s", waited, utterance.key)
+                self.counters["stale"] += 1
+                utterance.drop()
+                continue
+
+            self.waits.append(waited)
+            metrics.record("queue.wait", waited)
+            self.current = utterance
+            self.current_task = asyncio.create_task(utterance.job())
+            try:
+                await asyncio.wait({self.current_task})
+            except asyncio.CancelledError:
+                self.current_task.cancel()
+                raise
+            else:
+                if self.current_task.cancelled():
+                    continue
+                if error := self.current_task.exception():
+                    _LOGGER.error("Utterance failed: %s", utterance.key, exc_info=error)
+                else:
+                    self.counters["played"] += 1
+            finally:
+                self.current = None
+                self.current_task = None
+
+    def stats(self) -> dict:
+        """Queue depth, wait times and policy counters."""
+        waits = sorted(self.waits)
+        return {
+            "depth": len(self._queue),
+            "max_depth_seen": self.max_depth_seen,
+            "wait_mean_ms": sum(waits) / len(waits) * 1000 if waits else 0.0,
+            "wait_p95_ms": waits[int(len(waits) * 0.95)] * 1000 if waits else 0.0,
+            "wait_max_ms": waits[-1] * 1000 if waits else 0.0,
+            **self.counters,
+        }
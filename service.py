@@ -0,0 +1,380 @@
+"""The TTS engine as a long-running local service, without any UI.
+
+    python service.py [--host 127.0.0.1] [--port 4461]
+
+Requests are JSON over HTTP on localhost, so the GUI, a stream deck and chat
+bots can all drive the same engine at once:
+
+    POST /speak     {"text": "...", "channel": "main" | "alt" | "both"}
+    POST /macro     {"name": "skull"}
+    POST /countdown {"from": 10, "interval": 1, "intro": "pull in", "final": "go",
+                     "channel": "main" | "alt"}   all but "from" optional
+    POST /repeat
+    POST /stop      {"channel": "main" | "alt"}   optional, default all
+    POST /custom    {"text": "..."}   render and set the custom macro
+    POST /speculate {"text": "..."}   the text being typed, for speculative synthesis
+    POST /settings  {"voice", "emotion", "streaming", "pipeline", "speculative", "batching",
+                     "save_audio", "metrics", "trace"}   any subset
+    POST /obs       {"connect": true | false}
+    POST /macros/rebuild
+    POST /cache/clear
+    GET  /state     current settings, OBS status and what is playing where
+    GET  /events    Server-Sent Events: status messages, OBS status, state changes
+    GET  /metrics   latency histograms and component stats
+
+With CHAT_HOST and CHAT_ROOM set, chat messages are read out too (see chat.py).
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import logging
+import signal
+from functools import partial
+from urllib.parse import urlsplit
+
+from chat import ChatReader
+from const import ChatServer, Const, EngineApi, Emotion, LocalTts, ObsStatus, Voice, OBS
+from engine import SpeechEngine
+from local_http import EventStream, read_request, respond_json
+from metrics import metrics, startup
+from synthesis import AzureSynthesizer, EspeakSynthesizer
+
+_LOGGER = logging.getLogger("TTS.service")
+
+CHANNELS = {"main": Const.MAIN_CHANNEL, "alt": Const.ALT_CHANNEL}
+MIRROR = "both"
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+JSON = "application/json"
+
+
+class RequestError(Exception):
+    """A request was malformed; reported to the client as 400."""
+
+
+class EngineServer:
+    """Local HTTP API in front of a SpeechEngine.
+
+    Requests only queue work with the engine's speech scheduler and return right
+    away. There is no authentication, so anything a web page could send is refused:
+    requests with an Origin header or a Host that isn't local (DNS rebinding), and
+    POSTs that aren't application/json (which a page can send without a CORS
+    preflight). Status messages, OBS status and settings changes are broadcast to every
+    client listening on /events.
+    """
+
+    def __init__(self, engine: SpeechEngine, host: str, port: int):
+        self.engine: SpeechEngine = engine
+        self.host: str = host
+        self.port: int = port
+        self._server: asyncio.Server | None = None
+        self._events = EventStream(replay_last=True)  # e.g. startup progress for late clients
+        self.requests: int = 0
+        self.startup_task: asyncio.Task | None = None
+        self.chat: ChatReader | None = None
+        engine.on_message = self._on_message
+        engine.status_callback = self._on_obs_status
+        self._routes = {
+            ("POST", "/speak"): self._speak,
+            ("POST", "/macro"): self._macro,
+            ("POST", "/countdown"): self._countdown,
+            ("POST", "/repeat"): lambda _: {"queued": self.engine.repeat()},
+            ("POST", "/stop"): self._stop,
+            ("POST", "/custom"): self._custom,
+            ("POST", "/speculate"): self._speculate,
+            ("POST", "/settings"): self._settings,
+            ("POST", "/obs"): self._obs,
+            ("POST", "/macros/rebuild"): self._rebuild,
+            ("POST", "/cache/clear"): self._clear_cache,
+            ("GET", "/state"): lambda _: self.state(),
+            ("GET", "/metrics"): lambda _: metrics.snapshot(),
+        }
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        _LOGGER.info("Engine API listening on %s", self.url)
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            self._events.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def state(self) -> dict:
+        engine = self.engine
+        return {
+            "voice": engine.tts_voice,
+            "emotion": engine.tts_emotion,
+            "streaming": engine.streaming_mode,
+            "pipeline": engine.pipeline_mode,
+            "speculative": engine.speculator.enabled,
+            "batching": engine.batcher.enabled,
+            "save_audio": engine.save_audio_files,
+            "metrics": metrics.enabled,
+            "trace": engine.trace_file,
+            "custom_macro": engine.custom_macro_text,
+            "obs": engine.obs_status if engine.obs_task else ObsStatus.DISCONNECTED,
+            "queue": engine.speech_scheduler.depth,
+            "playing": {name: engine.player.is_playing(ch) for name, ch in CHANNELS.items()},
+            "ready": engine.ready,
+        }
+
+    def _on_message(self, text: str, show_for: float) -> None:
+        self._events.publish({"event": "message", "text": text, "show_for": show_for})
+
+    def _on_obs_status(self, status: ObsStatus, message: str) -> None:
+        self._events.publish({"event": "obs", "status": status, "message": message})
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            method, path, headers, body = await read_request(reader)
+            if "origin" in headers or not self._local(headers.get("host", "")):
+                _LOGGER.warning(
+                    "Refused %s %s (Origin: %s, Host: %s)",
+                    method,
+                    path,
+                    headers.get("origin", "-"),
+                    headers.get("host", "-"),
+                )
+                await respond_json(writer, {"error": "Only local clients are allowed"}, 403)
+                return
+            content_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+            if method == "POST" and content_type != JSON:
+                await respond_json(writer, {"error": f"Content-Type must be {JSON}"}, 415)
+                return
+            if method == "GET" and path == "/events":
+                await self._events.serve(writer)
+                return
+            handler = self._routes.get((method, path))
+            if handler is None:
+                known = any(route_path == path for _, route_path in self._routes)
+                await respond_json(writer, {"error": "Unknown request"}, 405 if known else 404)
+                return
+            self.requests += 1
+            try:
+                data = json.loads(body) if body else {}
+                if not isinstance(data, dict):
+                    raise RequestError("Expected a JSON object")
+                result = handler(data)
+                if asyncio.iscoroutine(result):
+                    result = await result
+            except (RequestError, ValueError) as e:
+                await respond_json(writer, {"error": str(e)}, 400)
+                return
+            except Exception as e:
+                _LOGGER.exception("Engine API request %s %s failed", method, path)
+                await respond_json(writer, {"error": f"Internal error: {e}"}, 500)
+                return
+            await respond_json(writer, result)
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError) as e:
+            _LOGGER.debug("Engine API request failed: %s", e)
+        finally:
+            writer.close()
+
+    def _local(self, host: str) -> bool:
+        """Whether a Host header names this machine; a missing one is allowed."""
+        return not host or urlsplit(f"//{host}").hostname in (*LOCAL_HOSTS, self.host)
+
+    @staticmethod
+    def _text(data: dict, field: str = "text") -> str:
+        text = data.get(field)
+        if not isinstance(text, str) or not text.strip():
+            raise RequestError(f"'{field}' must be a non-empty string")
+        return text.strip()
+
+    @staticmethod
+    def _channel(data: dict, default: str | None, mirror: bool = False):
+        channel = data.get("channel", default)
+        if channel is None:
+            return None
+        if mirror and channel == MIRROR:
+            return tuple(CHANNELS.values())
+        if channel not in CHANNELS:
+            names = [*CHANNELS, MIRROR] if mirror else list(CHANNELS)
+            raise RequestError(f"'channel' must be one of {', '.join(names)}")
+        return CHANNELS[channel]
+
+    def _speak(self, data: dict) -> dict:
+        channel = self._channel(data, "main", mirror=True)
+        return {"queued": self.engine.speak(self._text(data), channel)}
+
+    def _macro(self, data: dict) -> dict:
+        return {"queued": self.engine.play_macro(self._text(data, "name"))}
+
+    def _countdown(self, data: dict) -> dict:
+        start, interval = data.get("from"), data.get("interval", 1)
+        if not isinstance(start, int) or not isinstance(interval, (int, float)):
+            raise RequestError("'from' must be an integer and 'interval' a number")
+        intro, final = data.get("intro", ""), data.get("final", "")
+        if not isinstance(intro, str) or not isinstance(final, str):
+            raise RequestError("'intro' and 'final' must be strings")
+        channel = self._channel(data, "main")
+        return {"queued": self.engine.countdown(start, interval, intro, final, channel)}
+
+    def _stop(self, data: dict) -> dict:
+        self.engine.stop(self._channel(data, None))
+        return {"stopped": True}
+
+    def _speculate(self, data: dict) -> dict:
+        text = data.get("text", "")
+        if not isinstance(text, str):
+            raise RequestError("'text' must be a string")
+        self.engine.speculate(text)
+        return {}
+
+    def _custom(self, data: dict) -> dict:
+        return {"queued": self.engine.set_custom_macro(self._text(data))}
+
+    async def _settings(self, data: dict) -> dict:
+        engine = self.engine
+        if "voice" in data and data["voice"] not in set(Voice):
+            raise RequestError(f"Unknown voice: {data['voice']}")
+        if "emotion" in data and data["emotion"] not in set(Emotion):
+            raise RequestError(f"Unknown emotion: {data['emotion']}")
+        toggles = {
+            "streaming": engine.set_streaming_mode,
+            "pipeline": engine.set_pipeline_mode,
+            "speculative": engine.set_speculative_mode,
+            "batching": engine.set_batching_mode,
+            "save_audio": engine.set_save_audio_files,
+            "metrics": engine.set_metrics,
+            "trace": engine.set_trace_file,
+        }
+        for name in toggles.keys() & data.keys():
+            if not isinstance(data[name], bool):
+                raise RequestError(f"'{name}' must be true or false")
+        for name, setter in toggles.items():
+            if name in data:
+                setter(data[name])
+        if "voice" in data:
+            await engine.set_voice(data["voice"])
+        if "emotion" in data:
+            await engine.set_emotion(data["emotion"])
+        state = self.state()
+        self._events.publish({"event": "state", **state})
+        return state
+
+    async def _obs(self, data: dict) -> dict:
+        connect = data.get("connect", True)
+        if not isinstance(connect, bool):
+            raise RequestError("'connect' must be true or false")
+        if connect:
+            if not self.engine.obs_task:
+                self.engine.connect_obs()
+        else:
+            await self.engine.disconnect_obs()
+        return self.state()
+
+    async def _rebuild(self, _: dict) -> dict:
+        return dataclasses.asdict(await self.engine.rebuild_macro_pack())
+
+    async def _clear_cache(self, _: dict) -> dict:
+        return {"removed": await self.engine.clear_voice_cache()}
+
+
+def open_player():
+    """VLC players for every channel, bound to their output devices up front. Loading
+    libvlc and its plugins is slow, so call this off the loop."""
+    import vlc
+
+    from player import PlayerPool, VlcPlayer
+
+    instance = vlc.Instance()
+    return PlayerPool(lambda device: VlcPlayer(device, instance), CHANNELS.values())
+
+
+def start_chat(engine: SpeechEngine) -> ChatReader | None:
+    """Start reading chat out loud, if a chat room is configured."""
+    if not ChatServer.HOST or not ChatServer.ROOM:
+        return None
+    channel = CHANNELS.get(ChatServer.CHANNEL)
+    if channel is None:
+        _LOGGER.warning("Unknown CHAT_CHANNEL %s, reading chat on alt", ChatServer.CHANNEL)
+        channel = Const.ALT_CHANNEL
+    chat = ChatReader(
+        engine,
+        {
+            "host": ChatServer.HOST,
+            "port": int(ChatServer.PORT),
+            "room": ChatServer.ROOM,
+            "nick": ChatServer.NICK,
+            "token": ChatServer.TOKEN,
+        },
+        channel,
+    )
+    chat.start()
+    metrics.register("chat", chat.stats)
+    return chat
+
+
+async def start_service(host: str = EngineApi.HOST, port: int = int(EngineApi.PORT)):
+    """Build the engine with VLC playback and Azure synthesis, hedged with espeak-ng,
+    and serve it.
+
+    Returns once the API is listening. The engine keeps starting up in the
+    background (see SpeechEngine.start) and reports its progress on /events."""
+    with startup.phase("vlc"):
+        player = await asyncio.to_thread(open_player)
+    engine = SpeechEngine(
+        player=player,
+        synthesizer_factory=partial(AzureSynthesizer, Const.API_KEY, Const.API_REGION),
+        obs_url=f"ws://{OBS.HOST}:{OBS.PORT}",
+        obs_password=OBS.PWD,
+        fallback_factory=partial(EspeakSynthesizer, LocalTts.COMMAND),
+    )
+    server = EngineServer(engine, host, port)
+    await server.start()
+    startup.mark("api listening")
+    server.startup_task = asyncio.create_task(engine.start())
+    server.chat = start_chat(engine)
+    return engine, server
+
+
+async def stop_service(engine: SpeechEngine, server: EngineServer) -> None:
+    if server.startup_task and not server.startup_task.done():
+        server.startup_task.cancel()
+        await asyncio.gather(server.startup_task, return_exceptions=True)
+    if server.chat:
+        await server.chat.stop()
+    await server.stop()
+    await engine.shutdown()
+
+
+async def run(host: str, port: int) -> None:
+    engine, server = await start_service(host, port)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C still ends asyncio.run()
+    try:
+        await stopping.wait()
+    finally:
+        _LOGGER.info("Shutting down...")
+        await stop_service(engine, server)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the TTS engine without the GUI.")
+    parser.add_argument("--host", default=EngineApi.HOST)
+    parser.add_argument("--port", type=int, default=int(EngineApi.PORT))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    startup.mark("imports")
+    try:
+        asyncio.run(run(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
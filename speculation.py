@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+_LOGGER = logging.getLogger("TTS.speculation")
+
+
+@dataclass
+class _Job:
+    text: str
+    task: asyncio.Task | None = None
+    ssml: str = ""
+    key: str = ""
+    synthesizing: bool = False
+
+
+class Speculator:
+    """Synthesizes text while it is still being typed.
+
+    update() gets the text after every edit. Once it has been left alone for the
+    debounce time, prepare() turns it into the SSML and cache key the speak path
+    will use (or None if there is nothing to do) and synthesize() renders it in
+    the background; an edit cancels the job. When text is submitted, pin() keeps
+    its job from being cancelled by the next edits, starting it right away if it
+    was still waiting out the debounce, and claim() hands the job's result to
+    the speak path when the cache key matches.
+    """
+
+    def __init__(
+        self,
+        prepare: Callable[[str], tuple[str, str] | None],
+        synthesize: Callable[[str, str], Awaitable[bytes | None]],
+        debounce: float,
+        min_chars: int,
+        max_pinned: int = 4,
+    ):
+        self.prepare = prepare
+        self.synthesize = synthesize
+        self.debounce: float = debounce
+        self.min_chars: int = min_chars
+        self.max_pinned: int = max_pinned
+        self.enabled: bool = False
+        self._job: _Job | None = None
+        self._pinned: OrderedDict[str, asyncio.Task] = OrderedDict()
+        self.counters: dict[str, int] = dict.fromkeys(
+            (
+                "updates",
+                "debounced",
+                "calls",
+                "cancelled",
+                "speaks",
+                "hits_finished",
+                "hits_in_flight",
+            ),
+            0,
+        )
+
+    def enable(self, enable: bool) -> None:
+        self.enabled = enable
+        if not enable:
+            self._cancel()
+
+    def update(self, text: str) -> None:
+        """The text being typed changed."""
+        if not self.enabled:
+            return
+        self.counters["updates"] += 1
+        text = text.strip()
+        if self._job and self._job.text == text:
+            return
+        self._cancel()
+        if len(text) >= self.min_chars:
+            self._job = self._start(_Job(text), self.debounce)
+
+    def pin(self, text: str) -> None:
+        """Text was submitted to be spoken: keep its job for claim()."""
+        if not self.enabled:
+            return
+        self.counters["speaks"] += 1
+        job = self._job
+        if not job or job.text != text.strip():
+            return
+        self._job = None
+        if not job.synthesizing:
+            # Still waiting out the debounce; no reason to wait any longer.
+            job.task.cancel()
+            if not self._prepare(job):
+                return
+            job = self._start(job, 0)
+        self._pinned[job.key] = job.task
+        while len(self._pinned) > self.max_pinned:
+            self._pinned.popitem(last=False)
+
+    def claim(self, key: str) -> asyncio.Task | None:
+        """The speculative synthesis for a cache key, if there is one."""
+        task = self._pinned.pop(key, None)
+        if task is None and self._job and self._job.key == key and self._job.synthesizing:
+            task, self._job = self._job.task, None
+        if task is None or task.cancelled():
+            return None
+        self.counters["hits_finished" if task.done() else "hits_in_flight"] += 1
+        _LOGGER.info("Using speculative synthesis (%s)", "done" if task.done() else "in flight")
+        return task
+
+    def _start(self, job: _Job, delay: float) -> _Job:
+        job.task = asyncio.create_task(self._run(job, delay))
+        return job
+
+    def _prepare(self, job: _Job) -> bool:
+        if not job.key:
+            prepared = self.prepare(job.text)
+            if prepared is None:
+                return False
+            job.ssml, job.key = prepared
+        return True
+
+    async def _run(self, job: _Job, delay: float) -> bytes | None:
+        await asyncio.sleep(delay)
+        if not self._prepare(job):
+            return None
+        job.synthesizing = True
+        self.counters["calls"] += 1
+        return await self.synthesize(job.ssml, job.key)
+
+    def _cancel(self) -> None:
+        job, self._job = self._job, None
+        if job and not job.task.done():
+            self.counters["cancelled" if job.synthesizing else "debounced"] += 1
+            job.task.cancel()
+
+    def stats(self) -> dict:
+        """Hit rate per submitted text and synthesis calls that were never used."""
+        hits = self.counters["hits_finished"] + self.counters["hits_in_flight"]
+        speaks = self.counters["speaks"]
+        return {
+            "enabled": self.enabled,
+            "hit_rate": hits / speaks if speaks else 0.0,
+            "wasted_calls": max(0, self.counters["calls"] - hits),
+            **self.counters,
+        }
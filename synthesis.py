@@ -0,0 +1,720 @@
+import asyncio
+import html
+import logging
+import math
+import random
+import re
+import shutil
+import sys
+import time
+from array import array
+from collections import deque
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Protocol
+
+from audio import (
+    CHUNK_SIZE,
+    SAMPLE_RATE,
+    SAMPLE_WIDTH,
+    AudioBuffer,
+    resample,
+    split_wav,
+    wav_header,
+)
+from metrics import metrics
+
+_LOGGER = logging.getLogger("TTS.synthesis")
+
+BOOKMARK = re.compile(r'<bookmark mark="([^"]*)"\s*/>')
+PROSODY = re.compile(r"(.*<prosody[^>]*>)(.*)(</prosody>.*)", re.DOTALL)
+
+
+class SynthesisError(Exception):
+    """A synthesis request was canceled or failed."""
+
+
+class Synthesizer(Protocol):
+    """A speech synthesis backend.
+
+    synthesize() returns complete WAV bytes. synthesize_marked() also returns the
+    (mark, seconds) audio offsets of the SSML's bookmarks; pooled backends need it
+    for batching. stream() appends audio to a buffer (an AudioBuffer, or anything
+    with its append() and finish()) as it arrives, calls on_first_audio (possibly
+    from another thread) once audio starts, and finishes the buffer; all of them
+    raise SynthesisError on failure."""
+
+    async def synthesize(self, ssml: str) -> bytes: ...
+
+    async def synthesize_marked(self, ssml: str) -> tuple[bytes, list[tuple[str, float]]]: ...
+
+    async def stream(
+        self, ssml: str, buffer: AudioBuffer, on_first_audio: Callable[[], None]
+    ) -> None: ...
+
+
+def build_ssml(text: str, voice: str, emotion: str, rate: str, pitch: str) -> str:
+    """Wrap already-escaped text in SSML for a voice and emotion."""
+    return (
+        '<speak xmlns="http://www.w3.org/2001/10/synthesis" xmlns:mstts="http://www.w3.org/2001/mstts" '
+        + 'xmlns:emo="http://www.w3.org/2009/10/emotionml" version="1.0" xml:lang="en-US">'
+        + f'<voice name="{voice}"><mstts:express-as style="{emotion.lower()}" styledegree="1">'
+        + f'<prosody rate="{rate}%" pitch="{pitch}%">{text}</prosody>'
+        + "</mstts:express-as></voice></speak>"
+    )
+
+
+class AzureSynthesizer:
+    """Azure TTS backend on a single pre-opened connection.
+
+    connected follows the connection's events, so a pool can tell when Azure
+    dropped it, and reopen() warms it up again."""
+
+    def __init__(self, api_key: str, region: str):
+        from azure.cognitiveservices.speech import (
+            SpeechConfig,
+            SpeechSynthesizer,
+            Connection,
+            SpeechSynthesisOutputFormat,
+        )
+
+        speech_config = SpeechConfig(subscription=api_key, region=region)
+        speech_config.set_speech_synthesis_output_format(
+            SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm
+        )
+        self.speech_synthesizer = SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        self._marks: list[tuple[str, float]] = []
+        # audio_offset is in 100 ns ticks; one request at a time, so one list will do.
+        self.speech_synthesizer.bookmark_reached.connect(
+            lambda evt: self._marks.append((evt.text, evt.audio_offset / 10_000_000))
+        )
+        self.connection = Connection.from_speech_synthesizer(self.speech_synthesizer)
+        self.connected: bool = False
+        self.connection.connected.connect(lambda _: setattr(self, "connected", True))
+        self.connection.disconnected.connect(lambda _: setattr(self, "connected", False))
+        self.connection.open(True)
+        self.connected = True
+
+    def reopen(self) -> None:
+        """Close and re-open the connection. Blocking."""
+        self.connection.close()
+        self.connection.open(True)
+        self.connected = True
+
+    async def synthesize(self, ssml: str) -> bytes:
+        from azure.cognitiveservices.speech import ResultReason
+
+        result = await asyncio.to_thread(self.speech_synthesizer.speak_ssml_async(ssml).get)
+        if result.reason == ResultReason.Canceled:
+            details = result.cancellation_details
+            raise SynthesisError(f"{details.reason}: {details.error_details or ''}".strip(": "))
+        # RIFF output format, so the audio data is a complete WAV file.
+        return result.audio_data
+
+    async def synthesize_marked(self, ssml: str) -> tuple[bytes, list[tuple[str, float]]]:
+        self._marks = marks = []
+        return await self.synthesize(ssml), marks
+
+    async def stream(
+        self, ssml: str, buffer: AudioBuffer, on_first_audio: Callable[[], None]
+    ) -> None:
+        await asyncio.to_thread(self._stream, ssml, buffer, on_first_audio)
+
+    def _stream(self, ssml: str, buffer: AudioBuffer, on_first_audio: Callable[[], None]) -> None:
+        from azure.cognitiveservices.speech import AudioDataStream, ResultReason, StreamStatus
+
+        failed = True
+        try:
+            result = self.speech_synthesizer.start_speaking_ssml_async(ssml).get()
+            if result.reason == ResultReason.Canceled:
+                details = result.cancellation_details
+                raise SynthesisError(f"{details.reason}: {details.error_details or ''}".strip(": "))
+            stream = AudioDataStream(result)
+            chunk = bytes(CHUNK_SIZE)
+            started = False
+            while filled := stream.read_data(chunk):
+                buffer.append(chunk[:filled])
+                if not started:
+                    started = True
+                    on_first_audio()
+            if stream.status == StreamStatus.Canceled:
+                raise SynthesisError("Speech synthesis stream canceled")
+            failed = False
+        finally:
+            buffer.finish(failed)
+
+
+class FakeSynthesizer:
+    """Offline stand-in for Azure: waits a configurable latency, then returns a tone
+    whose length follows the text length."""
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        seconds_per_char: float = 0.06,
+        failure_rate: float = 0.0,
+        seed: int | None = None,
+        slow_rate: float = 0.0,
+        slow_latency: float = 2.0,
+    ):
+        self.latency: float = latency
+        self.seconds_per_char: float = seconds_per_char
+        self.failure_rate: float = failure_rate
+        self.slow_rate: float = slow_rate
+        self.slow_latency: float = slow_latency
+        self.requests: int = 0
+        self._random = random.Random(seed)
+
+    def _latency(self) -> float:
+        """The latency, or for a slow_rate share of requests slow_latency."""
+        if self.slow_rate and self._random.random() < self.slow_rate:
+            return self.slow_latency
+        return self.latency
+
+    async def synthesize(self, ssml: str) -> bytes:
+        self.requests += 1
+        await asyncio.sleep(self._latency())
+        if self._random.random() < self.failure_rate:
+            raise SynthesisError("Fake synthesis failure")
+        pcm = self._tone(ssml)
+        return wav_header(len(pcm)) + pcm
+
+    async def synthesize_marked(self, ssml: str) -> tuple[bytes, list[tuple[str, float]]]:
+        """A tone per stretch of text between bookmarks, in one request."""
+        self.requests += 1
+        await asyncio.sleep(self._latency())
+        if self._random.random() < self.failure_rate:
+            raise SynthesisError("Fake synthesis failure")
+        parts = BOOKMARK.split(ssml)
+        pcm = self._tone(parts[0])
+        marks = []
+        for mark, text in zip(parts[1::2], parts[2::2]):
+            marks.append((mark, len(pcm) / SAMPLE_WIDTH / SAMPLE_RATE))
+            pcm += self._tone(text)
+        return wav_header(len(pcm)) + pcm, marks
+
+    async def stream(
+        self, ssml: str, buffer: AudioBuffer, on_first_audio: Callable[[], None]
+    ) -> None:
+        """First chunk after the latency, the rest at twice real time."""
+        failed = True
+        try:
+            self.requests += 1
+            await asyncio.sleep(self._latency())
+            if self._random.random() < self.failure_rate:
+                raise SynthesisError("Fake synthesis failure")
+            pcm = self._tone(ssml)
+            for offset in range(0, len(pcm), CHUNK_SIZE):
+                buffer.append(pcm[offset : offset + CHUNK_SIZE])
+                if not offset:
+                    on_first_audio()
+                await asyncio.sleep(CHUNK_SIZE / (2 * SAMPLE_WIDTH * SAMPLE_RATE))
+            failed = False
+        finally:
+            buffer.finish(failed)
+
+    def _tone(self, ssml: str) -> bytes:
+        text = re.sub(r"<[^>]+>", "", ssml)
+        samples = int(SAMPLE_RATE * max(0.2, len(text) * self.seconds_per_char))
+        # 220 Hz tone with a syllable-rate amplitude wobble, so it has an envelope.
+        tone = array(
+            "h",
+            (
+                int(
+                    8000
+                    * math.sin(2 * math.pi * 220 * i / SAMPLE_RATE)
+                    * (0.5 + 0.5 * math.sin(2 * math.pi * 4 * i / SAMPLE_RATE))
+                )
+                for i in range(samples)
+            ),
+        )
+        if sys.byteorder == "big":
+            tone.byteswap()
+        return tone.tobytes()
+
+
+class EspeakSynthesizer:
+    """Local CPU backend running espeak-ng: robotic, but fast and offline.
+
+    Only the text and the voice's language are taken from the SSML. The audio is
+    resampled to the Azure output format, so it mixes with Azure audio."""
+
+    def __init__(self, command: str = "espeak-ng"):
+        path = shutil.which(command)
+        if path is None:
+            raise SynthesisError(f"{command} not found")
+        self.command: str = path
+
+    @staticmethod
+    def voice(ssml: str) -> str:
+        """espeak-ng voice for the SSML's Azure voice, e.g. en-us or ru."""
+        match = re.search(r'<voice name="([a-z]+)-([A-Za-z]+)', ssml)
+        if not match:
+            return "en"
+        language, region = match.group(1), match.group(2).lower()
+        return f"{language}-{region}" if language == "en" and region in ("us", "gb") else language
+
+    async def synthesize(self, ssml: str) -> bytes:
+        text = html.unescape(re.sub(r"<[^>]+>", " ", ssml)).strip()
+        process = await asyncio.create_subprocess_exec(
+            self.command,
+            "--stdout",
+            "-v",
+            self.voice(ssml),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            wav, _ = await process.communicate(text.encode("utf-8"))
+        except asyncio.CancelledError:
+            with suppress(ProcessLookupError):
+                process.kill()
+            raise
+        if process.returncode:
+            raise SynthesisError(f"espeak-ng failed with exit code {process.returncode}")
+        pcm, sample_rate = split_wav(wav)
+        pcm = resample(pcm, sample_rate)
+        return wav_header(len(pcm)) + pcm
+
+    async def stream(
+        self, ssml: str, buffer: AudioBuffer, on_first_audio: Callable[[], None]
+    ) -> None:
+        """Synthesis is much faster than real time, so this just hands over the result."""
+        failed = True
+        try:
+            buffer.append(await self.synthesize(ssml))
+            on_first_audio()
+            failed = False
+        finally:
+            buffer.finish(failed)
+
+
+class HedgedSynthesis:
+    """Hedges slow synthesis requests with a local fallback backend.
+
+    race() gives the primary (Azure) request until the deadline to produce audio.
+    If it is late or fails, the same SSML also goes to the fallback, and whichever
+    has audio first is used. A losing fallback is cancelled. The primary request is
+    never cancelled, not even when the race is: a pooled connection can't be
+    interrupted mid-request, so it keeps its slot until it finishes, and its audio
+    can still be cached for the next time.
+    """
+
+    def __init__(self, fallback_factory: Callable[[], Synthesizer] | None, deadline: float):
+        self.fallback_factory = fallback_factory
+        self.fallback: Synthesizer | None = None
+        self.deadline: float = deadline
+        self.counters: dict[str, int] = dict.fromkeys(
+            ("requests", "hedged", "primary_wins", "fallback_wins", "failures"), 0
+        )
+
+    async def start(self) -> None:
+        """Create the fallback backend. Without one, requests just wait for the primary."""
+        if self.fallback_factory is None:
+            return
+        try:
+            self.fallback = await asyncio.to_thread(self.fallback_factory)
+            _LOGGER.info("Local fallback synthesizer ready")
+        except Exception as e:
+            _LOGGER.warning("No local fallback synthesizer, not hedging: %s", e)
+
+    async def race(self, primary: asyncio.Future, ssml: str) -> tuple[Any, bool]:
+        """Wait for primary, a task or future whose result is the audio (falsy on
+        failure), hedging it after the deadline. Returns the winning result and
+        whether it came from the fallback. Raises SynthesisError if both failed."""
+        self.counters["requests"] += 1
+        start = time.perf_counter()
+        # The primary may finish after losing; nothing else will look at its outcome.
+        primary.add_done_callback(lambda f: f.cancelled() or f.exception())
+        fallback: asyncio.Task | None = None
+        try:
+            await asyncio.wait({primary}, timeout=self.deadline if self.fallback else None)
+            if not primary.done() or not self._succeeded(primary):
+                if self.fallback is None:
+                    return await asyncio.shield(primary), False
+                self.counters["hedged"] += 1
+                _LOGGER.info("Synthesis is slow or failed, hedging with the local backend")
+                fallback = asyncio.create_task(self.fallback.synthesize(ssml))
+            pending = {primary, fallback} - {None}
+            while pending:
+                if primary.done() and self._succeeded(primary):
+                    self.counters["primary_wins"] += 1
+                    metrics.since("synth.hedge", start, winner="primary")
+                    return primary.result(), False
+                if fallback and fallback.done() and self._succeeded(fallback):
+                    self.counters["fallback_wins"] += 1
+                    metrics.since("synth.hedge", start, winner="fallback")
+                    return fallback.result(), True
+                pending = {task for task in pending if not task.done()}
+                if pending:
+                    await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            self.counters["failures"] += 1
+            if fallback and fallback.exception():
+                raise SynthesisError(f"Fallback synthesis failed: {fallback.exception()}")
+            raise SynthesisError("Speech synthesis failed")
+        finally:
+            if fallback and not fallback.done():
+                fallback.cancel()
+
+    @staticmethod
+    def _succeeded(future: asyncio.Future) -> bool:
+        return not future.cancelled() and not future.exception() and bool(future.result())
+
+    def stats(self) -> dict:
+        """Hedge rate and how often each side won."""
+        requests = self.counters["requests"]
+        hedged = self.counters["hedged"]
+        return {
+            "fallback": type(self.fallback).__name__ if self.fallback else None,
+            "hedge_rate": hedged / requests if requests else 0.0,
+            "fallback_win_rate": self.counters["fallback_wins"] / hedged if hedged else 0.0,
+            **self.counters,
+        }
+
+
+@dataclass
+class _Slot:
+    backend: Synthesizer
+    voice: str | None = None
+    busy: bool = False
+    healthy: bool = True
+    busy_since: float = 0.0
+    busy_total: float = 0.0
+    last_used: float = 0.0
+    created: float = 0.0
+
+
+class SynthesizerPool:
+    """A fixed number of warm synthesizers, each serving one request at a time.
+
+    acquire() hands out a free instance, preferring one that last served the same
+    voice, and waits when all are busy. Instances that failed or lost their
+    connection are reopened before reuse, and idle ones are reopened in the
+    background so their connection is still warm when needed. Backends without a
+    reopen() method are replaced with a new one from the factory instead, and
+    instances that could not be created (e.g. Azure was unreachable at startup) are
+    retried in the background too.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Synthesizer],
+        size: int,
+        idle_reopen: float = 120.0,
+        check_interval: float = 30.0,
+    ):
+        self.factory = factory
+        self.size: int = size
+        self.idle_reopen: float = idle_reopen
+        self.check_interval: float = check_interval
+        self._slots: list[_Slot] = []
+        self._free = asyncio.Condition()
+        self._keep_alive_task: asyncio.Task | None = None
+        self.ready: bool = False
+
+        self.waits: deque[float] = deque(maxlen=200)
+        self.counters: dict[str, int] = dict.fromkeys(
+            ("acquired", "waited", "affinity_hits", "reopened", "failures"), 0
+        )
+
+    async def start(self) -> None:
+        """Create the instances concurrently and start the keep-alive loop."""
+        await self._fill()
+        self.ready = True
+        async with self._free:
+            self._free.notify_all()
+        self._keep_alive_task = asyncio.create_task(self._keep_alive())
+        _LOGGER.info("Synthesizer pool ready: %d/%d instances", len(self._slots), self.size)
+
+    async def _fill(self) -> int:
+        """Create the missing instances concurrently; returns how many were added."""
+        backends = await asyncio.gather(
+            *(asyncio.to_thread(self.factory) for _ in range(self.size - len(self._slots))),
+            return_exceptions=True,
+        )
+        now = time.monotonic()
+        added = 0
+        for backend in backends:
+            if isinstance(backend, Exception):
+                _LOGGER.error("Could not create synthesizer: %s", backend)
+            else:
+                self._slots.append(_Slot(backend, last_used=now, created=now))
+                added += 1
+        if added:
+            async with self._free:
+                self._free.notify(added)
+        return added
+
+    async def stop(self) -> None:
+        if self._keep_alive_task:
+            self._keep_alive_task.cancel()
+            self._keep_alive_task = None
+
+    @asynccontextmanager
+    async def acquire(self, voice: str | None = None) -> AsyncIterator[Synthesizer]:
+        """Borrow a synthesizer for one request. Errors mark it for a reopen."""
+        start = time.monotonic()
+        async with self._free:
+            if self.ready and not self._slots:
+                raise SynthesisError("No synthesizers available")
+            if not self._has_free():
+                self.counters["waited"] += 1
+                # Requests made before start() finished give up too if it created none.
+                await self._free.wait_for(
+                    lambda: self._has_free() or (self.ready and not self._slots)
+                )
+                if not self._slots:
+                    raise SynthesisError("No synthesizers available")
+            slot = self._pick(voice)
+            slot.busy = True
+        slot.busy_since = time.monotonic()
+        self.waits.append(slot.busy_since - start)
+        metrics.record("pool.wait", self.waits[-1])
+        self.counters["acquired"] += 1
+        try:
+            if not slot.healthy or not getattr(slot.backend, "connected", True):
+                await self._reopen(slot)
+            yield slot.backend
+        except Exception:
+            self.counters["failures"] += 1
+            slot.healthy = False
+            raise
+        finally:
+            slot.voice = voice or slot.voice
+            await self._release(slot)
+
+    async def synthesize(self, ssml: str, voice: str | None = None) -> bytes:
+        async with self.acquire(voice) as backend:
+            return await backend.synthesize(ssml)
+
+    async def synthesize_marked(
+        self, ssml: str, voice: str | None = None
+    ) -> tuple[bytes, list[tuple[str, float]]]:
+        async with self.acquire(voice) as backend:
+            return await backend.synthesize_marked(ssml)
+
+    def _has_free(self) -> bool:
+        return any(not slot.busy for slot in self._slots)
+
+    def _pick(self, voice: str | None) -> _Slot:
+        free = [slot for slot in self._slots if not slot.busy]
+        for slot in free:
+            if voice and slot.voice == voice and slot.healthy:
+                self.counters["affinity_hits"] += 1
+                return slot
+        # Otherwise the longest idle healthy one, leaving recently used voices warm.
+        return min(free, key=lambda slot: (not slot.healthy, slot.last_used))
+
+    async def _release(self, slot: _Slot) -> None:
+        now = time.monotonic()
+        slot.busy_total += now - slot.busy_since
+        slot.last_used = now
+        slot.busy = False
+        async with self._free:
+            self._free.notify()
+
+    async def _reopen(self, slot: _Slot) -> None:
+        """Reopen a backend's connection, or replace the backend. Blocking work runs in a thread."""
+        self.counters["reopened"] += 1
+        try:
+            if hasattr(slot.backend, "reopen"):
+                await asyncio.to_thread(slot.backend.reopen)
+            else:
+                slot.backend = await asyncio.to_thread(self.factory)
+                slot.voice = None
+        except Exception as e:
+            slot.healthy = False
+            raise SynthesisError(f"Could not reopen synthesizer: {e}") from e
+        slot.healthy = True
+
+    async def _keep_alive(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            if len(self._slots) < self.size and await self._fill():
+                _LOGGER.info("Synthesizer pool: %d/%d instances", len(self._slots), self.size)
+            now = time.monotonic()
+            for slot in self._slots:
+                stale = now - slot.last_used > self.idle_reopen
+                if slot.busy or (slot.healthy and not stale):
+                    continue
+                slot.busy = True
+                slot.busy_since = time.monotonic()
+                try:
+                    await self._reopen(slot)
+                except SynthesisError as e:
+                    _LOGGER.warning("%s", e)
+                finally:
+                    # Keep-alive time doesn't count as use.
+                    slot.busy_since = time.monotonic()
+                    await self._release(slot)
+
+    def stats(self) -> dict:
+        """Pool size, wait times and utilization since start."""
+        now = time.monotonic()
+        busy = sum(
+            slot.busy_total + (now - slot.busy_since if slot.busy else 0.0) for slot in self._slots
+        )
+        elapsed = sum(now - slot.created for slot in self._slots)
+        waits = sorted(self.waits)
+        return {
+            "size": len(self._slots),
+            "busy": sum(slot.busy for slot in self._slots),
+            "unhealthy": sum(not slot.healthy for slot in self._slots),
+            "utilization": busy / elapsed if elapsed else 0.0,
+            "wait_mean_ms": sum(waits) / len(waits) * 1000 if waits else 0.0,
+            "wait_p95_ms": waits[int(len(waits) * 0.95)] * 1000 if waits else 0.0,
+            "wait_max_ms": waits[-1] * 1000 if waits else 0.0,
+            **self.counters,
+        }
+
+
+def batch_ssml(documents: list[str], pause: float) -> str | None:
+    """Merge SSML documents that differ only in their text (build_ssml output for the
+    same voice and emotion) into one, with a pause and a bookmark between the texts.
+    None if they can't be merged."""
+    parts = [PROSODY.fullmatch(document) for document in documents]
+    if not all(parts) or len({(part[1], part[3]) for part in parts}) != 1:
+        return None
+    separator = f'<break time="{int(pause * 1000)}ms"/><bookmark mark="{{}}"/>'
+    text = parts[0][2] + "".join(separator.format(i) + part[2] for i, part in enumerate(parts[1:]))
+    return parts[0][1] + text + parts[0][3]
+
+
+def split_marked(audio: bytes, marks: list[tuple[str, float]], count: int) -> list[bytes] | None:
+    """Cut the audio of a batch_ssml() document into a WAV per text at its bookmarks,
+    or None if the bookmarks don't add up."""
+    offsets = {mark: seconds for mark, seconds in marks}
+    if any(str(i) not in offsets for i in range(count - 1)):
+        return None
+    pcm, sample_rate = split_wav(audio)
+    frames = len(pcm) // SAMPLE_WIDTH
+    cuts = [0, *(min(round(offsets[str(i)] * sample_rate), frames) for i in range(count - 1))]
+    cuts.append(frames)
+    if cuts != sorted(cuts):
+        return None
+    pieces = []
+    for start, end in zip(cuts, cuts[1:]):
+        piece = pcm[start * SAMPLE_WIDTH : end * SAMPLE_WIDTH]
+        pieces.append(wav_header(len(piece), sample_rate) + piece)
+    return pieces
+
+
+@dataclass
+class _BatchItem:
+    ssml: str
+    future: asyncio.Future
+    queued: float
+
+
+class SynthesisBatcher:
+    """Synthesizes short utterances in batches, one request for several of them.
+
+    synthesize() queues SSML from build_ssml(); documents for the same voice and
+    emotion that arrive within the wait window, up to max_batch of them, are
+    merged with batch_ssml() and the audio is cut at the bookmarks, each caller
+    getting its own WAV back. Longer text, lone utterances and batches whose
+    bookmarks don't come back are synthesized one request each."""
+
+    def __init__(
+        self,
+        pool: SynthesizerPool,
+        max_batch: int,
+        window: float,
+        max_chars: int,
+        pause: float,
+    ):
+        self.pool: SynthesizerPool = pool
+        self.max_batch: int = max_batch
+        self.window: float = window
+        self.max_chars: int = max_chars
+        self.pause: float = pause
+        self.enabled: bool = False
+        self._pending: dict[str, list[_BatchItem]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self.waits: deque[float] = deque(maxlen=200)
+        self.counters: dict[str, int] = dict.fromkeys(
+            ("batches", "batched", "single", "unbatched", "split_failures"), 0
+        )
+
+    async def synthesize(self, ssml: str, voice: str | None = None) -> bytes:
+        match = PROSODY.fullmatch(ssml)
+        if (
+            not self.enabled
+            or self.max_batch <= 1
+            or not match
+            or len(match[2]) > self.max_chars
+        ):
+            self.counters["unbatched"] += 1
+            return await self.pool.synthesize(ssml, voice)
+        key = match[1] + match[3]
+        item = _BatchItem(ssml, asyncio.get_running_loop().create_future(), time.monotonic())
+        batch = self._pending.setdefault(key, [])
+        batch.append(item)
+        if len(batch) >= self.max_batch:
+            if timer := self._timers.pop(key, None):
+                timer.cancel()
+            self._flush(key, voice)
+        elif len(batch) == 1:
+            self._timers[key] = asyncio.get_running_loop().call_later(
+                self.window, self._flush, key, voice
+            )
+        return await item.future
+
+    def _flush(self, key: str, voice: str | None) -> None:
+        self._timers.pop(key, None)
+        items = [item for item in self._pending.pop(key, []) if not item.future.done()]
+        now = time.monotonic()
+        for item in items:
+            self.waits.append(now - item.queued)
+            metrics.record("batch.wait", now - item.queued)
+        if items:
+            asyncio.create_task(self._run(items, voice))
+
+    async def _run(self, items: list[_BatchItem], voice: str | None) -> None:
+        pieces = None
+        if len(items) > 1:
+            try:
+                audio, marks = await self.pool.synthesize_marked(
+                    batch_ssml([item.ssml for item in items], self.pause), voice
+                )
+            except Exception as e:
+                for item in items:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                return
+            pieces = split_marked(audio, marks, len(items))
+            if pieces is None:
+                self.counters["split_failures"] += 1
+                _LOGGER.warning("Batch of %d came back without its bookmarks", len(items))
+            else:
+                self.counters["batches"] += 1
+                self.counters["batched"] += len(items)
+        if pieces is None:
+            self.counters["single"] += len(items)
+            await asyncio.gather(*(self._run_single(item, voice) for item in items))
+            return
+        for item, piece in zip(items, pieces):
+            if not item.future.done():
+                item.future.set_result(piece)
+
+    async def _run_single(self, item: _BatchItem, voice: str | None) -> None:
+        try:
+            audio = await self.pool.synthesize(item.ssml, voice)
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+        else:
+            if not item.future.done():
+                item.future.set_result(audio)
+
+    def stats(self) -> dict:
+        """Requests saved by batching and the time utterances waited for a batch."""
+        waits = sorted(self.waits)
+        return {
+            "enabled": self.enabled,
+            "requests_saved": self.counters["batched"] - self.counters["batches"],
+            "wait_mean_ms": sum(waits) / len(waits) * 1000 if waits else 0.0,
+            "wait_p95_ms": waits[int(len(waits) * 0.95)] * 1000 if waits else 0.0,
+            **self.counters,
+        }
@@ -0,0 +1,134 @@
+"""SynthesizerPool against the offline FakeSynthesizer."""
+
+import asyncio
+
+import pytest
+
+from synthesis import FakeSynthesizer, SynthesisError, SynthesizerPool
+
+SSML = "<speak>Hello there</speak>"
+
+
+class TrackingSynthesizer(FakeSynthesizer):
+    """Counts how many requests are in flight across every instance."""
+
+    active = 0
+    peak = 0
+
+    async def synthesize(self, ssml: str) -> bytes:
+        cls = type(self)
+        cls.active += 1
+        cls.peak = max(cls.peak, cls.active)
+        try:
+            return await super().synthesize(ssml)
+        finally:
+            cls.active -= 1
+
+
+class Factory:
+    """Makes fake synthesizers, failing the first `failures` calls."""
+
+    def __init__(self, failures: int = 0, latency: float = 0.01):
+        self.failures: int = failures
+        self.latency: float = latency
+        self.calls: int = 0
+        self.made: list[FakeSynthesizer] = []
+
+    def __call__(self) -> FakeSynthesizer:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("Azure unreachable")
+        self.made.append(TrackingSynthesizer(self.latency, seconds_per_char=0.001))
+        return self.made[-1]
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+def test_concurrent_requests_are_bounded_by_size():
+    async def main():
+        TrackingSynthesizer.active = TrackingSynthesizer.peak = 0
+        pool = SynthesizerPool(Factory(latency=0.02), 3)
+        await pool.start()
+        audio = await asyncio.gather(*(pool.synthesize(SSML) for _ in range(12)))
+        await pool.stop()
+        return audio, pool.stats()
+
+    audio, stats = run(main())
+    assert len(audio) == 12 and all(audio)
+    assert TrackingSynthesizer.peak == 3
+    assert stats["acquired"] == 12
+    assert stats["waited"] > 0
+    assert stats["busy"] == 0
+
+
+def test_acquire_prefers_the_instance_that_served_the_voice():
+    async def main():
+        pool = SynthesizerPool(Factory(), 2)
+        await pool.start()
+        async with pool.acquire("en-US-JaneNeural") as jane:
+            pass
+        async with pool.acquire("en-GB-SoniaNeural") as sonia:
+            pass
+        async with pool.acquire("en-US-JaneNeural") as again:
+            pass
+        await pool.stop()
+        return jane, sonia, again, pool.stats()
+
+    jane, sonia, again, stats = run(main())
+    assert sonia is not jane  # the longest idle instance, leaving Jane's warm
+    assert again is jane
+    assert stats["affinity_hits"] == 1
+
+
+def test_keep_alive_reopens_idle_instances():
+    async def main():
+        factory = Factory()
+        pool = SynthesizerPool(factory, 2, idle_reopen=0.01, check_interval=0.02)
+        await pool.start()
+        first = list(factory.made)
+        await asyncio.sleep(0.15)
+        await pool.stop()
+        return factory, first, pool.stats()
+
+    factory, first, stats = run(main())
+    # FakeSynthesizer has no reopen(), so idle instances are replaced from the factory.
+    assert stats["reopened"] >= 2
+    assert factory.calls > 2
+    assert stats["size"] == 2
+    assert stats["unhealthy"] == 0
+    assert not set(map(id, first)) & set(map(id, factory.made[-2:]))
+
+
+def test_keep_alive_creates_instances_that_failed_at_start():
+    async def main():
+        factory = Factory(failures=3)
+        pool = SynthesizerPool(factory, 2, check_interval=0.02)
+        await pool.start()
+        at_start = pool.stats()["size"]
+        await asyncio.sleep(0.1)
+        audio = await pool.synthesize(SSML)
+        await pool.stop()
+        return at_start, pool.stats()["size"], audio
+
+    at_start, size, audio = run(main())
+    assert at_start == 0
+    assert size == 2
+    assert audio
+
+
+def test_requests_fail_once_ready_without_instances():
+    async def main():
+        pool = SynthesizerPool(Factory(failures=10), 2, check_interval=60)
+        # Queued before start(), like speech requested while Azure is connecting.
+        early = asyncio.create_task(pool.synthesize(SSML))
+        await asyncio.sleep(0)
+        await pool.start()
+        with pytest.raises(SynthesisError):
+            await early
+        with pytest.raises(SynthesisError):
+            await pool.synthesize(SSML)
+        await pool.stop()
+
+    run(main())
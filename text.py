@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import re
+import textwrap
+import time
+from xml.sax.saxutils import escape as xml_escape
+
+_LOGGER = logging.getLogger("TTS.text")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+_CLAUSE_END = re.compile(r"(?<=[,:])\s+")
+
+
+def split_sentences(text: str, min_chars: int, max_chars: int) -> list[str]:
+    """Split text into sentences for pipelined synthesis.
+
+    Sentences longer than max_chars are broken at clauses, then at whitespace.
+    Pieces shorter than min_chars are merged into the next one so short
+    interjections don't become their own request."""
+    pieces = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in _CLAUSE_END.split(sentence):
+            pieces.extend(textwrap.wrap(clause, max_chars) if len(clause) > max_chars else [clause])
+
+    merged = []
+    for piece in pieces:
+        if not piece:
+            continue
+        if merged and len(merged[-1]) < min_chars:
+            merged[-1] += " " + piece
+        else:
+            merged.append(piece)
+    return merged
+
+
+def _trie_pattern(node: dict) -> str:
+    """Serialize a character trie into a regex that matches any of its words.
+
+    Shared prefixes are factored out, so matching costs about the length of the
+    longest word at each position no matter how many words there are. Optional
+    tails are greedy, which makes the longest word win."""
+    alternatives = []
+    chars = []
+    for char, child in sorted((k, v) for k, v in node.items() if k):
+        if set(child) == {""}:
+            chars.append(re.escape(char))
+        else:
+            alternatives.append(re.escape(char) + _trie_pattern(child))
+    if chars:
+        alternatives.append(chars[0] if len(chars) == 1 else f"[{''.join(chars)}]")
+
+    pattern = alternatives[0] if len(alternatives) == 1 else f"(?:{'|'.join(alternatives)})"
+    if "" in node:
+        # A word ends here, so the rest is optional.
+        pattern = f"{pattern}?" if len(alternatives) == 1 and chars else f"(?:{pattern})?"
+    return pattern
+
+
+class Rules:
+    """Case-insensitive literal replacements applied in one pass by a single compiled regex."""
+
+    def __init__(self, rules: dict[str, str], whole_words: bool = False):
+        self.replacements: dict[str, str] = {k.lower(): v for k, v in rules.items() if k}
+        self.pattern: re.Pattern | None = None
+        if not self.replacements:
+            return
+        trie: dict = {}
+        for word in self.replacements:
+            node = trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        pattern = _trie_pattern(trie)
+        if whole_words:
+            pattern = rf"(?<!\w){pattern}(?!\w)"
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+
+    def _replacement(self, match: re.Match) -> str:
+        return self.replacements.get(match.group().lower(), match.group())
+
+    def apply(self, text: str, escape: bool = False) -> str:
+        """Replace every rule match.
+
+        With escape, the text between matches is XML-escaped for SSML while the
+        replacements are inserted as written, so rules may contain SSML tags."""
+        if not self.pattern:
+            return xml_escape(text) if escape else text
+        if not escape:
+            return self.pattern.sub(self._replacement, text)
+        parts = []
+        pos = 0
+        for match in self.pattern.finditer(text):
+            parts.append(xml_escape(text[pos : match.start()]))
+            parts.append(self._replacement(match))
+            pos = match.end()
+        parts.append(xml_escape(text[pos:]))
+        return "".join(parts)
+
+
+class TextNormalizer:
+    """Typing fixes and pronunciation rules, hot reloaded from a JSON rules file.
+
+    The file holds {"fixes": {...}, "pronunciations": {...}} and extends the
+    built-in defaults. Fixes match anywhere, pronunciations only whole words."""
+
+    CHECK_INTERVAL = 1.0  # seconds between rules file checks
+
+    def __init__(self, path: str, fixes: dict[str, str], pronunciations: dict[str, str]):
+        self.path: str = path
+        self.default_fixes: dict[str, str] = fixes
+        self.default_pronunciations: dict[str, str] = pronunciations
+        self.fixes: Rules = Rules(fixes)
+        self.pronunciations: Rules = Rules(pronunciations, whole_words=True)
+        self._mtime: float | None = None  # None until a rules file exists
+        self._checked: float = 0.0
+        self.reload_if_changed()
+
+    def reload_if_changed(self) -> bool:
+        """Recompile the rules if the rules file changed since the last check."""
+        self._checked = time.monotonic()
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        fixes = dict(self.default_fixes)
+        pronunciations = dict(self.default_pronunciations)
+        if mtime is not None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    rules = json.load(f)
+                fixes.update(rules.get("fixes", {}))
+                pronunciations.update(rules.get("pronunciations", {}))
+            except (OSError, ValueError, AttributeError) as e:
+                _LOGGER.warning("Could not load rules file %s: %s", self.path, e)
+                return False
+
+        start = time.perf_counter()
+        self.fixes = Rules(fixes)
+        self.pronunciations = Rules(pronunciations, whole_words=True)
+        _LOGGER.info(
+            "Loaded %d fixes and %d pronunciations in %.1f ms",
+            len(fixes),
+            len(pronunciations),
+            (time.perf_counter() - start) * 1000,
+        )
+        return True
+
+    def _check(self) -> None:
+        if time.monotonic() - self._checked >= self.CHECK_INTERVAL:
+            self.reload_if_changed()
+
+    def fix(self, text: str) -> str:
+        """Correct typing mistakes in the written text."""
+        self._check()
+        return self.fixes.apply(text)
+
+    def pronounce(self, text: str) -> str:
+        """Respell mispronounced words and escape the text for SSML."""
+        self._check()
+        return self.pronunciations.apply(text, escape=True)